@@ -0,0 +1,209 @@
+"""
+Admission control for the persistent service.
+
+At most `concurrency` requests run at once and at most `max_queue` wait
+behind them. A request that finds the queue full, or waits longer than
+`max_wait` seconds (or past its own deadline), is rejected with Busy instead
+of piling up until the node swaps. Busy carries a retry-after estimate from
+the recent service time and the queue ahead.
+
+Every request has a priority class:
+  interactive  scans from the app (default)
+  reanalysis   bulk re-scoring of stored scans (reanalyze.py --service-url)
+  batch        other back-fills
+A free slot goes to the oldest waiter of the highest class that is under its
+concurrency cap. Bulk classes are capped (by default at half the slots) so
+interactive scans always find room. A waiter that has been passed over for
+`starvation_after` seconds is served next regardless of class, so bulk work
+keeps moving under sustained interactive load.
+"""
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+import metrics
+
+PRIORITIES = ('interactive', 'reanalysis', 'batch')
+DEFAULT_PRIORITY = 'interactive'
+
+MIN_RETRY_AFTER_MS = 100
+MAX_RETRY_AFTER_MS = 60000
+# Weight of the newest request in the service time average.
+EWMA_ALPHA = 0.2
+
+
+def default_caps(concurrency):
+    bulk = max(1, concurrency // 2)
+    return {'interactive': concurrency, 'reanalysis': bulk, 'batch': bulk}
+
+
+class Busy(Exception):
+    def __init__(self, reason, retry_after_ms, queue_depth):
+        super().__init__(f"Service busy ({reason})")
+        self.reason = reason
+        self.retry_after_ms = retry_after_ms
+        self.queue_depth = queue_depth
+
+    def to_response(self):
+        return {
+            "error": "Service busy, retry later",
+            "code": "busy",
+            "reason": self.reason,
+            "retryAfterMs": self.retry_after_ms,
+            "queueDepth": self.queue_depth,
+        }
+
+
+class _Ticket:
+    __slots__ = ('priority', 'enqueued', 'granted')
+
+    def __init__(self, priority):
+        self.priority = priority
+        self.enqueued = time.monotonic()
+        self.granted = False
+
+
+class AdmissionController:
+    def __init__(self, concurrency, max_queue, max_wait, caps=None, starvation_after=10.0):
+        self.concurrency = max(1, int(concurrency))
+        self.max_queue = max(0, int(max_queue))
+        self.max_wait = max(0.0, float(max_wait))
+        self.caps = default_caps(self.concurrency)
+        for priority, cap in (caps or {}).items():
+            if priority in self.caps and cap is not None:
+                self.caps[priority] = max(1, min(self.concurrency, int(cap)))
+        self.starvation_after = max(0.0, float(starvation_after))
+        self._cond = threading.Condition()
+        self._active = 0
+        self._active_by_class = {priority: 0 for priority in PRIORITIES}
+        self._queues = {priority: deque() for priority in PRIORITIES}
+        self._service_seconds = None
+        self.rejected = {"queue_full": 0, "queue_timeout": 0}
+        self.promoted = 0
+
+    def _queued(self):
+        return sum(len(queue) for queue in self._queues.values())
+
+    def queue_depth(self):
+        with self._cond:
+            return self._queued()
+
+    def _set_depth(self):
+        metrics.QUEUE_DEPTH.set(self._queued())
+        for priority, queue in self._queues.items():
+            metrics.QUEUE_DEPTH_BY_PRIORITY.set(len(queue), priority=priority)
+
+    def _reject(self, reason):
+        self.rejected[reason] += 1
+        return Busy(reason, self._retry_after_ms(), self._queued())
+
+    def _retry_after_ms(self):
+        per_request = self._service_seconds if self._service_seconds is not None else 1.0
+        # Time for the queue ahead, plus this request's turn, to drain through the slots.
+        estimate = per_request * (self._queued() + 1) / self.concurrency * 1000
+        return int(min(MAX_RETRY_AFTER_MS, max(MIN_RETRY_AFTER_MS, estimate)))
+
+    def _next_ticket(self):
+        """
+        The waiter to admit next, or None if no waiter fits a free slot.
+        """
+        eligible = [
+            queue[0] for priority, queue in self._queues.items()
+            if queue and self._active_by_class[priority] < self.caps[priority]
+        ]
+        if not eligible:
+            return None
+        oldest = min(eligible, key=lambda ticket: ticket.enqueued)
+        if time.monotonic() - oldest.enqueued >= self.starvation_after:
+            if oldest is not eligible[0]:
+                self.promoted += 1
+            return oldest
+        # _queues is ordered by priority, so the first eligible head is the highest class.
+        return eligible[0]
+
+    def _dispatch(self):
+        granted = False
+        while self._active < self.concurrency:
+            ticket = self._next_ticket()
+            if ticket is None:
+                break
+            self._queues[ticket.priority].popleft()
+            ticket.granted = True
+            self._active += 1
+            self._active_by_class[ticket.priority] += 1
+            metrics.QUEUE_WAIT_SECONDS.observe(time.monotonic() - ticket.enqueued, priority=ticket.priority)
+            granted = True
+        if granted:
+            self._set_depth()
+            self._cond.notify_all()
+
+    def acquire(self, max_wait=None, priority=DEFAULT_PRIORITY):
+        """
+        Takes a slot for a `priority` request, waiting in line for at most
+        `max_wait` seconds (default: the controller's). Raises Busy if the
+        request is not admitted.
+        """
+        if priority not in self._queues:
+            raise ValueError(f"Unknown priority: {priority}")
+        max_wait = self.max_wait if max_wait is None else min(self.max_wait, max(0.0, max_wait))
+        with self._cond:
+            ticket = _Ticket(priority)
+            self._queues[priority].append(ticket)
+            self._dispatch()
+            if ticket.granted:
+                return
+            if self._queued() > self.max_queue:
+                self._queues[priority].remove(ticket)
+                self._set_depth()
+                raise self._reject("queue_full")
+
+            self._set_depth()
+            give_up = time.monotonic() + max_wait
+            while not ticket.granted:
+                remaining = give_up - time.monotonic()
+                if remaining <= 0:
+                    self._queues[priority].remove(ticket)
+                    self._set_depth()
+                    raise self._reject("queue_timeout")
+                self._cond.wait(remaining)
+
+    def release(self, seconds=None, priority=DEFAULT_PRIORITY):
+        with self._cond:
+            self._active -= 1
+            self._active_by_class[priority] -= 1
+            if seconds is not None:
+                if self._service_seconds is None:
+                    self._service_seconds = seconds
+                else:
+                    self._service_seconds += EWMA_ALPHA * (seconds - self._service_seconds)
+            self._dispatch()
+
+    @contextmanager
+    def slot(self, max_wait=None, priority=DEFAULT_PRIORITY):
+        self.acquire(max_wait, priority)
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.release(time.perf_counter() - start, priority)
+
+    def stats(self):
+        with self._cond:
+            return {
+                "active": self._active,
+                "queued": self._queued(),
+                "concurrency": self.concurrency,
+                "maxQueue": self.max_queue,
+                "maxQueueWaitMs": int(self.max_wait * 1000),
+                "rejected": dict(self.rejected),
+                "priorities": {
+                    priority: {
+                        "active": self._active_by_class[priority],
+                        "queued": len(self._queues[priority]),
+                        "cap": self.caps[priority],
+                    }
+                    for priority in PRIORITIES
+                },
+                "starvationPromotions": self.promoted,
+            }
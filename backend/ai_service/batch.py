@@ -0,0 +1,291 @@
+"""
+Batch analysis of many images in one process.
+
+Usage:
+  python main.py batch <directory | glob | manifest.jsonl> [--out results.jsonl] [options]
+
+A manifest has one JSON object per line:
+  {"id": "scan-1", "path": "/data/a.jpg", "mode": "tree", "sub_mode": "leaf"}
+  {"url": "https://.../b.jpg", "mode": "latex"}
+Recorded service requests ({"scanId", "imageUrl", "mode", "subMode"}) are accepted too.
+
+Images are downloaded/decoded concurrently one chunk ahead of inference, and
+each chunk runs a single batched forward pass per model before the regular
+per-image analysis. Results are appended to the output file as JSON lines; the
+output file doubles as the checkpoint, so re-running the same command skips
+items that already have a result. Load and analysis failures (a download that
+timed out, a crashed stage) are not checkpointed: they are retried on the next
+run and the new result is appended, so a reader keeps the last line per id.
+Rejections (e.g. "retake_photo") are results and are not retried. A
+throughput/latency summary is printed to stdout at the end.
+"""
+import argparse
+import glob
+import json
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import content_categories
+import content_prefilter
+import lazy_validation
+import main as ai
+import profiling
+from perf_stats import summarize_latencies
+
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.bmp', '.webp')
+MANIFEST_EXTENSIONS = ('.jsonl', '.ndjson', '.json')
+# Errors of a failed attempt rather than of the image; retried on resume.
+RETRYABLE_ERRORS = ("Failed to load image", "Analysis failed")
+
+
+def load_items(source, default_mode='tree', default_sub_mode=''):
+    """
+    Expand a directory, glob pattern or JSON-lines manifest into work items.
+    """
+    items = []
+
+    if os.path.isfile(source) and source.lower().endswith(MANIFEST_EXTENSIONS):
+        with open(source) as f:
+            for line_no, line in enumerate(f, 1):
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    entry = json.loads(line)
+                except json.JSONDecodeError as e:
+                    sys.stderr.write(f"⚠️ [Batch] Skipping manifest line {line_no}: {e}\n")
+                    continue
+                image = entry.get('path') or entry.get('url') or entry.get('image') or entry.get('imageUrl')
+                if not image:
+                    sys.stderr.write(f"⚠️ [Batch] Manifest line {line_no} has no path/url.\n")
+                    continue
+                items.append({
+                    'id': str(entry.get('id') or entry.get('scanId') or image),
+                    'source': image,
+                    'mode': entry.get('mode') or default_mode,
+                    'sub_mode': entry.get('sub_mode') or entry.get('subMode') or default_sub_mode,
+                })
+        return items
+
+    if os.path.isdir(source):
+        paths = []
+        for root, _, files in os.walk(source):
+            paths.extend(os.path.join(root, name) for name in files if name.lower().endswith(IMAGE_EXTENSIONS))
+    else:
+        paths = [p for p in glob.glob(source, recursive=True) if p.lower().endswith(IMAGE_EXTENSIONS)]
+
+    for path in sorted(paths):
+        items.append({'id': path, 'source': path, 'mode': default_mode, 'sub_mode': default_sub_mode})
+    return items
+
+
+def retryable(result):
+    """
+    Whether a result records a failed attempt (load or analysis failure) worth retrying.
+    """
+    error = result.get('error') if isinstance(result, dict) else None
+    return isinstance(error, str) and error.startswith(RETRYABLE_ERRORS)
+
+
+def load_checkpoint(out_path):
+    """
+    Ids whose latest result line in `out_path` is final (not a retryable failure). Also
+    repairs a partial trailing line left behind by an interrupted run so that appended
+    results start on a fresh line.
+    """
+    done = set()
+    if not os.path.exists(out_path):
+        return done
+
+    with open(out_path, 'rb') as f:
+        data = f.read()
+    for line in data.splitlines():
+        try:
+            record = json.loads(line)
+            item_id = record['id']
+        except (ValueError, KeyError, TypeError):
+            continue
+        if retryable(record.get('result')):
+            done.discard(item_id)
+        else:
+            done.add(item_id)
+
+    if data and not data.endswith(b'\n'):
+        with open(out_path, 'ab') as f:
+            f.write(b'\n')
+    return done
+
+
+def _load(item):
+    start = time.perf_counter()
+    img = ai.download_image(item['source'])
+    return img, (time.perf_counter() - start) * 1000
+
+
+def _model_for(item):
+    if item['mode'] == 'latex':
+        return 'latex'
+    sub_mode = (item['sub_mode'] or '').strip().lower()
+    if sub_mode in ('leaf', 'trunk'):
+        return sub_mode
+    return None
+
+
+def prime_chunk(loaded):
+    """
+    Run one batched forward pass per model over the decoded images of a chunk and prime
+    the model handles, so the per-image analysis reuses the results. The specialised
+    models go first: their primed predictions tell which scans still need the generic
+    classifier (lazy_validation.py), and only those are batched through 'cls'. Returns the
+    primed (handle, img) pairs for cleanup.
+    """
+    groups = {}
+    for item, img, _ in loaded:
+        specialised = _model_for(item)
+        if img is not None and specialised:
+            groups.setdefault(specialised, []).append(img)
+
+    primed = []
+    ready = {name for name, imgs in groups.items() if _prime(name, imgs, primed)}
+    _prime('cls', [img for item, img, _ in loaded if img is not None and _needs_classifier(item, img, ready)], primed)
+    return primed
+
+
+def _needs_classifier(item, img, ready):
+    """
+    Whether the analysis of `item` will run classify_content, given the specialised
+    models primed so far (`ready`).
+    """
+    sub_mode = (item['sub_mode'] or '').strip().lower()
+    # classify_content starts with the generic classifier, unless the thumbnail prefilter decides.
+    if content_prefilter.decide(img, item['mode'], sub_mode) is not None:
+        return False
+    if item['mode'] == 'latex':
+        # Lazily, only classified when the presence ratio and the latex model are both weak.
+        return not lazy_validation.enabled()
+    if sub_mode in ('trunk', 'leaf') and sub_mode in ready and lazy_validation.parts_enabled():
+        # The lazy gate, on the primed prediction.
+        return not ai.check_user_part(img, sub_mode)[2]
+    return True
+
+
+def _prime(name, imgs, primed):
+    if len(imgs) < 2:
+        return False
+    handle = ai.MODEL_MANAGER.get(name)
+    if handle is None:
+        return False
+    try:
+        results = handle.predict_batch(imgs, verbose=False)
+    except Exception as e:
+        sys.stderr.write(f"⚠️ [Batch] Batched '{name}' inference failed, falling back per image: {e}\n")
+        return False
+    if name == 'cls':
+        # Score the whole chunk's category weights in one matrix product.
+        try:
+            content_categories.score_batch(results, content_categories.handle_matrix(handle, results[0].names))
+        except Exception as e:
+            sys.stderr.write(f"⚠️ [Batch] Batched category scoring failed, scoring per image: {e}\n")
+    for img, result in zip(imgs, results):
+        handle.prime(img, result)
+        primed.append((handle, img))
+    return True
+
+
+def _analyze(entry):
+    item, img, decode_ms = entry
+    start = time.perf_counter()
+    if img is None:
+        result = {"error": "Failed to load image"}
+    else:
+        try:
+            with profiling.profiled(item['mode']) as profile:
+                result = ai.analyze_image(img, item['mode'], (item['sub_mode'] or '').strip().lower(), item['source'])
+            profiling.attach(result, profile)
+        except Exception as e:
+            sys.stderr.write(f"❌ [Batch] Analysis of {item['source']} failed: {e}\n")
+            result = {"error": f"Analysis failed: {e}"}
+    latency_ms = (time.perf_counter() - start) * 1000
+    return {
+        'id': item['id'],
+        'source': item['source'],
+        'mode': item['mode'],
+        'sub_mode': item['sub_mode'],
+        'result': result,
+        'decode_ms': round(decode_ms, 2),
+        'latency_ms': round(latency_ms, 2),
+    }
+
+
+def run_batch(argv):
+    parser = argparse.ArgumentParser(prog="main.py batch", description="Analyze a directory, glob or manifest of images")
+    parser.add_argument("source", help="Directory, glob pattern, or JSON-lines manifest")
+    parser.add_argument("--out", default="batch_results.jsonl", help="JSON-lines output (also the resume checkpoint)")
+    parser.add_argument("--mode", default="tree", choices=["tree", "latex"], help="Default mode for directory/glob sources")
+    parser.add_argument("--sub-mode", default="", help="Default sub mode (leaf/trunk) for directory/glob sources")
+    parser.add_argument("--batch-size", type=int, default=8, help="Images per batched forward pass")
+    parser.add_argument("--prefetch", type=int, default=4, help="Concurrent image downloads/decodes")
+    parser.add_argument("--workers", type=int, default=1, help="Threads running the per-image analysis")
+    parser.add_argument("--no-resume", action="store_true", help="Ignore existing results in --out")
+    args = parser.parse_args(argv)
+
+    items = load_items(args.source, args.mode, args.sub_mode)
+    if args.no_resume and os.path.exists(args.out):
+        os.remove(args.out)
+    done = load_checkpoint(args.out)
+    pending = [item for item in items if item['id'] not in done]
+    sys.stderr.write(
+        f"ℹ️ [Batch] {len(items)} items, {len(items) - len(pending)} already done, {len(pending)} to process.\n"
+    )
+
+    batch_size = max(1, args.batch_size)
+    chunks = [pending[i:i + batch_size] for i in range(0, len(pending), batch_size)]
+    latencies = []
+    decode_times = []
+    errors = 0
+    start = time.perf_counter()
+
+    with ThreadPoolExecutor(max_workers=max(1, args.prefetch)) as loader, \
+            ThreadPoolExecutor(max_workers=max(1, args.workers)) as workers, \
+            open(args.out, 'a') as out:
+        upcoming = [loader.submit(_load, item) for item in chunks[0]] if chunks else []
+
+        for index, chunk in enumerate(chunks):
+            futures = upcoming
+            # Start decoding the next chunk while this one runs through the models.
+            if index + 1 < len(chunks):
+                upcoming = [loader.submit(_load, item) for item in chunks[index + 1]]
+            loaded = [(item, *future.result()) for item, future in zip(chunk, futures)]
+
+            primed = prime_chunk(loaded)
+            try:
+                for record in workers.map(_analyze, loaded):
+                    out.write(json.dumps(record) + "\n")
+                    latencies.append(record['latency_ms'])
+                    decode_times.append(record['decode_ms'])
+                    if isinstance(record['result'], dict) and record['result'].get('error'):
+                        errors += 1
+                out.flush()
+            finally:
+                for handle, img in primed:
+                    handle.discard_primed(img)
+
+            sys.stderr.write(f"📦 [Batch] {min((index + 1) * batch_size, len(pending))}/{len(pending)} done\n")
+
+    wall_seconds = time.perf_counter() - start
+    summary = {
+        "total": len(items),
+        "skipped_checkpoint": len(items) - len(pending),
+        "processed": len(latencies),
+        "errors": errors,
+        "wall_seconds": round(wall_seconds, 3),
+        "throughput_per_second": round(len(latencies) / wall_seconds, 3) if wall_seconds > 0 else 0.0,
+        "latency_ms": summarize_latencies(latencies),
+        "decode_ms": summarize_latencies(decode_times),
+        "output": os.path.abspath(args.out),
+        "models": ai.MODEL_MANAGER.stats(),
+    }
+    print(json.dumps(summary))
+    return 0
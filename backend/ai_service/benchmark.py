@@ -0,0 +1,343 @@
+"""
+Per-stage latency benchmark for the tree (auto), leaf, trunk and latex pipelines.
+
+Usage:
+  python benchmark.py [--repeat 5] [--out results.json]
+                      [--save-baseline benchmark_baseline.json]
+                      [--compare benchmark_baseline.json --tolerance 0.25]
+
+The corpus is the sample images shipped in the repo plus seeded synthetic
+leaf/trunk/latex images, served from a local HTTP server so the download stage
+is measured without the internet. Groq is replaced by a local stub (optionally
+with --groq-latency-ms of simulated network time). Every stage is timed on its
+own and every pipeline end to end; p50/p95/p99 and throughput are reported.
+
+With --compare, stages whose p50 or p95 got slower than the baseline by more
+than the tolerance are flagged and the exit code is 1.
+"""
+import argparse
+import functools
+import glob
+import http.server
+import json
+import os
+import sys
+import tempfile
+import threading
+import time
+from unittest import mock
+
+import cv2
+import numpy as np
+import requests
+
+import main as ai
+from groq_stub import STUB_LATEX_INSIGHTS, STUB_LEAF_INSIGHTS
+from perf_stats import summarize_latencies
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+SAMPLE_GLOBS = [
+    os.path.join(SCRIPT_DIR, 'models', 'rubber_tree_model', '*.jpg'),
+    os.path.join(SCRIPT_DIR, 'temp_output', '*.jpg'),
+    os.path.join(SCRIPT_DIR, 'temp_output', '*.png'),
+]
+
+
+# ----------------------------------------------------------------------
+# Synthetic corpus
+# ----------------------------------------------------------------------
+def create_synthetic_leaf_image(seed=0, size=640):
+    rng = np.random.default_rng(seed)
+    img = np.zeros((size, size, 3), dtype=np.uint8)
+    img[:] = (60, 90, 120)  # Soil-like background
+    center = (size // 2, size // 2)
+    cv2.ellipse(img, center, (size // 3, size // 5), int(rng.integers(0, 180)), 0, 360, (40, 160, 60), -1)
+    # Dark lesions
+    for _ in range(int(rng.integers(5, 60))):
+        x, y = rng.integers(size // 4, 3 * size // 4, 2)
+        cv2.circle(img, (int(x), int(y)), int(rng.integers(2, 8)), (20, 30, 40), -1)
+    noise = rng.integers(0, 40, img.shape, dtype=np.uint8)
+    return cv2.addWeighted(img, 0.9, noise, 0.1, 0)
+
+
+def create_synthetic_trunk_image(seed=0, size=640):
+    # Same construction as create_dummy_trunk_image in test_trunk_model.py, but seeded.
+    rng = np.random.default_rng(seed)
+    img = np.zeros((size, size, 3), dtype=np.uint8)
+    img[:] = (200, 255, 200)
+    left = int(size * 0.3)
+    right = int(size * 0.7)
+    cv2.rectangle(img, (left, 0), (right, size), (40, 70, 100), -1)
+    noise = rng.integers(0, 50, (size, size, 3), dtype=np.uint8)
+    img = cv2.addWeighted(img, 0.9, noise, 0.1, 0)
+    for i in range(left, right, 10):
+        cv2.line(img, (i, 0), (i, size), (30, 60, 90), 1)
+    cv2.circle(img, (size // 2, size // 2), 40, (20, 20, 50), -1)
+    cv2.circle(img, (size // 2 - 20, size // 2 - 20), 10, (200, 200, 200), -1)
+    return img
+
+
+def create_synthetic_latex_image(seed=0, size=640):
+    rng = np.random.default_rng(seed)
+    img = np.zeros((size, size, 3), dtype=np.uint8)
+    img[:] = (30, 45, 60)  # Dark cup/bark background
+    tint = (235, 240, 245) if seed % 2 == 0 else (150, 215, 235)  # White vs yellowish latex
+    cv2.circle(img, (size // 2, size // 2), size // 3, tint, -1)
+    # Debris specks
+    for _ in range(int(rng.integers(0, 40))):
+        x, y = rng.integers(size // 3, 2 * size // 3, 2)
+        cv2.circle(img, (int(x), int(y)), int(rng.integers(1, 5)), (25, 25, 25), -1)
+    noise = rng.integers(0, 25, img.shape, dtype=np.uint8)
+    return cv2.addWeighted(img, 0.95, noise, 0.05, 0)
+
+
+def build_corpus(directory, synthetic_per_kind=3):
+    """
+    Writes the synthetic images to `directory` and returns [(kind, path)] for the whole corpus.
+    kind is 'leaf', 'trunk', 'latex' or 'sample' (repo images, used for every pipeline).
+    """
+    corpus = []
+    for path in sorted(p for pattern in SAMPLE_GLOBS for p in glob.glob(pattern)):
+        corpus.append(('sample', path))
+
+    makers = {
+        'leaf': create_synthetic_leaf_image,
+        'trunk': create_synthetic_trunk_image,
+        'latex': create_synthetic_latex_image,
+    }
+    for kind, maker in makers.items():
+        for seed in range(synthetic_per_kind):
+            path = os.path.join(directory, f"synthetic_{kind}_{seed}.jpg")
+            cv2.imwrite(path, maker(seed))
+            corpus.append((kind, path))
+    return corpus
+
+
+def serve_directory(directory, paths):
+    """
+    Serves `paths` over a local HTTP server. Returns (server, {path: url}).
+    """
+    links = {}
+    for path in paths:
+        name = os.path.basename(path)
+        link = os.path.join(directory, name)
+        if not os.path.exists(link):
+            os.symlink(os.path.abspath(path), link)
+        links[path] = name
+
+    class QuietHandler(http.server.SimpleHTTPRequestHandler):
+        def log_message(self, *args):
+            pass
+
+    handler = functools.partial(QuietHandler, directory=directory)
+    server = http.server.ThreadingHTTPServer(('127.0.0.1', 0), handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base = f"http://127.0.0.1:{server.server_address[1]}/"
+    return server, {path: base + name for path, name in links.items()}
+
+
+# ----------------------------------------------------------------------
+# Timing
+# ----------------------------------------------------------------------
+class StageTimer:
+    def __init__(self):
+        self.samples = {}
+
+    def run(self, name, fn, *args, **kwargs):
+        start = time.perf_counter()
+        result = fn(*args, **kwargs)
+        self.samples.setdefault(name, []).append((time.perf_counter() - start) * 1000)
+        return result
+
+    def report(self):
+        report = {}
+        for name, values in sorted(self.samples.items()):
+            summary = summarize_latencies(values)
+            total_seconds = sum(values) / 1000
+            summary["throughput_per_second"] = round(len(values) / total_seconds, 2) if total_seconds > 0 else 0.0
+            report[name] = summary
+        return report
+
+
+def stub_groq(latency_ms):
+    def leaf(*args, **kwargs):
+        time.sleep(latency_ms / 1000)
+        return dict(STUB_LEAF_INSIGHTS)
+
+    def latex(*args, **kwargs):
+        time.sleep(latency_ms / 1000)
+        return dict(STUB_LATEX_INSIGHTS)
+
+    return leaf, latex
+
+
+def run_model(name, img):
+    handle = ai.MODEL_MANAGER.get(name)
+    if handle is None:
+        return None
+    return handle(img, verbose=False)
+
+
+def benchmark_stages(timer, kind, url, out_dir, groq_leaf, groq_latex):
+    """
+    Times every stage of the pipelines relevant to one corpus image.
+    """
+    response = timer.run("common.download", requests.get, url, timeout=10)
+    buffer = np.frombuffer(response.content, dtype=np.uint8)
+    img = timer.run("common.decode", cv2.imdecode, buffer, cv2.IMREAD_COLOR)
+    if img is None:
+        return
+    timer.run("common.classify_content", ai.classify_content, img)
+
+    if kind in ('leaf', 'sample'):
+        if ai.get_leaf_model() is not None:
+            timer.run("leaf.model_forward", run_model, 'leaf', img)
+        mask = timer.run("leaf.get_leaf_mask", ai.get_leaf_mask, img)
+        masked = img.copy()
+        masked[mask == 0] = [0, 0, 0]
+        _, vis = timer.run("leaf.count_spots", ai.count_spots, masked)
+        timer.run("leaf.dominant_color", ai.get_dominant_color_name, img, mask)
+        timer.run("leaf.groq_stub", groq_leaf, "Leaf_Spot", 80.0, 10, "Green")
+        timer.run("leaf.imwrite", cv2.imwrite, os.path.join(out_dir, "bench_leaf.jpg"), vis)
+
+    if kind in ('trunk', 'sample'):
+        if ai.get_trunk_model() is not None:
+            timer.run("trunk.model_forward", run_model, 'trunk', img)
+        timer.run("trunk.analyze_trunk_physical", ai.analyze_trunk_physical, img)
+        timer.run("trunk.groq_stub", groq_leaf, "bark rot", 80.0, 0, "Red/Brown")
+
+    if kind in ('latex', 'sample'):
+        timer.run("latex.presence_ratio", ai.estimate_latex_presence_ratio, img)
+        if ai.get_latex_model() is not None:
+            timer.run("latex.model_forward", run_model, 'latex', img)
+        timer.run("latex.heuristic", ai.analyze_latex_heuristic, img)
+        timer.run("latex.groq_stub", groq_latex, "white latex", 80.0, "low", 40.0)
+
+
+def benchmark_pipelines(timer, kind, url):
+    """
+    Times each pipeline end to end through analyze_request (download included).
+    """
+    if kind in ('leaf', 'sample'):
+        timer.run("pipeline.leaf", ai.analyze_request, 'tree', url, 'leaf')
+    if kind in ('trunk', 'sample'):
+        timer.run("pipeline.trunk", ai.analyze_request, 'tree', url, 'trunk')
+    if kind in ('leaf', 'trunk', 'sample'):
+        timer.run("pipeline.tree", ai.analyze_request, 'tree', url, '')
+    if kind in ('latex', 'sample'):
+        timer.run("pipeline.latex", ai.analyze_request, 'latex', url, '')
+
+
+# ----------------------------------------------------------------------
+# Baselines
+# ----------------------------------------------------------------------
+def compare_to_baseline(report, baseline, tolerance):
+    """
+    Stages whose p50 or p95 exceeds the baseline by more than `tolerance` (fraction).
+    """
+    regressions = []
+    for name, current in report.items():
+        previous = baseline.get("stages", {}).get(name)
+        if not previous:
+            continue
+        for metric in ("p50", "p95"):
+            old, new = previous.get(metric, 0.0), current.get(metric, 0.0)
+            # Ignore sub-millisecond stages where timer noise dominates.
+            if old >= 0.5 and new > old * (1 + tolerance):
+                regressions.append({
+                    "stage": name,
+                    "metric": metric,
+                    "baseline_ms": old,
+                    "current_ms": new,
+                    "change_pct": round((new / old - 1) * 100, 1),
+                })
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="RubberSense per-stage latency benchmark")
+    parser.add_argument("--repeat", type=int, default=5, help="Passes over the corpus")
+    parser.add_argument("--warmup", type=int, default=1, help="Untimed passes (model loading, caches)")
+    parser.add_argument("--synthetic", type=int, default=3, help="Synthetic images per kind")
+    parser.add_argument("--groq-latency-ms", type=float, default=0.0, help="Simulated Groq latency of the stub")
+    parser.add_argument("--out", help="Write the full report JSON here")
+    parser.add_argument("--save-baseline", help="Store this run as a baseline JSON")
+    parser.add_argument("--compare", help="Baseline JSON to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="Allowed slowdown before flagging (0.25 = 25%%)")
+    args = parser.parse_args(argv)
+
+    groq_leaf, groq_latex = stub_groq(args.groq_latency_ms)
+
+    with tempfile.TemporaryDirectory() as tmp, \
+            mock.patch.object(ai, 'get_groq_analysis', groq_leaf), \
+            mock.patch.object(ai, 'get_groq_latex_analysis', groq_latex), \
+            open(os.devnull, 'w') as devnull, \
+            mock.patch.object(ai.sys, 'stderr', devnull), \
+            mock.patch.dict(os.environ):
+        corpus_dir = os.path.join(tmp, 'corpus')
+        serve_dir = os.path.join(tmp, 'www')
+        out_dir = os.path.join(tmp, 'out')
+        for d in (corpus_dir, serve_dir, out_dir):
+            os.makedirs(d)
+        # Keep annotated images from the pipelines out of temp_output.
+        os.environ["RUBBERSENSE_OUTPUT_DIR"] = out_dir
+
+        corpus = build_corpus(corpus_dir, args.synthetic)
+        server, urls = serve_directory(serve_dir, [path for _, path in corpus])
+        try:
+            warmup = StageTimer()
+            for _ in range(max(0, args.warmup)):
+                for kind, path in corpus:
+                    benchmark_stages(warmup, kind, urls[path], out_dir, groq_leaf, groq_latex)
+                    benchmark_pipelines(warmup, kind, urls[path])
+
+            timer = StageTimer()
+            wall_start = time.perf_counter()
+            for _ in range(max(1, args.repeat)):
+                for kind, path in corpus:
+                    benchmark_stages(timer, kind, urls[path], out_dir, groq_leaf, groq_latex)
+                    benchmark_pipelines(timer, kind, urls[path])
+            wall_seconds = time.perf_counter() - wall_start
+        finally:
+            server.shutdown()
+            server.server_close()
+
+    report = {
+        "corpus": {
+            "images": len(corpus),
+            "samples": sum(1 for kind, _ in corpus if kind == 'sample'),
+            "synthetic": sum(1 for kind, _ in corpus if kind != 'sample'),
+        },
+        "repeat": args.repeat,
+        "groq_latency_ms": args.groq_latency_ms,
+        "models_available": {name: ai.MODEL_MANAGER.get(name) is not None for name in ('cls', 'leaf', 'trunk', 'latex')},
+        "wall_seconds": round(wall_seconds, 3),
+        "stages": timer.report(),
+    }
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        report["regressions"] = compare_to_baseline(report["stages"], baseline, args.tolerance)
+
+    if args.out:
+        with open(args.out, 'w') as f:
+            json.dump(report, f, indent=2)
+    if args.save_baseline:
+        with open(args.save_baseline, 'w') as f:
+            json.dump(report, f, indent=2)
+
+    print(f"{'stage':<32} {'n':>5} {'p50':>9} {'p95':>9} {'p99':>9} {'ops/s':>9}")
+    for name, s in report["stages"].items():
+        print(f"{name:<32} {s['count']:>5} {s['p50']:>9.2f} {s['p95']:>9.2f} {s['p99']:>9.2f} {s['throughput_per_second']:>9.1f}")
+
+    regressions = report.get("regressions", [])
+    for r in regressions:
+        print(f"❌ REGRESSION {r['stage']} {r['metric']}: {r['baseline_ms']:.2f} ms -> {r['current_ms']:.2f} ms (+{r['change_pct']}%)")
+    if args.compare and not regressions:
+        print(f"✅ No regressions beyond {args.tolerance * 100:.0f}% vs {args.compare}")
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,138 @@
+"""
+ImageNet class -> content category weights for classify_content.
+
+classify_content sorts the generic classifier's classes into trunk, leaf and
+non-plant by keyword. Instead of matching keywords against the class names
+on every scan, the model's class names are mapped once per loaded model
+(handle_matrix) into a (classes x categories) weight matrix; a scan's category scores
+are then a single dot product of its top probabilities with their rows of that
+matrix, and a batch of probability vectors (from a batched forward pass) is
+scored with one matrix product.
+
+Only the top-k classes of each image count, as before (k = 5). Setting
+RUBBERSENSE_CLS_TOP_K=0 scores the full probability vector instead; the
+classify_content thresholds were tuned on top-5 sums, so re-check them before
+switching.
+"""
+import os
+
+import numpy as np
+
+CATEGORIES = ('trunk', 'leaf', 'non_plant')
+
+KEYWORDS = {
+    'trunk': ['bark', 'trunk', 'wood', 'log', 'tree'],
+    'leaf': ['leaf', 'foliage', 'plant', 'flower', 'green', 'vegetable', 'fruit', 'herb', 'shrub'],
+    'non_plant': [
+        'wall', 'floor', 'paper', 'rock', 'sand', 'soil', 'fabric', 'plastic',
+        'keyboard', 'computer', 'laptop', 'screen', 'monitor', 'mouse',
+        'electronic', 'device', 'furniture', 'table', 'desk', 'room',
+        'interior', 'man-made', 'text', 'book', 'writing'
+    ],
+}
+
+DEFAULT_TOP_K = 5
+
+
+def top_k():
+    raw = os.environ.get("RUBBERSENSE_CLS_TOP_K")
+    if raw not in (None, ""):
+        try:
+            return max(0, int(raw))
+        except ValueError:
+            pass
+    return DEFAULT_TOP_K
+
+
+def category_of(class_name):
+    """
+    The category a class name belongs to, or None. Trunk keywords win over
+    leaf keywords, which win over non-plant keywords.
+    """
+    class_name = class_name.lower()
+    for category in CATEGORIES:
+        if any(k in class_name for k in KEYWORDS[category]):
+            return category
+    return None
+
+
+def category_matrix(names):
+    """
+    (classes x categories) 0/1 weights for a model's `names` ({index: name}).
+    """
+    matrix = np.zeros((len(names), len(CATEGORIES)))
+    for index in range(len(names)):
+        category = category_of(names[index])
+        if category is not None:
+            matrix[index, CATEGORIES.index(category)] = 1.0
+    return matrix
+
+
+def handle_matrix(handle, names):
+    """
+    The category_matrix of the model behind `handle` (a ModelHandle), built on
+    its first scan and kept, and dropped, with the handle.
+    """
+    return handle.derived("category_matrix", lambda: category_matrix(names))
+
+
+def probability_vector(probs):
+    """
+    The full class probability vector of an ultralytics Probs as float64.
+    """
+    data = probs.data
+    if hasattr(data, 'cpu'):
+        data = data.cpu().numpy()
+    return np.asarray(data, dtype=np.float64)
+
+
+def category_scores(probabilities, matrix, k=None, top_indices=None):
+    """
+    Category scores for one probability vector (-> shape (categories,)) or a
+    batch of them (-> (images, categories)). Only each row's `k` most likely
+    classes count (k=0: all of them); `top_indices` supplies those classes
+    when the model already ranked them.
+    """
+    probabilities = np.asarray(probabilities, dtype=np.float64)
+    single = probabilities.ndim == 1
+    rows = probabilities.reshape(1, -1) if single else probabilities
+    k = top_k() if k is None else k
+    if k and k < rows.shape[1]:
+        if top_indices is None:
+            indices = np.argpartition(-rows, k - 1, axis=1)[:, :k]
+        else:
+            indices = np.asarray(top_indices).reshape(rows.shape[0], -1)
+        # Only the kept classes' rows of the matrix take part.
+        scores = np.einsum('ik,ikc->ic', np.take_along_axis(rows, indices, axis=1), matrix[indices])
+    else:
+        scores = rows @ matrix
+    return scores[0] if single else scores
+
+
+def score_batch(results, matrix):
+    """
+    Scores the results of one batched cls forward pass against the model's
+    `matrix` with a single category_scores call and keeps each row on its
+    result (result_scores).
+    """
+    if not results:
+        return
+    k = top_k()
+    probabilities = np.stack([probability_vector(result.probs) for result in results])
+    top = [list(result.probs.top5) for result in results]
+    scores = category_scores(
+        probabilities, matrix, k,
+        top_indices=np.array(top) if all(k == len(indices) for indices in top) else None,
+    )
+    for result, row in zip(results, scores):
+        result.category_scores = (k, row)
+
+
+def result_scores(result, k):
+    """
+    The scores score_batch kept on `result` for `k`, or None.
+    """
+    kept = getattr(result, 'category_scores', None)
+    if kept is None or kept[0] != k:
+        return None
+    return kept[1]
@@ -0,0 +1,183 @@
+"""
+Thumbnail color prefilter ahead of classify_content.
+
+classify_content runs the generic ImageNet classifier (and often Leaf.pt) just
+to tell leaf from trunk from non-plant. Many photos settle that by color
+alone, so a THUMBNAIL_SIDE x THUMBNAIL_SIDE thumbnail is split into coverage
+fractions first, using the hue ranges of get_leaf_mask and
+estimate_latex_presence_ratio:
+  green  foliage
+  bark   brown and grey bark
+  latex  white / cream / yellowish latex
+Confidently obvious frames are decided without a forward pass, but only where
+the decision cannot change whether the scan is rejected:
+  tree mode   without a sub mode: green-dominated -> leaf, bark-dominated -> trunk.
+              With a sub mode the classifier's non-plant verdict is what rejects
+              a grey wall or a green shirt, and color alone cannot tell those
+              from bark or foliage, so such scans always go through the models.
+  latex mode  latex-dominated -> accepted as latex (the models could not have
+              rejected it, since rejection needs a weak latex signal).
+Everything else falls through to classify_content.
+
+Agreement with the full cascade is measured on a local corpus with
+  python content_prefilter.py evaluate <directory | glob | manifest.jsonl> [--mode tree] [--sub-mode leaf]
+which runs both on every image and reports how many were decided, how often
+the decision matched classify_content and the time saved.
+
+RUBBERSENSE_CONTENT_PREFILTER=0 disables the prefilter.
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+import cv2
+import numpy as np
+
+import tracing
+
+THUMBNAIL_SIDE = 64
+
+# Coverage needed to decide, and the most of the other colors tolerated.
+LEAF_MIN_GREEN = 0.6
+LEAF_MAX_BARK = 0.2
+TRUNK_MIN_BARK = 0.75
+TRUNK_MAX_GREEN = 0.03
+MAX_LATEX_IN_TREE = 0.1
+LATEX_MIN_COVERAGE = 0.5
+
+# Stands in for classify_content on a latex-dominated frame; too weak to reject it.
+LATEX_CLASSIFICATION = {'is_tree': False, 'primary_part': 'unknown', 'confidence': 0.0}
+
+
+def enabled():
+    return os.environ.get("RUBBERSENSE_CONTENT_PREFILTER", "1") != "0"
+
+
+def coverage(img):
+    """
+    Fractions of a thumbnail of `img` that look like foliage, bark and latex.
+    Each pixel counts for at most one of them.
+    """
+    thumbnail = cv2.resize(img, (THUMBNAIL_SIDE, THUMBNAIL_SIDE), interpolation=cv2.INTER_AREA)
+    hsv = cv2.cvtColor(thumbnail, cv2.COLOR_BGR2HSV)
+    h, s, v = (hsv[:, :, i].astype(np.int16) for i in range(3))
+
+    latex = ((s <= 60) & (v >= 170)) | ((h >= 15) & (h <= 40) & (s >= 60) & (s <= 200) & (v >= 150))
+    green = ~latex & (h >= 35) & (h <= 85) & (s >= 50) & (v >= 40)
+    brown = ((h <= 30) | (h >= 165)) & (s >= 25) & (s <= 200) & (v >= 25) & (v <= 190)
+    grey = (s < 25) & (v >= 40) & (v <= 150)
+    bark = ~latex & ~green & (brown | grey)
+    return {
+        "green": float(green.mean()),
+        "bark": float(bark.mean()),
+        "latex": float(latex.mean()),
+    }
+
+
+def decide(img, mode, sub_mode=''):
+    """
+    A classify_content-shaped result when the thumbnail settles the scan, else None.
+    """
+    if not enabled() or img is None or (mode == 'tree' and sub_mode):
+        return None
+    with tracing.stage("content_prefilter"):
+        fractions = coverage(img)
+    decision = None
+    if mode == 'latex':
+        if fractions["latex"] >= LATEX_MIN_COVERAGE:
+            decision = dict(LATEX_CLASSIFICATION)
+    elif mode == 'tree' and fractions["latex"] <= MAX_LATEX_IN_TREE:
+        part = None
+        if fractions["green"] >= LEAF_MIN_GREEN and fractions["bark"] <= LEAF_MAX_BARK:
+            part, score = 'leaf', fractions["green"]
+        elif fractions["bark"] >= TRUNK_MIN_BARK and fractions["green"] <= TRUNK_MAX_GREEN:
+            part, score = 'trunk', fractions["bark"]
+        if part is not None:
+            decision = {'is_tree': True, 'primary_part': part, 'confidence': round(score, 3)}
+    tracing.record_cache("content_prefilter", decision is not None)
+    return decision
+
+
+# ----------------------------------------------------------------------
+# Agreement with the full cascade
+# ----------------------------------------------------------------------
+def agrees(decision, classification, mode):
+    """
+    Whether the prefilter's decision leads to the same outcome as classify_content.
+    """
+    if mode == 'latex':
+        # Only a strong leaf/trunk or non-plant verdict can reject a latex scan.
+        strong = (
+            (classification['primary_part'] in ('leaf', 'trunk') and classification['confidence'] >= 0.80)
+            or (not classification['is_tree'] and classification['confidence'] >= 0.85)
+        )
+        return not strong
+    return classification['primary_part'] == decision['primary_part']
+
+
+def evaluate(items, classify):
+    """
+    Runs the prefilter and `classify` (classify_content) on every (item, img)
+    and summarizes how often the prefilter decided and agreed.
+    """
+    report = {"images": 0, "decided": 0, "agreed": 0, "by_decision": {}, "disagreements": [],
+              "prefilter_ms": 0.0, "cascade_ms": 0.0}
+    for item, img in items:
+        if img is None:
+            continue
+        report["images"] += 1
+        start = time.perf_counter()
+        decision = decide(img, item['mode'], item.get('sub_mode') or '')
+        report["prefilter_ms"] += (time.perf_counter() - start) * 1000
+        start = time.perf_counter()
+        classification = classify(img)
+        report["cascade_ms"] += (time.perf_counter() - start) * 1000
+        if decision is None:
+            continue
+        label = 'latex' if item['mode'] == 'latex' else decision['primary_part']
+        counts = report["by_decision"].setdefault(label, {"decided": 0, "agreed": 0})
+        report["decided"] += 1
+        counts["decided"] += 1
+        if agrees(decision, classification, item['mode']):
+            report["agreed"] += 1
+            counts["agreed"] += 1
+        else:
+            report["disagreements"].append({
+                "id": item['id'], "prefilter": label,
+                "cascade": classification['primary_part'], "confidence": round(float(classification['confidence']), 3),
+            })
+
+    images = report["images"]
+    report["decided_rate"] = round(report["decided"] / images, 3) if images else 0.0
+    report["agreement"] = round(report["agreed"] / report["decided"], 3) if report["decided"] else None
+    report["prefilter_ms"] = round(report["prefilter_ms"] / images, 3) if images else 0.0
+    report["cascade_ms"] = round(report["cascade_ms"] / images, 3) if images else 0.0
+    return report
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="content_prefilter.py", description="Thumbnail prefilter for classify_content")
+    sub = parser.add_subparsers(dest="command", required=True)
+    run = sub.add_parser("evaluate", help="Measure agreement with classify_content on a corpus")
+    run.add_argument("source", help="Directory, glob pattern, or JSON-lines manifest (as for main.py batch)")
+    run.add_argument("--mode", default="tree", choices=["tree", "latex"], help="Mode for directory/glob sources")
+    run.add_argument("--sub-mode", default="", help="Sub mode (leaf/trunk) for directory/glob sources")
+    run.add_argument("--out", help="Write the report JSON here as well")
+    args = parser.parse_args(argv)
+
+    import batch
+    import main as ai
+    items = batch.load_items(args.source, args.mode, args.sub_mode)
+    report = evaluate(((item, ai.download_image(item['source'])) for item in items), ai.classify_content)
+    text = json.dumps(report, indent=2)
+    if args.out:
+        with open(args.out, 'w') as f:
+            f.write(text + "\n")
+    print(text)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,126 @@
+"""
+Per-request deadline.
+
+Callers pass an absolute deadline in Unix epoch milliseconds
+(`main.py <mode> <image> [sub_mode] --deadline <ms>`, or `"deadline"` on a
+service request). Like the timing trace it lives in a context variable, so
+stages on other threads see it as long as they run inside
+`contextvars.copy_context()`.
+
+The detection itself always runs. Optional work is skipped once the time left
+drops below its reserve:
+  llm             insights from the LLM backends (knowledge-base answers still apply)
+  annotation      the annotated image written to the output directory
+  classification  the generic classifier that only validates a part the user chose,
+                  or the latex photo
+Reserves default to RESERVE_MS and can be changed with
+RUBBERSENSE_DEADLINE_RESERVE_<PART>_MS. LLM calls that do start are also cut
+off at the deadline.
+
+The response then carries "partial": true and "skipped": [parts], and each
+skip is recorded as a "skipped.<part>" fallback in the trace.
+"""
+import contextvars
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+import tracing
+
+RESERVE_MS = {"llm": 4000, "annotation": 500, "classification": 1500}
+
+_CURRENT = contextvars.ContextVar("rubbersense_deadline", default=None)
+
+
+def reserve_seconds(part):
+    raw = os.environ.get(f"RUBBERSENSE_DEADLINE_RESERVE_{part.upper()}_MS")
+    if raw not in (None, ""):
+        try:
+            return max(0.0, float(raw)) / 1000.0
+        except ValueError:
+            pass
+    return RESERVE_MS.get(part, 0) / 1000.0
+
+
+def parse(value):
+    """
+    Epoch milliseconds from a flag or JSON value, or None if absent or invalid.
+    """
+    if value in (None, "", False):
+        return None
+    try:
+        value = float(value)
+    except (TypeError, ValueError):
+        return None
+    return value if value > 0 else None
+
+
+class Deadline:
+    def __init__(self, at_ms):
+        self.at = at_ms / 1000.0
+        self._lock = threading.Lock()
+        self.skipped = []
+
+    def remaining(self):
+        return self.at - time.time()
+
+    def allows(self, part):
+        if self.remaining() >= reserve_seconds(part):
+            return True
+        with self._lock:
+            first = part not in self.skipped
+            if first:
+                self.skipped.append(part)
+        if first:
+            tracing.record_fallback(f"skipped.{part}")
+        return False
+
+
+def current():
+    return _CURRENT.get()
+
+
+@contextmanager
+def scope(at_ms):
+    """
+    Makes `at_ms` the deadline of the enclosed request. Yields the Deadline
+    (None when no deadline was given).
+    """
+    if at_ms is None:
+        yield None
+        return
+    active = Deadline(at_ms)
+    token = _CURRENT.set(active)
+    try:
+        yield active
+    finally:
+        _CURRENT.reset(token)
+
+
+def allows(part):
+    """
+    Whether optional work `part` still fits. Always True without a deadline.
+    """
+    active = _CURRENT.get()
+    return active is None or active.allows(part)
+
+
+def cap(seconds):
+    """
+    `seconds`, shortened to the time left before the deadline (never below 0.1s).
+    """
+    active = _CURRENT.get()
+    if active is None:
+        return seconds
+    return max(0.1, min(seconds, active.remaining()))
+
+
+def attach(result, active):
+    """
+    Marks a dict response as partial when the deadline made it skip work.
+    """
+    if active is not None and active.skipped and isinstance(result, dict):
+        result["partial"] = True
+        result["skipped"] = list(active.skipped)
+    return result
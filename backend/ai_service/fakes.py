@@ -0,0 +1,97 @@
+"""
+Fakes and synthetic images shared by the unit tests.
+
+FakeClassifier stands in for an ultralytics model behind the ModelManager
+(register it with FAKE_NAMES[name]); synthetic_image, frame and photo build
+deterministic test images.
+"""
+import time
+
+import cv2
+import numpy as np
+
+
+class FakeScalar:
+    def __init__(self, value):
+        self.value = value
+
+    def item(self):
+        return self.value
+
+
+class FakeProbs:
+    def __init__(self, data):
+        order = list(np.argsort(data)[::-1])
+        self.data = [float(v) for v in data]
+        self.top1 = int(order[0])
+        self.top5 = [int(i) for i in order[:5]]
+        self.top1conf = FakeScalar(self.data[self.top1])
+
+
+class FakeResult:
+    def __init__(self, names, probs):
+        self.names = names
+        self.probs = probs
+        self.boxes = None
+        self.obb = None
+
+
+class FakeClassifier:
+    """
+    Deterministic stand-in for an ultralytics classifier. Like a real predictor it
+    is not re-entrant: concurrent calls on the same instance raise.
+    """
+
+    def __init__(self, names):
+        self.names = dict(enumerate(names))
+        self.busy = False
+
+    def __call__(self, img, verbose=False):
+        if self.busy:
+            raise RuntimeError("predictor shared between threads")
+        self.busy = True
+        try:
+            time.sleep(0.001)
+            seed = int(img[::7, ::7].sum()) % 100003
+            data = np.random.default_rng(seed).dirichlet(np.ones(len(self.names)))
+            return [FakeResult(self.names, FakeProbs(data))]
+        finally:
+            self.busy = False
+
+
+FAKE_NAMES = {
+    'cls': ['tree bark', 'oak leaf', 'keyboard', 'green plant', 'wall', 'log', 'paper', 'fern'],
+    'leaf': ['Healthy', 'Powdery_Mildew', 'Leaf_Spot', 'Anthracnose'],
+    'trunk': ['rubber tree', 'bark rot', 'black line disease', 'pink mold disease'],
+    'latex': ['white latex', 'yellow latex', 'latex with water', 'cup lump'],
+}
+
+
+def synthetic_image(seed):
+    rng = np.random.default_rng(seed)
+    img = np.zeros((160, 160, 3), dtype=np.uint8)
+    img[:] = rng.integers(0, 256, 3, dtype=np.uint8)
+    noise = rng.integers(0, 60, (160, 160, 3), dtype=np.uint8)
+    img = img // 2 + noise
+    img[40:120, 60:100] = rng.integers(0, 256, 3, dtype=np.uint8)
+    return img
+
+
+def frame(bgr, seed=0):
+    rng = np.random.default_rng(seed)
+    img = np.zeros((240, 320, 3), dtype=np.int16)
+    img[:] = bgr
+    img += rng.integers(-25, 25, img.shape, dtype=np.int16)
+    return np.clip(img, 0, 255).astype(np.uint8)
+
+
+LEAF = frame((40, 160, 60))
+BARK = frame((60, 80, 110))
+LATEX = frame((235, 240, 245))
+
+
+def photo(seed):
+    # Smooth, photo-like content plus grain; pure noise has no stable low frequencies.
+    rng = np.random.default_rng(seed)
+    base = cv2.GaussianBlur(rng.integers(0, 256, (240, 320, 3), dtype=np.uint8), (0, 0), 12)
+    return cv2.add(base, rng.integers(0, 40, base.shape, dtype=np.uint8))
@@ -0,0 +1,144 @@
+"""
+On-disk cache of per-image intermediate features.
+
+A re-analysis usually only wants fresh insights or a new model version, so the
+expensive intermediate results of a scan are kept per image:
+  classifier outputs  keyed by the weights of the model(s) that produced them
+  masks               leaf / latex segmentation, stored as PNG
+  spot statistics     spot count and the contour overlay of the annotation
+  measurements        trunk girth, texture and color
+Each entry carries a version string built from the stage's code version, the
+models it used and the versions of the stages it read from. A stage whose
+version changed is recomputed; everything else is read back, so re-running
+the insights of an old scan costs the image load and the LLM call.
+
+Enabled by RUBBERSENSE_FEATURE_CACHE_DIR. Entries live in
+<dir>/<digest[:2]>/<digest>/<stage>.json, where digest is the hash of the
+decoded pixels. Like the timing trace, the image being analyzed is held in a
+context variable, so stages on other threads find it as long as they run
+inside `contextvars.copy_context()`.
+"""
+import base64
+import contextvars
+import hashlib
+import json
+import os
+import sys
+import threading
+from contextlib import contextmanager
+
+import cv2
+import numpy as np
+
+import tracing
+
+_CURRENT = contextvars.ContextVar("rubbersense_feature_image", default=None)
+
+
+def cache_dir():
+    return os.environ.get("RUBBERSENSE_FEATURE_CACHE_DIR") or None
+
+
+def enabled():
+    return cache_dir() is not None
+
+
+def image_digest(img):
+    digest = hashlib.sha1(str(img.shape).encode("utf-8"))
+    digest.update(np.ascontiguousarray(img).data)
+    return digest.hexdigest()
+
+
+@contextmanager
+def scope(img):
+    """
+    Makes `img` the image whose features `fetch` reads and writes. Without a
+    cache directory (or image) features are computed as usual.
+    """
+    root = cache_dir()
+    if root is None or img is None:
+        yield None
+        return
+    with tracing.stage("features.digest"):
+        digest = image_digest(img)
+    entry_dir = os.path.join(root, digest[:2], digest)
+    token = _CURRENT.set(entry_dir)
+    try:
+        yield entry_dir
+    finally:
+        _CURRENT.reset(token)
+
+
+def _entry_path(entry_dir, stage):
+    return os.path.join(entry_dir, stage + ".json")
+
+
+def _read(path, version):
+    try:
+        with open(path) as f:
+            entry = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if not isinstance(entry, dict) or entry.get("version") != version:
+        return None
+    return entry
+
+
+def _write(path, version, value, encode=None):
+    try:
+        if encode is not None:
+            value = encode(value)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp, "w") as f:
+            json.dump({"version": version, "value": value}, f, separators=(",", ":"))
+        os.replace(tmp, path)
+    except Exception as e:
+        sys.stderr.write(f"⚠️ [Features] Could not cache {os.path.basename(path)}: {e}\n")
+
+
+def fetch(stage, version, compute, encode=None, decode=None):
+    """
+    The cached value of `stage` for the current image if it was stored under
+    `version`, else compute() (stored for next time). `encode` turns the value
+    into JSON data and `decode` turns it back.
+    """
+    entry_dir = _CURRENT.get()
+    if entry_dir is None:
+        return compute()
+    path = _entry_path(entry_dir, stage)
+    entry = _read(path, version)
+    if entry is not None:
+        try:
+            value = decode(entry["value"]) if decode else entry["value"]
+        except Exception as e:
+            sys.stderr.write(f"⚠️ [Features] Ignoring unreadable {stage} entry: {e}\n")
+        else:
+            tracing.record_cache(f"features.{stage}", True)
+            return value
+    tracing.record_cache(f"features.{stage}", False)
+    value = compute()
+    _write(path, version, value, encode)
+    return value
+
+
+def pack_mask(mask):
+    """
+    A single-channel uint8 mask as base64 PNG text (None stays None).
+    """
+    if mask is None:
+        return None
+    ok, png = cv2.imencode(".png", mask)
+    if not ok:
+        raise ValueError("PNG encoding failed")
+    return base64.b64encode(png.tobytes()).decode("ascii")
+
+
+def unpack_mask(text):
+    if text is None:
+        return None
+    png = np.frombuffer(base64.b64decode(text), dtype=np.uint8)
+    mask = cv2.imdecode(png, cv2.IMREAD_UNCHANGED)
+    if mask is None:
+        raise ValueError("PNG decoding failed")
+    return mask
@@ -0,0 +1,147 @@
+"""
+Local stand-in for the Groq chat completions API.
+
+Usage:
+  python groq_stub.py [--port 0] [--latency-ms 800] [--jitter-ms 200] [--failure-rate 0.05]
+  GROQ_BASE_URL=http://127.0.0.1:<port>/openai/v1 python main.py tree <image>
+
+Answers any POST ending in /chat/completions with an OpenAI-format response
+whose content is canned leaf or latex insights (picked from the prompt), after
+the configured latency. A fraction of requests fail with HTTP 500 so the
+fallback paths are exercised under load.
+"""
+import argparse
+import json
+import random
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+STUB_LEAF_INSIGHTS = {
+    "diagnosis": "Benchmark stub diagnosis.",
+    "treatment": ["Benchmark stub treatment"],
+    "prevention": ["Benchmark stub prevention"],
+    "severity_reasoning": "Benchmark stub.",
+    "tappability_advice": "Benchmark stub.",
+}
+STUB_LATEX_INSIGHTS = {
+    "quality_assessment": "Benchmark stub assessment.",
+    "processing_advice": "Benchmark stub processing.",
+    "contamination_handling": "Benchmark stub handling.",
+    "market_value_insight": "Benchmark stub market.",
+    "preservation_tips": "Benchmark stub preservation.",
+    "recommended_end_products": ["Benchmark gloves"],
+    "grade_based_product_recommendations": [],
+    "primary_recommended_product": "Benchmark gloves",
+    "market_analysis": {"trend": "stable", "estimated_price_range_php": "50-60", "reasoning": "stub"},
+}
+
+
+class GroqStub:
+    def __init__(self, latency_ms=0.0, jitter_ms=0.0, failure_rate=0.0, seed=None):
+        self.latency_ms = float(latency_ms)
+        self.jitter_ms = float(jitter_ms)
+        self.failure_rate = float(failure_rate)
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self.requests = 0
+        self.failures = 0
+        self._server = None
+
+    def _next(self):
+        with self._lock:
+            self.requests += 1
+            delay = max(0.0, self.latency_ms + self._random.uniform(-self.jitter_ms, self.jitter_ms))
+            fail = self._random.random() < self.failure_rate
+            if fail:
+                self.failures += 1
+        return delay / 1000.0, fail
+
+    def start(self, host="127.0.0.1", port=0):
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                length = int(self.headers.get("Content-Length") or 0)
+                raw = self.rfile.read(length) if length else b""
+                if not self.path.rstrip('/').endswith("/chat/completions"):
+                    self._reply(404, {"error": {"message": f"Unknown path: {self.path}"}})
+                    return
+
+                delay, fail = stub._next()
+                time.sleep(delay)
+                if fail:
+                    self._reply(500, {"error": {"message": "Injected failure"}})
+                    return
+
+                try:
+                    prompt = json.loads(raw or b"{}")["messages"][-1]["content"]
+                except (ValueError, KeyError, IndexError, TypeError):
+                    prompt = ""
+                insights = STUB_LATEX_INSIGHTS if "latex" in prompt.lower() else STUB_LEAF_INSIGHTS
+                self._reply(200, {
+                    "id": "stub",
+                    "object": "chat.completion",
+                    "model": "stub",
+                    "choices": [{
+                        "index": 0,
+                        "message": {"role": "assistant", "content": json.dumps(insights)},
+                        "finish_reason": "stop",
+                    }],
+                })
+
+            def _reply(self, status, payload):
+                data = json.dumps(payload).encode('utf-8')
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def log_message(self, *args):
+                pass
+
+        self._server = ThreadingHTTPServer((host, port), Handler)
+        self._server.daemon_threads = True
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+        return self
+
+    @property
+    def base_url(self):
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}/openai/v1"
+
+    def stats(self):
+        with self._lock:
+            return {"requests": self.requests, "failures": self.failures}
+
+    def stop(self):
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Local Groq stand-in")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=0)
+    parser.add_argument("--latency-ms", type=float, default=800.0)
+    parser.add_argument("--jitter-ms", type=float, default=0.0)
+    parser.add_argument("--failure-rate", type=float, default=0.0)
+    args = parser.parse_args(argv)
+
+    stub = GroqStub(args.latency_ms, args.jitter_ms, args.failure_rate).start(args.host, args.port)
+    sys.stderr.write(f"🧪 [Groq stub] GROQ_BASE_URL={stub.base_url}\n")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        stub.stop()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,298 @@
+"""
+Precomputed insight records for every class the models can emit.
+
+Records are keyed by (part, class, band):
+  leaf   Leaf.pt classes x spot-count severity (none/moderate/high/critical,
+         the thresholds analyze_leaf_with_model uses)
+  trunk  Trunks.pt labels from disease_mapping (their severity is fixed by the label)
+  latex  Latex.pt classes and heuristic grades x contamination level (none/low/medium/high)
+Each record has the same shape as the LLM's JSON answer, so it drops into the
+pipeline wherever get_groq_analysis / get_groq_latex_analysis output is used.
+
+Build:
+  python knowledge_base.py build [--out knowledge_base.json.gz] [--source curated | llm] [--from-models]
+
+--source curated compiles the offline knowledge in llm.py; --source llm asks the
+configured LLM backends once per record (curated text where they fail).
+--from-models adds the class names stored in the loaded weights.
+
+At runtime the store (RUBBERSENSE_KB_PATH, default knowledge_base.json.gz next
+to this file) is loaded once; if it has not been built, the curated records are
+compiled in memory instead. Scans whose class is in the store never reach the
+LLM; uncommon classes still go to it. RUBBERSENSE_KB=0 disables lookups.
+"""
+import argparse
+import copy
+import gzip
+import json
+import os
+import re
+import sys
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+
+import llm
+import tracing
+from disease_mapping import map_trunk_disease
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_STORE_PATH = os.path.join(SCRIPT_DIR, 'knowledge_base.json.gz')
+STORE_VERSION = 1
+
+LEAF_CLASSES = [
+    "Healthy", "Powdery_Mildew", "Leaf_Spot", "Anthracnose", "Corynespora_Leaf_Fall",
+    "Bird_Eye_Spot", "Leaf_Blight", "No disease detected",
+]
+TRUNK_LABELS = [
+    "Rubber Tree", "Nayang-Normal", "Rubber Leaves", "Rubber Root", "Bark Rot", "Black Line",
+    "Brown Root Disease", "White Root Disease", "Dry Crust", "Fishbone", "Pink Mold",
+    "Powdery Mildew", "Leaf Pustule",
+]
+LATEX_CLASSES = [
+    "white latex", "yellow latex", "latex with water", "cup lump",
+    "Heuristic grade A latex", "Heuristic grade B latex", "Heuristic grade C latex", "Heuristic grade D latex",
+]
+LEAF_BANDS = ("moderate", "high", "critical")
+CONTAMINATION_LEVELS = ("none", "low", "medium", "high")
+
+# Representative values for the LLM prompt of each band.
+BAND_SPOTS = {"none": 0, "moderate": 10, "high": 35, "critical": 80}
+LATEX_DRC = {"white": 40.0, "yellow": 30.0, "water": 25.0, "cup": 45.0}
+
+
+def normalize(name):
+    return re.sub(r'\s+', ' ', re.sub(r'[_\-]+', ' ', str(name or ''))).strip().lower()
+
+
+def make_key(part, name, band=''):
+    return f"{part}|{normalize(name)}|{band}"
+
+
+def leaf_band(disease_name, spot_count):
+    return "none" if llm.is_healthy_label(disease_name) else llm.leaf_severity_band(spot_count)
+
+
+# ----------------------------------------------------------------------
+# Build
+# ----------------------------------------------------------------------
+def catalog(extra_names=None):
+    """
+    (key, kind, context) for every record to build. `extra_names` maps part -> class names.
+    """
+    extra_names = extra_names or {}
+    entries = []
+
+    for name in LEAF_CLASSES + list(extra_names.get('leaf', [])):
+        bands = ("none",) if llm.is_healthy_label(name) else LEAF_BANDS
+        for band in bands:
+            color = "Green" if band == "none" else "Yellow"
+            context = {"disease_name": name, "confidence": 90.0, "spot_count": BAND_SPOTS[band], "color_name": color}
+            entries.append((make_key('leaf', name, band), 'leaf', context))
+
+    for label in TRUNK_LABELS + list(extra_names.get('trunk', [])):
+        mapped, severity, _ = map_trunk_disease(label)
+        # The trunk pipeline reports the mapped name for healthy labels and the raw label otherwise.
+        shown = mapped if severity == "none" else label
+        context = {"disease_name": shown, "confidence": 90.0, "spot_count": 0, "color_name": "Brown"}
+        for name in {label, shown}:
+            entries.append((make_key('trunk', name), 'leaf', context))
+
+    for name in LATEX_CLASSES + list(extra_names.get('latex', [])):
+        drc = next((v for k, v in LATEX_DRC.items() if k in name.lower()), 35.0)
+        for level in CONTAMINATION_LEVELS:
+            context = {"latex_type": name, "confidence": 90.0, "contamination_level": level, "drc": drc}
+            entries.append((make_key('latex', name, level), 'latex', context))
+    return entries
+
+
+def curated_record(kind, context):
+    if kind == 'leaf':
+        return llm.offline_leaf_insights(**context)
+    return llm.offline_latex_insights(**context)
+
+
+def model_class_names():
+    """
+    Class names stored in the specialised weights that are available locally.
+    """
+    import main as ai
+    names = {}
+    for part in ('leaf', 'trunk', 'latex'):
+        handle = ai.MODEL_MANAGER.get(part)
+        if handle is None:
+            continue
+        with handle.replica() as model:
+            labels = getattr(model, 'names', None) or {}
+            names[part] = list(labels.values()) if isinstance(labels, dict) else list(labels)
+    return names
+
+
+def build_store(source='curated', extra_names=None, concurrency=4):
+    entries = catalog(extra_names)
+
+    def generate(entry):
+        _, kind, context = entry
+        if source == 'llm':
+            insights = llm.generate_insights(kind, context)
+            if insights is not None:
+                return insights, 'llm'
+        return curated_record(kind, context), 'curated'
+
+    with ThreadPoolExecutor(max_workers=max(1, concurrency)) as pool:
+        generated = list(pool.map(generate, entries))
+
+    # Identical records (e.g. latex types sharing text) are stored once.
+    records = []
+    record_ids = {}
+    index = {}
+    origins = {'llm': 0, 'curated': 0}
+    for (key, _, _), (record, origin) in zip(entries, generated):
+        if key in index:
+            continue
+        blob = json.dumps(record, sort_keys=True)
+        if blob not in record_ids:
+            record_ids[blob] = len(records)
+            records.append(record)
+        index[key] = record_ids[blob]
+        origins[origin] += 1
+
+    return {
+        "version": STORE_VERSION,
+        "source": source,
+        "built_at": datetime.now(timezone.utc).isoformat(),
+        "origins": origins,
+        "records": records,
+        "index": index,
+    }
+
+
+def save_store(store, path):
+    tmp = f"{path}.tmp"
+    with gzip.open(tmp, 'wt', encoding='utf-8') as f:
+        json.dump(store, f, separators=(',', ':'))
+    os.replace(tmp, path)
+
+
+# ----------------------------------------------------------------------
+# Runtime
+# ----------------------------------------------------------------------
+class KnowledgeBase:
+    def __init__(self, store):
+        self.source = store.get("source", "curated")
+        self._records = store["records"]
+        self._index = store["index"]
+
+    def __len__(self):
+        return len(self._index)
+
+    def get(self, key):
+        record_id = self._index.get(key)
+        if record_id is None:
+            return None
+        return copy.deepcopy(self._records[record_id])
+
+    def disease(self, disease_name, spot_count):
+        """
+        Leaf class (by spot-count band) or Trunks.pt label. Both arrive through get_groq_analysis.
+        """
+        return (self.get(make_key('leaf', disease_name, leaf_band(disease_name, spot_count)))
+                or self.get(make_key('trunk', disease_name)))
+
+    def knows_disease(self, disease_name):
+        """
+        Whether some record exists for the class, whatever its spot-count band
+        (every band of a leaf class is built together).
+        """
+        return (make_key('leaf', disease_name, leaf_band(disease_name, 0)) in self._index
+                or make_key('trunk', disease_name) in self._index)
+
+    def latex(self, latex_type, contamination_level):
+        return self.get(make_key('latex', latex_type, str(contamination_level or 'none').lower()))
+
+
+_STORE = None
+_STORE_LOCK = threading.Lock()
+
+
+def load(path=None):
+    path = path or os.environ.get("RUBBERSENSE_KB_PATH") or DEFAULT_STORE_PATH
+    if os.path.exists(path):
+        try:
+            with gzip.open(path, 'rt', encoding='utf-8') as f:
+                store = json.load(f)
+            if store.get("version") == STORE_VERSION:
+                return KnowledgeBase(store)
+            sys.stderr.write(f"⚠️ [KB] {path} has store version {store.get('version')}; rebuild it.\n")
+        except (OSError, ValueError, KeyError) as e:
+            sys.stderr.write(f"⚠️ [KB] Could not read {path}: {e}\n")
+    return KnowledgeBase(build_store('curated'))
+
+
+def get_store():
+    """
+    The process-wide store, loaded on first use.
+    """
+    global _STORE
+    if _STORE is None:
+        with _STORE_LOCK:
+            if _STORE is None:
+                _STORE = load()
+    return _STORE
+
+
+def reset_store():
+    global _STORE
+    with _STORE_LOCK:
+        _STORE = None
+
+
+def enabled():
+    return os.environ.get("RUBBERSENSE_KB", "1") != "0"
+
+
+def lookup_disease(disease_name, spot_count):
+    if not enabled():
+        return None
+    record = get_store().disease(disease_name, spot_count)
+    tracing.record_cache("knowledge_base", record is not None)
+    return record
+
+
+def knows_disease(disease_name):
+    return enabled() and get_store().knows_disease(disease_name)
+
+
+def lookup_latex(latex_type, contamination_level):
+    if not enabled():
+        return None
+    record = get_store().latex(latex_type, contamination_level)
+    tracing.record_cache("knowledge_base", record is not None)
+    return record
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Build the local recommendation knowledge base")
+    sub = parser.add_subparsers(dest="command", required=True)
+    build = sub.add_parser("build", help="Compile the store")
+    build.add_argument("--out", default=DEFAULT_STORE_PATH)
+    build.add_argument("--source", default="curated", choices=["curated", "llm"])
+    build.add_argument("--from-models", action="store_true", help="Add class names read from the model weights")
+    build.add_argument("--concurrency", type=int, default=4, help="Parallel LLM requests with --source llm")
+    args = parser.parse_args(argv)
+
+    extra = model_class_names() if args.from_models else None
+    store = build_store(args.source, extra, args.concurrency)
+    save_store(store, args.out)
+    print(json.dumps({
+        "out": os.path.abspath(args.out),
+        "keys": len(store["index"]),
+        "records": len(store["records"]),
+        "origins": store["origins"],
+        "bytes": os.path.getsize(args.out),
+    }))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
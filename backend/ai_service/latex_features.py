@@ -0,0 +1,97 @@
+"""
+Color features of a latex photo, computed once per scan.
+
+Latex mode used to derive its features three times from the full-resolution
+image: estimate_latex_presence_ratio (HSV, white and yellow masks, open/close),
+analyze_latex_with_model (HSV, mean color, gray, inverse threshold, and the
+white/yellow masks again with other bounds in segment_latex_region) and, on
+failure, analyze_latex_heuristic (HSV, mean color and threshold once more).
+LatexFeatures converts the image to HSV and gray once and derives every
+mask, ratio and mean from those, with the same bounds as before:
+  presence_ratio        fraction of latex-colored pixels (white >= V 80, S <= 90)
+  segment_mask          latex region for color analysis (white >= V 100, S <= 60),
+  segmented             or a center crop (segmented False) when under 5% was found
+  gray                  grayscale image, for contamination inside the region
+  avg_color             mean BGR color of the whole image
+  mean_saturation       mean HSV saturation
+  mean_value            mean HSV value
+  contamination_ratio   fraction of dark (gray < 100) pixels
+The features are computed on first use; stages of the scan that ask at the
+same time wait for that computation instead of repeating it.
+"""
+import threading
+
+import cv2
+import numpy as np
+
+import tracing
+
+# HSV bounds of latex-colored pixels.
+PRESENCE_WHITE = (np.array([0, 0, 80]), np.array([180, 90, 255]))
+SEGMENT_WHITE = (np.array([0, 0, 100]), np.array([180, 60, 255]))
+YELLOW = (np.array([15, 60, 100]), np.array([40, 200, 255]))
+
+MORPH_KERNEL = np.ones((5, 5), np.uint8)
+# Below this fraction of latex pixels the segmentation falls back to a center crop.
+MIN_SEGMENTED = 0.05
+CONTAMINATION_GRAY = 100
+
+FIELDS = (
+    'presence_ratio', 'segment_mask', 'segmented', 'gray', 'avg_color',
+    'mean_saturation', 'mean_value', 'contamination_ratio',
+)
+
+
+def _clean(mask):
+    mask = cv2.morphologyEx(mask, cv2.MORPH_OPEN, MORPH_KERNEL)
+    return cv2.morphologyEx(mask, cv2.MORPH_CLOSE, MORPH_KERNEL)
+
+
+def center_crop_mask(shape):
+    h, w = shape[:2]
+    center_h, center_w = h // 2, w // 2
+    crop_h, crop_w = h // 3, w // 3
+    mask = np.zeros((h, w), dtype=np.uint8)
+    mask[center_h-crop_h//2:center_h+crop_h//2, center_w-crop_w//2:center_w+crop_w//2] = 255
+    return mask
+
+
+class LatexFeatures:
+    def __init__(self, img):
+        self.img = img
+        self._lock = threading.Lock()
+
+    def __getattr__(self, name):
+        # Only reached while the features are not computed yet.
+        if name not in FIELDS:
+            raise AttributeError(name)
+        with self._lock:
+            if name not in self.__dict__:
+                with tracing.stage("latex.features"):
+                    self.__dict__.update(self._compute())
+        return self.__dict__[name]
+
+    def _compute(self):
+        img = self.img
+        hsv = cv2.cvtColor(img, cv2.COLOR_BGR2HSV)
+        gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
+        total_pixels = float(img.shape[0] * img.shape[1])
+
+        mask_yellow = cv2.inRange(hsv, *YELLOW)
+        presence_mask = _clean(cv2.bitwise_or(cv2.inRange(hsv, *PRESENCE_WHITE), mask_yellow))
+        segment_mask = _clean(cv2.bitwise_or(cv2.inRange(hsv, *SEGMENT_WHITE), mask_yellow))
+        segmented = cv2.countNonZero(segment_mask) >= img.shape[0] * img.shape[1] * MIN_SEGMENTED
+        if not segmented:
+            segment_mask = center_crop_mask(img.shape)
+
+        _, dark = cv2.threshold(gray, CONTAMINATION_GRAY, 255, cv2.THRESH_BINARY_INV)
+        return {
+            'presence_ratio': float(cv2.countNonZero(presence_mask)) / total_pixels if total_pixels > 0 else 0.0,
+            'segment_mask': segment_mask,
+            'segmented': segmented,
+            'gray': gray,
+            'avg_color': np.average(np.average(img, axis=0), axis=0),
+            'mean_saturation': np.mean(hsv[:, :, 1]),
+            'mean_value': np.mean(hsv[:, :, 2]),
+            'contamination_ratio': cv2.countNonZero(dark) / (img.shape[0] * img.shape[1]),
+        }
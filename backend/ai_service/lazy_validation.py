@@ -0,0 +1,165 @@
+"""
+Lazy subject validation for scans whose subject the user already chose.
+
+With sub mode trunk / leaf, and in latex mode, classify_content (the generic
+classifier, often followed by Leaf.pt) only matters when it shows a strong
+mismatch. The specialised model runs first instead, and the generic
+validation only runs when the specialised signals leave room for one:
+  latex  the scan can only be rejected when the latex presence ratio and the
+         latex model are both weak, so classify_content runs only then. The
+         rejections are exactly those of the full cascade.
+  trunk  Trunks.pt confidence >= trunk_min_confidence and bark coverage of the
+         thumbnail >= trunk_min_bark (content_prefilter.coverage) skip it.
+  leaf   Leaf.pt confidence >= leaf_min_confidence and green coverage
+         >= leaf_min_green skip it.
+For trunk and leaf the gate is a heuristic with unmeasured thresholds, so it is
+off unless RUBBERSENSE_LAZY_PARTS=1; its rejections are compared with the full
+cascade on a local corpus with
+  python lazy_validation.py evaluate <directory | glob | manifest.jsonl> --sub-mode leaf
+which runs both on every image and reports how often the generic validation
+was skipped, any scan the two would reject differently, and the time saved.
+
+Responses list the validators that ran, and those skipped, under "validation".
+Batch runs (batch.py) only batch the generic classifier for the scans the gate
+leaves open.
+RUBBERSENSE_LAZY_VALIDATION=0 always runs the full cascade, latex included; the
+trunk / leaf gate can be tuned with RUBBERSENSE_LAZY_<NAME> (e.g. RUBBERSENSE_LAZY_LEAF_MIN_CONFIDENCE=90).
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+import tracing
+
+THRESHOLDS = {
+    # Specialised model confidence, in percent as the analysis reports it.
+    "trunk_min_confidence": 50.0,
+    "leaf_min_confidence": 80.0,
+    # Thumbnail coverage fractions.
+    "trunk_min_bark": 0.4,
+    "leaf_min_green": 0.3,
+}
+
+
+def enabled():
+    return os.environ.get("RUBBERSENSE_LAZY_VALIDATION", "1") != "0"
+
+
+def parts_enabled():
+    """
+    Whether the trunk / leaf gate is on. Off by default until `evaluate` has
+    measured its agreement with the full cascade on real scans.
+    """
+    return enabled() and os.environ.get("RUBBERSENSE_LAZY_PARTS", "0") == "1"
+
+
+def threshold(name):
+    raw = os.environ.get(f"RUBBERSENSE_LAZY_{name.upper()}")
+    if raw not in (None, ""):
+        try:
+            return float(raw)
+        except ValueError:
+            pass
+    return THRESHOLDS[name]
+
+
+def settled(part, confidence, fractions):
+    """
+    Whether the specialised model's `confidence` (percent) and the thumbnail
+    coverage `fractions` confirm the user-chosen `part` well enough to skip
+    classify_content.
+    """
+    if part == 'trunk':
+        confirmed = (confidence >= threshold("trunk_min_confidence")
+                     and fractions["bark"] >= threshold("trunk_min_bark"))
+    elif part == 'leaf':
+        confirmed = (confidence >= threshold("leaf_min_confidence")
+                     and fractions["green"] >= threshold("leaf_min_green"))
+    else:
+        confirmed = False
+    tracing.record_cache("lazy_validation", confirmed)
+    return confirmed
+
+
+def new_record():
+    return {"ran": [], "skipped": []}
+
+
+# ----------------------------------------------------------------------
+# Agreement with the full cascade
+# ----------------------------------------------------------------------
+def evaluate(items, lazy, full, rejects):
+    """
+    Runs `lazy` (validate_user_part) and `full` (classify_scan) on every
+    (item, img) and compares the rejections `rejects(classification, part)`
+    they lead to.
+    """
+    report = {"images": 0, "skipped": 0, "rejected_full": 0, "rejected_lazy": 0,
+              "disagreements": [], "lazy_ms": 0.0, "full_ms": 0.0}
+    for item, img in items:
+        part = (item.get('sub_mode') or '').strip().lower()
+        if img is None or part not in ('trunk', 'leaf'):
+            continue
+        report["images"] += 1
+        record = new_record()
+        start = time.perf_counter()
+        lazy_classification = lazy(img, part, record)
+        report["lazy_ms"] += (time.perf_counter() - start) * 1000
+        start = time.perf_counter()
+        full_classification = full(img, part)
+        report["full_ms"] += (time.perf_counter() - start) * 1000
+
+        skipped = "classify_content" in record["skipped"]
+        lazy_rejects = rejects(lazy_classification, part)
+        full_rejects = rejects(full_classification, part)
+        report["skipped"] += skipped
+        report["rejected_lazy"] += lazy_rejects
+        report["rejected_full"] += full_rejects
+        if lazy_rejects != full_rejects:
+            report["disagreements"].append({
+                "id": item['id'], "sub_mode": part, "lazy_rejects": lazy_rejects, "full_rejects": full_rejects,
+                "cascade": full_classification['primary_part'],
+                "confidence": round(float(full_classification['confidence']), 3),
+            })
+
+    images = report["images"]
+    report["skipped_rate"] = round(report["skipped"] / images, 3) if images else 0.0
+    report["agreement"] = round(1 - len(report["disagreements"]) / images, 3) if images else None
+    report["lazy_ms"] = round(report["lazy_ms"] / images, 3) if images else 0.0
+    report["full_ms"] = round(report["full_ms"] / images, 3) if images else 0.0
+    return report
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="lazy_validation.py", description="Lazy validation of user-chosen sub modes")
+    sub = parser.add_subparsers(dest="command", required=True)
+    run = sub.add_parser("evaluate", help="Compare rejections with the full classify_content cascade on a corpus")
+    run.add_argument("source", help="Directory, glob pattern, or JSON-lines manifest (as for main.py batch)")
+    run.add_argument("--sub-mode", default="", help="Sub mode (leaf/trunk) for directory/glob sources")
+    run.add_argument("--out", help="Write the report JSON here as well")
+    args = parser.parse_args(argv)
+
+    import batch
+    import main as ai
+    # Measure the gate, whether or not it is on by default.
+    os.environ["RUBBERSENSE_LAZY_VALIDATION"] = "1"
+    os.environ["RUBBERSENSE_LAZY_PARTS"] = "1"
+    items = batch.load_items(args.source, "tree", args.sub_mode)
+    report = evaluate(
+        ((item, ai.download_image(item['source'])) for item in items),
+        lambda img, part, record: ai.validate_user_part(img, part, record)[0],
+        lambda img, part: ai.classify_scan(img, 'tree', part),
+        ai.strong_part_mismatch,
+    )
+    text = json.dumps(report, indent=2)
+    if args.out:
+        with open(args.out, 'w') as f:
+            f.write(text + "\n")
+    print(text)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
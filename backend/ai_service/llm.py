@@ -0,0 +1,555 @@
+"""
+LLM providers for the leaf and latex insights.
+
+Backends are tried in the order given by RUBBERSENSE_LLM_BACKENDS
+(comma-separated, default "groq"):
+  groq     Groq chat completions. Needs GROQ_API_KEY; GROQ_BASE_URL overrides
+           the endpoint (see groq_stub.py).
+  local    Any OpenAI-compatible server (llama.cpp, vLLM, Ollama, ...) at
+           RUBBERSENSE_LLM_LOCAL_URL (default http://127.0.0.1:11434/v1),
+           model RUBBERSENSE_LLM_LOCAL_MODEL, optional RUBBERSENSE_LLM_LOCAL_API_KEY.
+  offline  Canned agronomy knowledge. No network, always answers.
+
+Each backend has its own RUBBERSENSE_LLM_<NAME>_TIMEOUT (seconds),
+RUBBERSENSE_LLM_<NAME>_MAX_TOKENS (unset: no limit is sent, as the JSON replies
+must not be cut short) and RUBBERSENSE_LLM_<NAME>_CONCURRENCY
+(in-flight calls per process); timeouts are further capped by the request
+deadline, if any (see deadline.py). "local,offline" serves latency-sensitive or
+air-gapped nodes, "offline" runs the pipeline in tests without the network.
+
+Prompts, JSON parsing and fallbacks are handled here once. A backend that is
+unavailable, times out, fails or returns unparseable JSON is recorded as a
+fallback and the next one is tried. If every backend fails the caller gets
+None and uses its own placeholder text.
+"""
+import copy
+import json
+import os
+import re
+import sys
+import threading
+
+import requests
+
+import deadline
+import tracing
+from disease_mapping import map_trunk_disease
+
+DEFAULT_GROQ_BASE_URL = "https://api.groq.com/openai/v1"
+DEFAULT_LOCAL_BASE_URL = "http://127.0.0.1:11434/v1"
+
+LEAF_PROMPT = """
+    You are an expert plant pathologist specializing in rubber trees (Hevea brasiliensis).
+    Analyze this leaf scan result:
+    - Detected Condition: {disease_name}
+    - AI Confidence: {confidence:.1f}%
+    - Visual Traits: {visual_traits}
+
+    Provide a valid JSON response with these keys:
+    1. "diagnosis": A detailed scientific explanation of the condition.
+    2. "treatment": Specific chemical (fungicide names) and organic treatments.
+    3. "prevention": Actionable steps to prevent spread or recurrence.
+    4. "severity_reasoning": Why this is low/medium/high severity based on the spot count and disease type.
+    5. "tappability_advice": Can this tree be tapped? Why/Why not?
+
+    Do not include markdown formatting, just the raw JSON object.
+    """
+
+LATEX_PROMPT = """
+    You are an expert rubber technologist specializing in natural rubber latex quality control.
+    Analyze this latex scan result:
+    - Detected Type: {latex_type}
+    - AI Confidence: {confidence:.1f}%
+    - Contamination Level: {contamination_level}
+    - Estimated Dry Rubber Content (DRC): {drc}%
+
+    Provide a valid JSON response with these keys:
+    1. "quality_assessment": A technical assessment of the latex quality based on the type and visual indicators.
+    2. "processing_advice": Specific steps to process this type of latex for maximum yield/quality.
+    3. "contamination_handling": How to treat or filter the latex if contamination is present.
+    4. "market_value_insight": Brief comment on the potential market grade (e.g., Centrifuged Latex, USS, RSS).
+    5. "preservation_tips": Chemical recommendations (e.g., Ammonia, TMTD) to prevent coagulation before processing.
+    6. "recommended_end_products": Array of 3-6 product-use suggestions based on this latex quality
+       (e.g., "Medical gloves", "Household gloves", "Adhesive latex", "Rubberized asphalt blend").
+    7. "grade_based_product_recommendations": Array of concise recommendations where each item includes product + use case + why.
+    8. "primary_recommended_product": Best single product category for this quality.
+    9. "market_analysis": {{
+        "trend": "stable" | "increasing" | "decreasing",
+        "estimated_price_range_php": "min-max" (e.g., "50-60"),
+        "reasoning": "Reason for the price estimation based on quality and general market knowledge."
+    }}
+
+    Do not include markdown formatting, just the raw JSON object.
+    """
+
+PROMPTS = {'leaf': LEAF_PROMPT, 'latex': LATEX_PROMPT}
+
+
+def build_prompt(kind, context):
+    if kind == 'leaf':
+        context = dict(context)
+        traits = []
+        if context.get('color_name') is not None:
+            traits.append(f"{context['color_name']} color")
+        if context.get('spot_count') is not None:
+            traits.append(f"{context['spot_count']} spots detected")
+        # Speculative requests go out before the image measurements finish.
+        context['visual_traits'] = (", ".join(traits) + ".") if traits else \
+            "not measured yet; judge severity from the condition itself."
+    return PROMPTS[kind].format(**context)
+
+
+def parse_json_content(text):
+    """
+    The JSON object in a model reply, tolerating markdown fences and chatter
+    around it (common with local models). Returns None if there is no object.
+    """
+    if not isinstance(text, str):
+        return None
+    start = text.find('{')
+    end = text.rfind('}')
+    if start < 0 or end <= start:
+        return None
+    try:
+        data = json.loads(text[start:end + 1])
+    except ValueError:
+        return None
+    return data if isinstance(data, dict) else None
+
+
+def _env_number(name, default, cast=float):
+    raw = os.environ.get(name)
+    if raw in (None, ""):
+        return default
+    try:
+        return cast(raw)
+    except ValueError:
+        return default
+
+
+class Backend:
+    """
+    Base class: per-backend limits and the in-flight semaphore.
+    """
+
+    name = None
+    default_timeout = 15.0
+    default_max_tokens = None
+    default_concurrency = 8
+
+    def __init__(self):
+        prefix = f"RUBBERSENSE_LLM_{self.name.upper()}_"
+        self.timeout = _env_number(prefix + "TIMEOUT", self.default_timeout)
+        self.max_tokens = _env_number(prefix + "MAX_TOKENS", self.default_max_tokens, int)
+        self.concurrency = max(1, _env_number(prefix + "CONCURRENCY", self.default_concurrency, int))
+        self._slots = threading.BoundedSemaphore(self.concurrency)
+
+    def available(self):
+        return True
+
+    def generate(self, kind, context):
+        """
+        Insights dict for `kind` ('leaf' or 'latex'), or None on failure.
+        """
+        if not self.available():
+            return None
+        # Waiting longer than the call itself may take is no better than failing over.
+        if not self._slots.acquire(timeout=deadline.cap(self.timeout)):
+            sys.stderr.write(f"⚠️ [LLM] {self.name} saturated ({self.concurrency} in flight).\n")
+            return None
+        try:
+            return self._generate(kind, context)
+        finally:
+            self._slots.release()
+
+    def _generate(self, kind, context):
+        raise NotImplementedError
+
+
+class OpenAICompatibleBackend(Backend):
+    """
+    Chat completions over HTTP in the OpenAI wire format.
+    """
+
+    json_mode = False
+
+    def base_url(self):
+        raise NotImplementedError
+
+    def model(self):
+        raise NotImplementedError
+
+    def api_key(self):
+        return None
+
+    def _generate(self, kind, context):
+        headers = {"Content-Type": "application/json"}
+        api_key = self.api_key()
+        if api_key:
+            headers["Authorization"] = f"Bearer {api_key}"
+        data = {
+            "model": self.model(),
+            "messages": [{"role": "user", "content": build_prompt(kind, context)}],
+            "temperature": 0.3,
+        }
+        if self.max_tokens is not None:
+            data["max_tokens"] = self.max_tokens
+        if self.json_mode:
+            data["response_format"] = {"type": "json_object"}
+
+        try:
+            response = requests.post(
+                self.base_url().rstrip('/') + "/chat/completions",
+                headers=headers, json=data, timeout=deadline.cap(self.timeout),
+            )
+            if response.status_code != 200:
+                sys.stderr.write(f"⚠️ [LLM] {self.name} {kind} analysis failed: HTTP {response.status_code}\n")
+                return None
+            content = response.json()['choices'][0]['message']['content']
+        except Exception as e:
+            sys.stderr.write(f"⚠️ [LLM] {self.name} {kind} analysis failed: {e}\n")
+            return None
+
+        insights = parse_json_content(content)
+        if insights is None:
+            sys.stderr.write(f"⚠️ [LLM] {self.name} returned no JSON object for {kind} analysis.\n")
+        return insights
+
+
+class GroqBackend(OpenAICompatibleBackend):
+    name = "groq"
+    json_mode = True
+
+    def available(self):
+        return bool(os.environ.get("GROQ_API_KEY"))
+
+    def base_url(self):
+        return os.environ.get("GROQ_BASE_URL") or DEFAULT_GROQ_BASE_URL
+
+    def model(self):
+        return os.environ.get("RUBBERSENSE_LLM_GROQ_MODEL") or "llama-3.3-70b-versatile"
+
+    def api_key(self):
+        return os.environ.get("GROQ_API_KEY")
+
+
+class LocalBackend(OpenAICompatibleBackend):
+    name = "local"
+    default_timeout = 30.0
+    default_concurrency = 2
+
+    def base_url(self):
+        return os.environ.get("RUBBERSENSE_LLM_LOCAL_URL") or DEFAULT_LOCAL_BASE_URL
+
+    def model(self):
+        return os.environ.get("RUBBERSENSE_LLM_LOCAL_MODEL") or "llama3.1:8b"
+
+    def api_key(self):
+        return os.environ.get("RUBBERSENSE_LLM_LOCAL_API_KEY")
+
+
+# ----------------------------------------------------------------------
+# Offline knowledge
+# ----------------------------------------------------------------------
+# (keywords, diagnosis, treatment, prevention) for leaf conditions, first match wins.
+LEAF_KNOWLEDGE = [
+    (("powdery", "mildew", "oidium"),
+     "Powdery mildew (Oidium heveae), a fungal infection of young leaves that causes secondary leaf fall during refoliation.",
+     ["Dust sulfur (8-11 kg/ha) at 7-10 day intervals during refoliation", "Wettable sulfur or hexaconazole spray on nursery plants"],
+     ["Start dusting when 10% of trees begin refoliating", "Plant tolerant clones in mildew-prone areas", "Avoid excess nitrogen during wintering"]),
+    (("corynespora", "leaf fall", "cassiicola"),
+     "Corynespora leaf fall, a fungal infection producing lesions with a fishbone pattern and heavy defoliation.",
+     ["Mancozeb or chlorothalonil spray on affected canopy", "Carbendazim on nursery plants"],
+     ["Remove and burn fallen infected leaves", "Replace highly susceptible clones", "Maintain balanced fertilization"]),
+    (("anthracnose", "colletotrichum"),
+     "Colletotrichum leaf disease (anthracnose), a fungal infection causing dark lesions, leaf distortion and shedding.",
+     ["Carbendazim or copper oxychloride spray", "Mancozeb as a protective cover spray"],
+     ["Prune for canopy airflow", "Avoid wounding young leaves", "Spray protectively in prolonged wet weather"]),
+    (("blight", "microcyclus", "salb"),
+     "Leaf blight lesions consistent with a serious fungal infection; South American leaf blight is a quarantine disease.",
+     ["Report to the plant quarantine office before treating", "Chlorothalonil or mancozeb spray on affected trees"],
+     ["Do not move planting material out of the area", "Isolate and monitor neighbouring trees"]),
+    (("bird", "drechslera", "helminthosporium"),
+     "Bird's eye spot, a fungal infection common in nurseries under poor nutrition or shade.",
+     ["Mancozeb spray at 7-10 day intervals in the nursery"],
+     ["Improve nursery nutrition and drainage", "Reduce shading and overcrowding"]),
+    (("pustule", "rust", "algal"),
+     "Leaf pustules consistent with an algal or rust infection of mature leaves.",
+     ["Copper oxychloride spray on affected branches"],
+     ["Improve canopy airflow", "Monitor canopy health after wet periods"]),
+]
+# (keywords, diagnosis, treatment, prevention, tapping advice) for the Trunks.pt bark and root labels.
+TRUNK_KNOWLEDGE = [
+    (("bark rot",),
+     "Bark rot, a fungal (Phytophthora) infection of the tapping panel that leaves sunken, rotting bark.",
+     ["Scrape out rotten bark and paint the wound with metalaxyl or a copper fungicide"],
+     ["Apply a protective fungicide to the panel through the wet season", "Keep the panel clean and well ventilated"],
+     "Stop tapping the affected panel until the renewed bark has healed."),
+    (("black line", "black stripe"),
+     "Black line (black stripe), a Phytophthora infection producing dark vertical lines on the renewing bark.",
+     ["Scrape the affected bark and apply metalaxyl or a copper fungicide"],
+     ["Treat tapping panels weekly during the rains", "Use rain guards on the panel"],
+     "Stop tapping the affected panel and resume once lesions have dried out."),
+    (("brown root",),
+     "Brown root disease (Phellinus noxius), a root rot fungus spreading through root contact.",
+     ["Expose the collar and drench with hexaconazole or propiconazole", "Remove and burn dead trees with their roots"],
+     ["Dig isolation trenches around infected trees", "Remove stumps and woody debris when replanting"],
+     "Stop tapping; trees with root disease decline quickly and may topple."),
+    (("white root",),
+     "White root disease (Rigidoporus microporus), the most destructive root rot of rubber.",
+     ["Collar drench with hexaconazole or propiconazole, repeated every 6 months", "Remove and burn dead trees with their roots"],
+     ["Inspect neighbouring trees' collars for white rhizomorphs", "Plant cover crops and clear infected stumps before replanting"],
+     "Stop tapping and treat the neighbouring trees as well."),
+    (("dry crust",),
+     "Dry crust on the tapping panel, a bark disorder with cracked, dry crust and reduced latex flow.",
+     ["Remove the crust and apply a protective wound dressing"],
+     ["Reduce tapping intensity", "Avoid over-stimulation with ethephon"],
+     "Rest the affected panel and open tapping on healthy bark."),
+    (("fishbone",),
+     "Fishbone-pattern bark lesions on the tapping panel, a fungal infection of the renewing bark.",
+     ["Stop tapping the panel and apply a fungicide to the lesions"],
+     ["Disinfect tapping knives between trees", "Keep the panel dry and well ventilated"],
+     "Stop tapping the affected panel until treatment is complete."),
+    (("pink",),
+     "Pink disease (Erythricium salmonicolor), a fungal infection of branches and forks with a pink mycelial crust.",
+     ["Apply a copper or tridemorph fungicidal paste to the affected bark", "Prune and burn dead branches"],
+     ["Inspect forks during the wet season", "Thin the canopy for airflow"],
+     "Tapping can continue if only branches are affected; treat promptly."),
+    (("root",),
+     "Root disease symptoms consistent with a root rot fungal infection.",
+     ["Collar drench with hexaconazole or propiconazole"],
+     ["Isolate the tree with a trench", "Remove infected stumps"],
+     "Stop tapping until the root infection is treated."),
+    (("canker", "mold", "rot"),
+     "Bark lesions consistent with a fungal canker or rot infection.",
+     ["Scrape the lesion and apply a copper-based fungicide"],
+     ["Avoid bark wounds", "Keep the tapping panel clean"],
+     "Stop tapping near the lesion until it has healed."),
+]
+GENERIC_LEAF_KNOWLEDGE = (
+    "Leaf lesions consistent with a fungal infection.",
+    ["Copper-based fungicide spray", "Mancozeb as a protective cover spray"],
+    ["Remove fallen infected leaves", "Monitor regularly and re-scan after treatment"],
+)
+
+# (keywords, quality, processing, products, primary product, price range PHP/kg)
+LATEX_KNOWLEDGE = [
+    (("white",),
+     "Fresh white latex with good colloidal stability and high dry rubber content.",
+     "Sieve and bulk promptly; suitable for centrifuging into concentrate or for ribbed smoked sheets.",
+     ["Medical gloves", "Household gloves", "Balloons", "Foam products"], "Centrifuged latex concentrate", "70-85"),
+    (("yellow",),
+     "Yellowing latex showing oxidation or early pre-coagulation; colour-sensitive uses are limited.",
+     "Process quickly into crepe or technically specified rubber; avoid mixing with fresh white latex.",
+     ["Technically specified rubber", "Footwear soles", "Mats and flooring"], "Technically specified rubber", "50-62"),
+    (("water", "dilut"),
+     "Diluted latex; water lowers the dry rubber content and the price per kilogram.",
+     "Measure DRC before sale, let it settle and decant, and do not add further water at collection.",
+     ["Adhesive latex", "Rubberized asphalt blend", "Carpet backing"], "Adhesive latex", "45-58"),
+    (("cup", "lump", "coagul"),
+     "Coagulated cup lump; sold on dry weight for crumb (block) rubber.",
+     "Keep lumps clean and shaded, drain free water, and sell to block rubber processors.",
+     ["Tyres", "Technically specified rubber", "Industrial rubber goods"], "Technically specified rubber (TSR 20)", "40-55"),
+]
+GENERIC_LATEX_KNOWLEDGE = (
+    "Latex of uncertain type; grade it by DRC and cleanliness at the buying station.",
+    "Sieve, keep covered and preserve until its DRC is measured.",
+    ["Technically specified rubber", "Industrial rubber goods"], "Technically specified rubber", "45-60",
+)
+GRADE_PRICES = {'A': "70-85", 'B': "60-70", 'C': "50-60", 'D': "35-50"}
+# Heuristic results carry only a grade ("Heuristic grade C latex"); read it as the closest latex type.
+GRADE_TYPES = {'A': "white", 'B': "white", 'C': "yellow", 'D': "water"}
+
+
+def _match(table, text, default):
+    text = str(text or '').lower()
+    for entry in table:
+        if any(keyword in text for keyword in entry[0]):
+            return entry[1:]
+    return default
+
+
+def is_healthy_label(name):
+    """
+    Same healthy-label rule as analyze_leaf_with_model.
+    """
+    name = str(name or '').lower()
+    return "no disease" in name or ("healthy" in name and not any(
+        term in name for term in ("disease", "blight", "spot", "mildew", "rot", "canker", "infect", "rust", "pustule")
+    ))
+
+
+def leaf_severity_band(spot_count):
+    """
+    Spot-count severity, same thresholds as analyze_leaf_with_model.
+    """
+    try:
+        spots = int(spot_count)
+    except (TypeError, ValueError):
+        spots = 0
+    if spots > 50:
+        return "critical"
+    if spots > 20:
+        return "high"
+    return "moderate"
+
+
+LEAF_BAND_TEXT = {
+    "moderate": (
+        "Up to 20 spots indicate an early or light infection (moderate severity).",
+        "Tapping can continue while treating; re-scan to confirm the infection is contained.",
+    ),
+    "high": (
+        "21-50 spots indicate an established infection (high severity).",
+        "Reduce tapping frequency during treatment and resume once new leaves are clean.",
+    ),
+    "critical": (
+        "More than 50 spots indicate widespread infection (critical severity).",
+        "Suspend tapping until the canopy recovers; defoliated trees yield poorly and recover slowly.",
+    ),
+}
+
+HEALTHY_INSIGHTS = {
+    "diagnosis": "No disease detected; the tree appears healthy.",
+    "treatment": ["No treatment needed"],
+    "prevention": ["Continue routine monitoring", "Keep fertilization balanced"],
+    "severity_reasoning": "No lesions attributable to disease were found.",
+    "tappability_advice": "Tree is healthy; tapping can continue on the normal schedule.",
+}
+
+
+def offline_leaf_insights(disease_name, spot_count=0, **_):
+    """
+    Canned insights for a leaf class or a Trunks.pt label (both arrive through get_groq_analysis).
+    """
+    if is_healthy_label(disease_name):
+        return copy.deepcopy(HEALTHY_INSIGHTS)
+
+    leaf = _match(LEAF_KNOWLEDGE, disease_name, None)
+    trunk = None if leaf else _match(TRUNK_KNOWLEDGE, disease_name, None)
+    if trunk:
+        diagnosis, treatment, prevention, tapping = trunk
+        _, severity, _ = map_trunk_disease(str(disease_name))
+        reasoning = f"Rated {severity} severity for trunk and root conditions of this type."
+    else:
+        diagnosis, treatment, prevention = leaf or GENERIC_LEAF_KNOWLEDGE
+        reasoning, tapping = LEAF_BAND_TEXT[leaf_severity_band(spot_count or 0)]
+    return {
+        "diagnosis": diagnosis,
+        "treatment": list(treatment),
+        "prevention": list(prevention),
+        "severity_reasoning": reasoning,
+        "tappability_advice": tapping,
+    }
+
+
+def refine_leaf_insights(insights, disease_name, spot_count):
+    """
+    Fills in the spot-count dependent fields of insights generated before the
+    spots were counted (a speculative request), from the same band text the
+    offline backend uses. Other fields are kept as the backend wrote them.
+    """
+    if not insights or is_healthy_label(disease_name):
+        return insights
+    reasoning, tapping = LEAF_BAND_TEXT[leaf_severity_band(spot_count)]
+    refined = dict(insights)
+    refined["severity_reasoning"] = reasoning
+    refined["tappability_advice"] = tapping
+    return refined
+
+
+def _latex_grade(latex_type):
+    match = re.search(r"\bgrade ([abcd])\b", str(latex_type or '').lower())
+    return match.group(1).upper() if match else None
+
+
+def offline_latex_insights(latex_type, contamination_level="low", **_):
+    grade = _latex_grade(latex_type)
+    described = latex_type if grade is None else GRADE_TYPES[grade]
+    quality, processing, products, primary, price = _match(LATEX_KNOWLEDGE, described, GENERIC_LATEX_KNOWLEDGE)
+    if grade is not None:
+        price = GRADE_PRICES[grade]
+    level = str(contamination_level or 'none').lower()
+    if level in ("high", "medium"):
+        handling = "Filter through a 40-60 mesh sieve, let debris settle and skim; keep collection cups covered."
+    elif level == "low":
+        handling = "Sieve before bulking to remove bark and debris."
+    else:
+        handling = "No contamination treatment needed beyond routine sieving."
+    return {
+        "quality_assessment": quality,
+        "processing_advice": processing,
+        "contamination_handling": handling,
+        "market_value_insight": f"Best sold as {primary.lower()}; clean, well-preserved lots fetch the upper price band.",
+        "preservation_tips": "Add ammonia (0.7% for high-ammonia, or 0.2% with TMTD/ZnO for low-ammonia) within hours of tapping.",
+        "recommended_end_products": list(products),
+        "grade_based_product_recommendations": [f"{product}: suited to this latex quality" for product in products],
+        "primary_recommended_product": primary,
+        "market_analysis": {
+            "trend": "stable",
+            "estimated_price_range_php": price,
+            "reasoning": "Offline estimate from typical buying-station ranges; check current local prices.",
+        },
+    }
+
+
+class OfflineBackend(Backend):
+    name = "offline"
+    default_timeout = 1.0
+    default_concurrency = 64
+
+    def _generate(self, kind, context):
+        if kind == 'leaf':
+            return offline_leaf_insights(**context)
+        return offline_latex_insights(**context)
+
+
+# ----------------------------------------------------------------------
+# Provider chain
+# ----------------------------------------------------------------------
+BACKEND_CLASSES = {cls.name: cls for cls in (GroqBackend, LocalBackend, OfflineBackend)}
+
+_BACKENDS = {}
+_BACKENDS_LOCK = threading.Lock()
+
+
+def get_backend(name):
+    with _BACKENDS_LOCK:
+        backend = _BACKENDS.get(name)
+        if backend is None and name in BACKEND_CLASSES:
+            backend = _BACKENDS[name] = BACKEND_CLASSES[name]()
+        return backend
+
+
+def reset_backends():
+    """
+    Drop cached backends so their limits are re-read from the environment.
+    """
+    with _BACKENDS_LOCK:
+        _BACKENDS.clear()
+
+
+def backend_chain():
+    names = [n.strip().lower() for n in (os.environ.get("RUBBERSENSE_LLM_BACKENDS") or "groq").split(',') if n.strip()]
+    chain = []
+    for name in names:
+        backend = get_backend(name)
+        if backend is None:
+            sys.stderr.write(f"⚠️ [LLM] Unknown backend '{name}' ignored.\n")
+        else:
+            chain.append(backend)
+    return chain
+
+
+def generate_insights(kind, context):
+    """
+    Insights from the first backend in the chain that answers, or None.
+    """
+    for backend in backend_chain():
+        if backend.available():
+            with tracing.stage(f"llm.{backend.name}"):
+                insights = backend.generate(kind, context)
+            if insights is not None:
+                return insights
+        tracing.record_fallback(f"llm.{backend.name}")
+    return None
@@ -0,0 +1,338 @@
+"""
+Load generator for sizing AI service nodes.
+
+Usage:
+  python loadtest.py <folder | glob | requests.jsonl> [--target process | service]
+                     [--concurrency 8 | --rate 4] [--requests 200]
+                     [--groq-latency-ms 800 --groq-failure-rate 0.05] [--out report.json]
+
+Replays the images of a folder (or a recorded list of scan requests, one
+{"imageUrl", "mode", "subMode"} object per line) against the AI service:
+  --target process   one `main.py` process per request, as the Node backend runs it today
+  --target service   the persistent worker (`main.py serve`), spawned here with
+                     --service-workers, or an already running one via --service-url
+
+Load is closed-loop at --concurrency, or open-loop at --rate requests/second
+(latency then counts from the scheduled send time, so queueing is included).
+Groq is replaced by a local stub (groq_stub.py) with the given latency and
+failure rate, selected through GROQ_BASE_URL.
+
+The JSON report has throughput, latency percentiles, error rate and error
+kinds, fallbacks taken, and peak RSS per worker process.
+"""
+import argparse
+import itertools
+import json
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+from batch import load_items
+from groq_stub import GroqStub
+from perf_stats import summarize_latencies
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+MAIN_SCRIPT = os.path.join(SCRIPT_DIR, 'main.py')
+
+
+def _error_kind(result):
+    if not isinstance(result, dict):
+        return None
+    error = result.get('error')
+    return str(error)[:80] if error else None
+
+
+def _fallbacks(result):
+    if isinstance(result, dict) and isinstance(result.get('timings'), dict):
+        return result['timings'].get('fallbacks', [])
+    return []
+
+
+def _peak_rss_kb(pid):
+    """
+    High-water RSS of a running process (VmHWM), in KB.
+    """
+    try:
+        with open(f"/proc/{pid}/status") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1])
+    except (OSError, ValueError, IndexError):
+        pass
+    return None
+
+
+def _free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+# ----------------------------------------------------------------------
+# Targets
+# ----------------------------------------------------------------------
+class ProcessTarget:
+    """
+    Runs `main.py <mode> <image> [sub_mode]` per request.
+    """
+
+    name = "process"
+
+    def __init__(self, env):
+        self.env = env
+        self._lock = threading.Lock()
+        self.peak_rss_kb = []
+
+    def send(self, item):
+        cmd = [sys.executable, MAIN_SCRIPT, item['mode'], item['source']]
+        if item.get('sub_mode'):
+            cmd.append(item['sub_mode'])
+        cmd.append('--timings')
+        proc = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, env=self.env, cwd=SCRIPT_DIR)
+        stdout = proc.stdout.read()
+        proc.stdout.close()
+        # wait4 instead of wait() so the child's own peak RSS comes back with its exit status.
+        _, status, usage = os.wait4(proc.pid, 0)
+        proc.returncode = os.waitstatus_to_exitcode(status)
+        with self._lock:
+            self.peak_rss_kb.append(usage.ru_maxrss)
+
+        if proc.returncode != 0:
+            return {"error": f"Process exited with {proc.returncode}"}
+        try:
+            return json.loads(stdout.decode('utf-8').strip().splitlines()[-1])
+        except (ValueError, IndexError):
+            return {"error": "Unparseable output"}
+
+    def worker_rss(self):
+        return self.peak_rss_kb
+
+    def close(self):
+        pass
+
+
+class ServiceTarget:
+    """
+    POSTs to a persistent worker, spawning one if no URL is given.
+    """
+
+    name = "service"
+
+    def __init__(self, env, url=None, workers=4, startup_timeout=120):
+        self.proc = None
+        if url is None:
+            port = _free_port()
+            self.proc = subprocess.Popen(
+                [sys.executable, MAIN_SCRIPT, 'serve', '--port', str(port), '--workers', str(workers)],
+                stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, env=env, cwd=SCRIPT_DIR,
+            )
+            url = f"http://127.0.0.1:{port}"
+            self._wait_ready(url, startup_timeout)
+        self.url = url.rstrip('/')
+
+    def _wait_ready(self, url, timeout):
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            if self.proc.poll() is not None:
+                raise RuntimeError(f"Service exited during startup with {self.proc.returncode}")
+            try:
+                with urllib.request.urlopen(url + "/healthz", timeout=2):
+                    return
+            except (urllib.error.URLError, ConnectionError, OSError):
+                time.sleep(0.2)
+        raise RuntimeError("Service did not become ready in time")
+
+    def send(self, item):
+        body = json.dumps({
+            "imageUrl": item['source'],
+            "mode": item['mode'],
+            "subMode": item.get('sub_mode') or '',
+            "timings": True,
+        }).encode('utf-8')
+        request = urllib.request.Request(self.url + "/analyze", data=body, headers={"Content-Type": "application/json"})
+        try:
+            with urllib.request.urlopen(request, timeout=300) as response:
+                return json.loads(response.read())
+        except urllib.error.HTTPError as e:
+            try:
+                return json.loads(e.read())
+            except ValueError:
+                return {"error": f"HTTP {e.code}"}
+        except (urllib.error.URLError, OSError, ValueError) as e:
+            return {"error": f"Request failed: {e}"}
+
+    def worker_rss(self):
+        if self.proc is not None:
+            peak = _peak_rss_kb(self.proc.pid)
+            return [peak] if peak else []
+        # External service: the best we have is its current RSS gauge.
+        try:
+            with urllib.request.urlopen(self.url + "/metrics", timeout=5) as response:
+                for line in response.read().decode('utf-8').splitlines():
+                    if line.startswith("rubbersense_process_resident_memory_bytes "):
+                        return [int(float(line.split()[1]) / 1024)]
+        except (urllib.error.URLError, OSError, ValueError):
+            pass
+        return []
+
+    def close(self):
+        if self.proc is not None:
+            self.proc.terminate()
+            try:
+                self.proc.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                self.proc.kill()
+
+
+# ----------------------------------------------------------------------
+# Load generation
+# ----------------------------------------------------------------------
+def run_load(target, items, total, concurrency=None, rate=None, max_in_flight=256):
+    """
+    Sends `total` requests cycling over `items`. Returns (per-request records, wall seconds).
+    """
+    records = []
+    lock = threading.Lock()
+    plan = list(itertools.islice(itertools.cycle(items), total))
+
+    def fire(item, scheduled):
+        result = target.send(item)
+        finished = time.perf_counter()
+        with lock:
+            records.append({
+                'id': item['id'],
+                'latency_ms': (finished - scheduled) * 1000,
+                'error': _error_kind(result),
+                'fallbacks': _fallbacks(result),
+            })
+
+    start = time.perf_counter()
+    if rate:
+        # Open loop: requests go out on schedule whether or not earlier ones finished.
+        with ThreadPoolExecutor(max_workers=max_in_flight) as pool:
+            for index, item in enumerate(plan):
+                scheduled = start + index / rate
+                delay = scheduled - time.perf_counter()
+                if delay > 0:
+                    time.sleep(delay)
+                pool.submit(fire, item, scheduled)
+    else:
+        queue = iter(plan)
+        queue_lock = threading.Lock()
+
+        def client():
+            while True:
+                with queue_lock:
+                    item = next(queue, None)
+                if item is None:
+                    return
+                fire(item, time.perf_counter())
+
+        threads = [threading.Thread(target=client) for _ in range(max(1, concurrency or 1))]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+    return records, time.perf_counter() - start
+
+
+def summarize(records, wall_seconds, worker_rss_kb):
+    errors = {}
+    fallbacks = {}
+    for record in records:
+        if record['error']:
+            errors[record['error']] = errors.get(record['error'], 0) + 1
+        for name in record['fallbacks']:
+            fallbacks[name] = fallbacks.get(name, 0) + 1
+    failed = sum(errors.values())
+    rss_mb = [kb / 1024 for kb in worker_rss_kb if kb]
+    return {
+        "requests": len(records),
+        "wall_seconds": round(wall_seconds, 3),
+        "throughput_per_second": round(len(records) / wall_seconds, 3) if wall_seconds > 0 else 0.0,
+        "latency_ms": summarize_latencies([r['latency_ms'] for r in records]),
+        "error_rate": round(failed / len(records), 4) if records else 0.0,
+        "errors": errors,
+        "fallbacks": fallbacks,
+        "peak_rss_mb": {
+            "workers": len(rss_mb),
+            "max": round(max(rss_mb), 2) if rss_mb else None,
+            "mean": round(sum(rss_mb) / len(rss_mb), 2) if rss_mb else None,
+        },
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Replay scans against the AI service under load")
+    parser.add_argument("source", help="Image folder, glob, or JSON-lines request list")
+    parser.add_argument("--mode", default="tree", choices=["tree", "latex"], help="Mode for folder/glob sources")
+    parser.add_argument("--sub-mode", default="", help="Sub mode for folder/glob sources")
+    parser.add_argument("--target", default="process", choices=["process", "service"])
+    parser.add_argument("--service-url", default=None, help="Use a running service instead of spawning one")
+    parser.add_argument("--service-workers", type=int, default=4)
+    load = parser.add_mutually_exclusive_group()
+    load.add_argument("--concurrency", type=int, default=4, help="Closed-loop clients (default 4)")
+    load.add_argument("--rate", type=float, default=None, help="Open-loop arrival rate, requests/second")
+    parser.add_argument("--requests", type=int, default=None, help="Total requests (default: one pass over the source)")
+    parser.add_argument("--groq-latency-ms", type=float, default=800.0)
+    parser.add_argument("--groq-jitter-ms", type=float, default=0.0)
+    parser.add_argument("--groq-failure-rate", type=float, default=0.0)
+    parser.add_argument("--out", default=None, help="Also write the JSON report here")
+    args = parser.parse_args(argv)
+
+    items = load_items(args.source, args.mode, args.sub_mode)
+    if not items:
+        sys.stderr.write(f"❌ [Loadtest] No images or requests found in {args.source}\n")
+        return 1
+
+    stub = GroqStub(args.groq_latency_ms, args.groq_jitter_ms, args.groq_failure_rate).start()
+    out_dir = tempfile.TemporaryDirectory()
+    env = dict(os.environ)
+    env.update({
+        "GROQ_BASE_URL": stub.base_url,
+        "GROQ_API_KEY": env.get("GROQ_API_KEY") or "loadtest",
+        "RUBBERSENSE_OUTPUT_DIR": out_dir.name,
+    })
+
+    target = None
+    try:
+        if args.target == "service":
+            target = ServiceTarget(env, args.service_url, args.service_workers)
+        else:
+            target = ProcessTarget(env)
+        total = args.requests or len(items)
+        sys.stderr.write(
+            f"ℹ️ [Loadtest] {total} requests, target={target.name}, "
+            + (f"rate={args.rate}/s\n" if args.rate else f"concurrency={args.concurrency}\n")
+        )
+        records, wall_seconds = run_load(target, items, total, args.concurrency, args.rate)
+        report = summarize(records, wall_seconds, target.worker_rss())
+    finally:
+        if target is not None:
+            target.close()
+        stub.stop()
+        out_dir.cleanup()
+
+    report.update({
+        "target": args.target,
+        "concurrency": None if args.rate else args.concurrency,
+        "rate_per_second": args.rate,
+        "groq_stub": dict(stub.stats(), latency_ms=args.groq_latency_ms, failure_rate=args.groq_failure_rate),
+    })
+    text = json.dumps(report, indent=2)
+    if args.out:
+        with open(args.out, 'w') as f:
+            f.write(text + "\n")
+    print(text)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
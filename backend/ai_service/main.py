@@ -6,6 +6,8 @@ import numpy as np
 import requests
 import os
 import time
+import contextvars
+import threading
 from io import BytesIO
 
 # Export helper function for testing
@@ -33,169 +35,249 @@ except Exception as e:
 
 # print("DEBUG: AFTER YOLO IMPORT")
 
-# Global model cache
-LEAF_MODEL = None
-CLS_MODEL = None
-LATEX_MODEL = None
-TRUNK_MODEL = None
+# Model cache (memory-budgeted, see model_manager.py)
+try:
+    from model_manager import ModelManager
+except ImportError:
+    sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+    from model_manager import ModelManager
+from rate_limit import RateLimiter
+import tracing
+from tracing import traced
+import profiling
+import llm
+import content_categories
+import content_prefilter
+import deadline
+import feature_cache
+import knowledge_base
+import latex_features
+import lazy_validation
+import near_duplicate
+import quality_gate
+import stages
+from concurrent.futures import ThreadPoolExecutor
+
+WEIGHTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'models', 'rubber_tree_model', 'weights')
+
+def leaf_model_path():
+    # UPDATED: Pointing to Leaf.pt as requested
+    model_path = os.path.join(WEIGHTS_DIR, 'Leaf.pt')
+    if not os.path.exists(model_path):
+         # Fallback to best.pt if Leaf.pt is missing (safety)
+         model_path = os.path.join(WEIGHTS_DIR, 'best.pt')
+    return model_path
+
+def _load_weights(label, model_path):
+    if not YOLO_AVAILABLE:
+        return None
+    try:
+        if os.path.exists(model_path):
+            model = YOLO(model_path)
+            sys.stderr.write(f"✅ [Python ML] Loaded {label} Model: {model_path}\n")
+            return model
+        sys.stderr.write(f"❌ [Python ML] {label} model not found at {model_path}\n")
+    except Exception as e:
+        sys.stderr.write(f"❌ [Python ML] Failed to load {label.lower()} model: {e}\n")
+    return None
+
+# Generic ImageNet classifier. Ultralytics downloads it by name (into its own
+# directory) unless a copy is placed in WEIGHTS_DIR.
+CLS_WEIGHTS = 'yolo11n-cls.pt'
+CLS_IDENTITY = f"ultralytics-{sys.modules['ultralytics'].__version__ if YOLO_AVAILABLE else 'none'}:{CLS_WEIGHTS}"
+
+def cls_model_path():
+    return os.path.join(WEIGHTS_DIR, CLS_WEIGHTS)
+
+def _load_cls_model():
+    if not YOLO_AVAILABLE:
+        return None
+    try:
+        path = cls_model_path()
+        return YOLO(path if os.path.exists(path) else CLS_WEIGHTS)
+    except Exception as e:
+        sys.stderr.write(f"❌ [Python ML] Failed to load CLS model: {e}\n")
+    return None
+
+# Bump when the analysis logic changes in a way that makes stored results stale.
+PIPELINE_VERSION = "2"
 
+MODEL_MANAGER = ModelManager()
+MODEL_MANAGER.register('cls', _load_cls_model, cls_model_path(), identity=CLS_IDENTITY)
+MODEL_MANAGER.register('leaf', lambda: _load_weights('Leaf', leaf_model_path()), leaf_model_path())
+MODEL_MANAGER.register('trunk', lambda: _load_weights('Trunk', os.path.join(WEIGHTS_DIR, 'Trunks.pt')), os.path.join(WEIGHTS_DIR, 'Trunks.pt'))
+MODEL_MANAGER.register('latex', lambda: _load_weights('Latex', os.path.join(WEIGHTS_DIR, 'Latex.pt')), os.path.join(WEIGHTS_DIR, 'Latex.pt'))
+
+# The getters return thread-safe ModelHandles; calling a handle like a model
+# runs the forward pass on a checked-out predictor replica.
 def get_leaf_model():
-    global LEAF_MODEL
-    if LEAF_MODEL is None and YOLO_AVAILABLE:
-        try:
-            # UPDATED: Pointing to Leaf.pt as requested
-            model_path = os.path.join(os.path.dirname(__file__), 'models/rubber_tree_model/weights/Leaf.pt')
-            if not os.path.exists(model_path):
-                 # Fallback to best.pt if Leaf.pt is missing (safety)
-                 model_path = os.path.join(os.path.dirname(__file__), 'models/rubber_tree_model/weights/best.pt')
-            
-            if os.path.exists(model_path):
-                LEAF_MODEL = YOLO(model_path)
-                sys.stderr.write(f"✅ [Python ML] Loaded Leaf Model: {model_path}\n")
-            else:
-                sys.stderr.write(f"❌ [Python ML] Leaf model not found at {model_path}\n")
-        except Exception as e:
-            sys.stderr.write(f"❌ [Python ML] Failed to load leaf model: {e}\n")
-    return LEAF_MODEL
+    return MODEL_MANAGER.get('leaf')
 
 def get_trunk_model():
-    global TRUNK_MODEL
-    if TRUNK_MODEL is None and YOLO_AVAILABLE:
-        try:
-            model_path = os.path.join(os.path.dirname(__file__), 'models/rubber_tree_model/weights/Trunks.pt')
-            if os.path.exists(model_path):
-                TRUNK_MODEL = YOLO(model_path)
-                sys.stderr.write(f"✅ [Python ML] Loaded Trunk Model: {model_path}\n")
-            else:
-                sys.stderr.write(f"❌ [Python ML] Trunk model not found at {model_path}\n")
-        except Exception as e:
-            sys.stderr.write(f"❌ [Python ML] Failed to load trunk model: {e}\n")
-    return TRUNK_MODEL
+    return MODEL_MANAGER.get('trunk')
 
 def get_latex_model():
-    global LATEX_MODEL
-    if LATEX_MODEL is None and YOLO_AVAILABLE:
-        try:
-            model_path = os.path.join(os.path.dirname(__file__), 'models/rubber_tree_model/weights/Latex.pt')
-            if os.path.exists(model_path):
-                LATEX_MODEL = YOLO(model_path)
-                sys.stderr.write(f"✅ [Python ML] Loaded Latex Model: {model_path}\n")
-            else:
-                sys.stderr.write(f"❌ [Python ML] Latex model not found at {model_path}\n")
-        except Exception as e:
-            sys.stderr.write(f"❌ [Python ML] Failed to load latex model: {e}\n")
-    return LATEX_MODEL
+    return MODEL_MANAGER.get('latex')
 
 def get_cls_model():
-    global CLS_MODEL
-    if CLS_MODEL is None and YOLO_AVAILABLE:
-        try:
-            CLS_MODEL = YOLO('yolo11n-cls.pt')
-        except Exception as e:
-            sys.stderr.write(f"❌ [Python ML] Failed to load CLS model: {e}\n")
-    return CLS_MODEL
+    return MODEL_MANAGER.get('cls')
 
-def get_groq_analysis(disease_name, confidence, spot_count, color_name):
+def model_fingerprint():
     """
-    Calls Groq API to get detailed analysis and recommendations.
+    Identifies the model weights + pipeline version that produced a result.
     """
-    api_key = os.environ.get("GROQ_API_KEY")
-    url = "https://api.groq.com/openai/v1/chat/completions"
-    
-    prompt = f"""
-    You are an expert plant pathologist specializing in rubber trees (Hevea brasiliensis).
-    Analyze this leaf scan result:
-    - Detected Condition: {disease_name}
-    - AI Confidence: {confidence:.1f}%
-    - Visual Traits: {color_name} color, {spot_count} spots detected.
-    
-    Provide a valid JSON response with these keys:
-    1. "diagnosis": A detailed scientific explanation of the condition.
-    2. "treatment": Specific chemical (fungicide names) and organic treatments.
-    3. "prevention": Actionable steps to prevent spread or recurrence.
-    4. "severity_reasoning": Why this is low/medium/high severity based on the spot count and disease type.
-    5. "tappability_advice": Can this tree be tapped? Why/Why not?
+    return MODEL_MANAGER.fingerprint(PIPELINE_VERSION)
+
+# Code version of each cached intermediate feature (see feature_cache.py).
+# Bump an entry when the logic behind it changes; older entries are then recomputed.
+FEATURE_VERSIONS = {
+    "classify_content": "1",
+    "leaf.classify": "1",
+    "leaf.mask": "1",
+    "leaf.spots": "1",
+    "leaf.color": "1",
+    "trunk.detect": "1",
+    "trunk.girth": "1",
+    "trunk.surface": "1",
+    "latex.classify": "1",
+    "latex.segment": "1",
+    "latex.presence_ratio": "1",
+}
+# (models, upstream features) each feature is derived from.
+FEATURE_INPUTS = {
+    "classify_content": (("cls", "leaf"), ()),
+    "leaf.classify": (("leaf",), ()),
+    "leaf.spots": ((), ("leaf.mask",)),
+    "leaf.color": ((), ("leaf.mask",)),
+    "trunk.detect": (("trunk",), ()),
+    "trunk.girth": ((), ("trunk.detect",)),
+    "latex.classify": (("latex",), ()),
+}
+# Settings a feature's value depends on, beyond code and models.
+FEATURE_SETTINGS = {
+    "classify_content": lambda: f"top{content_categories.top_k()}",
+}
+
+def feature_version(stage):
+    """
+    Version of a cached feature: its code version and settings, the weights of
+    the models it used and the versions of the features it was computed from.
+    """
+    models, upstream = FEATURE_INPUTS.get(stage, ((), ()))
+    parts = [FEATURE_VERSIONS[stage]]
+    if stage in FEATURE_SETTINGS:
+        parts.append(FEATURE_SETTINGS[stage]())
+    if models:
+        parts.append(MODEL_MANAGER.fingerprint("yolo" if YOLO_AVAILABLE else "heuristic", names=models))
+    parts.extend(feature_version(dep) for dep in upstream)
+    return ":".join(parts)
+
+def cached_feature(stage, compute, encode=None, decode=None):
+    return feature_cache.fetch(stage, feature_version(stage), compute, encode, decode)
+
+def encode_mask_feature(value):
+    mask, segmented = value
+    return [feature_cache.pack_mask(mask), segmented]
+
+def decode_mask_feature(data):
+    return feature_cache.unpack_mask(data[0]), data[1]
 
-    Do not include markdown formatting, just the raw JSON object.
+def encode_detection_feature(value):
+    name, conf, box = value
+    return [name, conf, None if box is None else box.tolist()]
+
+def decode_detection_feature(data):
+    name, conf, box = data
+    return name, conf, None if box is None else np.array(box, dtype=int)
+
+def get_groq_analysis(disease_name, confidence, spot_count, color_name):
     """
-    
-    headers = {
-        "Authorization": f"Bearer {api_key}",
-        "Content-Type": "application/json"
-    }
-    
-    data = {
-        "model": "llama-3.3-70b-versatile",
-        "messages": [{"role": "user", "content": prompt}],
-        "temperature": 0.3,
-        "response_format": {"type": "json_object"}
-    }
-    
-    try:
-        response = requests.post(url, headers=headers, json=data, timeout=15)
-        if response.status_code == 200:
-            content = response.json()['choices'][0]['message']['content']
-            return json.loads(content)
-    except Exception as e:
-        sys.stderr.write(f"⚠️ [Groq API] Analysis failed: {e}\n")
-    
-    return None
+    Detailed leaf analysis and recommendations. Known classes come from the
+    precomputed knowledge base (knowledge_base.py); anything else goes to the
+    configured LLM backends (Groq by default, see llm.py). Returns None if no backend answered.
+    """
+    known = knowledge_base.lookup_disease(disease_name, spot_count)
+    if known is not None:
+        return known
+    if not deadline.allows("llm"):
+        return None
+    return llm.generate_insights('leaf', {
+        "disease_name": disease_name,
+        "confidence": confidence,
+        "spot_count": spot_count,
+        "color_name": color_name,
+    })
 
 def get_groq_latex_analysis(latex_type, confidence, contamination_level, drc):
     """
-    Calls Groq API to get detailed analysis and recommendations for latex quality.
+    Detailed latex quality analysis and recommendations, from the knowledge base
+    when the type and contamination level are known, else from the LLM backends.
     """
-    api_key = os.environ.get("GROQ_API_KEY")
-    url = "https://api.groq.com/openai/v1/chat/completions"
-    
-    prompt = f"""
-    You are an expert rubber technologist specializing in natural rubber latex quality control.
-    Analyze this latex scan result:
-    - Detected Type: {latex_type}
-    - AI Confidence: {confidence:.1f}%
-    - Contamination Level: {contamination_level}
-    - Estimated Dry Rubber Content (DRC): {drc}%
-    
-    Provide a valid JSON response with these keys:
-    1. "quality_assessment": A technical assessment of the latex quality based on the type and visual indicators.
-    2. "processing_advice": Specific steps to process this type of latex for maximum yield/quality.
-    3. "contamination_handling": How to treat or filter the latex if contamination is present.
-    4. "market_value_insight": Brief comment on the potential market grade (e.g., Centrifuged Latex, USS, RSS).
-    5. "preservation_tips": Chemical recommendations (e.g., Ammonia, TMTD) to prevent coagulation before processing.
-    6. "recommended_end_products": Array of 3-6 product-use suggestions based on this latex quality
-       (e.g., "Medical gloves", "Household gloves", "Adhesive latex", "Rubberized asphalt blend").
-    7. "grade_based_product_recommendations": Array of concise recommendations where each item includes product + use case + why.
-    8. "primary_recommended_product": Best single product category for this quality.
-    9. "market_analysis": {{
-        "trend": "stable" | "increasing" | "decreasing",
-        "estimated_price_range_php": "min-max" (e.g., "50-60"),
-        "reasoning": "Reason for the price estimation based on quality and general market knowledge."
-    }}
-
-    Do not include markdown formatting, just the raw JSON object.
+    known = knowledge_base.lookup_latex(latex_type, contamination_level)
+    if known is not None:
+        return known
+    if not deadline.allows("llm"):
+        return None
+    return llm.generate_insights('latex', {
+        "latex_type": latex_type,
+        "confidence": confidence,
+        "contamination_level": contamination_level,
+        "drc": drc,
+    })
+
+def speculative_llm_enabled():
+    return os.environ.get("RUBBERSENSE_SPECULATIVE_LLM") == "1"
+
+_SPECULATIVE_POOL = None
+_SPECULATIVE_POOL_LOCK = threading.Lock()
+
+def _speculative_pool():
+    global _SPECULATIVE_POOL
+    with _SPECULATIVE_POOL_LOCK:
+        if _SPECULATIVE_POOL is None:
+            _SPECULATIVE_POOL = ThreadPoolExecutor(max_workers=8, thread_name_prefix="llm-speculative")
+        return _SPECULATIVE_POOL
+
+def prefetch_groq_analysis(disease_name, confidence, spot_count=None, color_name=None):
     """
-    
-    headers = {
-        "Authorization": f"Bearer {api_key}",
-        "Content-Type": "application/json"
-    }
-    
-    data = {
-        "model": "llama-3.3-70b-versatile",
-        "messages": [{"role": "user", "content": prompt}],
-        "temperature": 0.3,
-        "response_format": {"type": "json_object"}
+    With RUBBERSENSE_SPECULATIVE_LLM=1, starts the LLM request for a class as soon
+    as the model has named it, so the round-trip overlaps the OpenCV analysis.
+    Measurements not taken yet are passed as None and left out of the prompt.
+    Returns the pending request for await_groq_analysis, or None when speculation is off or
+    the knowledge base already covers the class.
+    """
+    if not speculative_llm_enabled() or knowledge_base.knows_disease(disease_name):
+        return None
+    if not deadline.allows("llm"):
+        return None
+    context = {
+        "disease_name": disease_name,
+        "confidence": confidence,
+        "spot_count": spot_count,
+        "color_name": color_name,
     }
-    
-    try:
-        response = requests.post(url, headers=headers, json=data, timeout=15)
-        if response.status_code == 200:
-            content = response.json()['choices'][0]['message']['content']
-            return json.loads(content)
-    except Exception as e:
-        sys.stderr.write(f"⚠️ [Groq API] Latex Analysis failed: {e}\n")
-    
-    return None
+    sys.stderr.write(f"🧠 [Python ML] Requesting analysis early for {disease_name}...\n")
+    future = _speculative_pool().submit(contextvars.copy_context().run, llm.generate_insights, 'leaf', context)
+    return (future, context)
+
+def await_groq_analysis(pending, disease_name, confidence, spot_count, color_name):
+    """
+    Result of a prefetch_groq_analysis request, refined with the spot count it was
+    sent without. Without a pending request this is plain get_groq_analysis.
+    """
+    if pending is None:
+        return get_groq_analysis(disease_name, confidence, spot_count, color_name)
+    # Only the part of the LLM latency not hidden behind the CV stages shows up here.
+    future, sent = pending
+    with tracing.stage("llm.speculative_wait"):
+        try:
+            ai_insights = future.result()
+        except Exception as e:
+            sys.stderr.write(f"⚠️ [Python ML] Early analysis request failed: {e}\n")
+            ai_insights = None
+    if ai_insights and sent["spot_count"] is None and not text_says_healthy(ai_insights.get("diagnosis")):
+        ai_insights = llm.refine_leaf_insights(ai_insights, disease_name, spot_count)
+    return ai_insights
 
 def to_text_list(value):
     """
@@ -312,6 +394,7 @@ def build_latex_ai_recommendation(ai_insights, grade, fallback_quality_assessmen
         "market_analysis": market_analysis
     }
 
+@traced("color")
 def get_dominant_color_name(img, mask=None):
     """
     Determines the dominant color name using HSV averages.
@@ -341,6 +424,9 @@ def get_dominant_color_name(img, mask=None):
     
     return "Discolored"
 
+SPOT_CONTOUR_COLOR = (0, 0, 255)
+
+@traced("leaf.spot_count")
 def count_spots(img):
     """
     Counts dark spots on a leaf image using image processing.
@@ -371,10 +457,30 @@ def count_spots(img):
     
     # Draw contours on image for visualization
     vis_img = img.copy()
-    cv2.drawContours(vis_img, spot_contours, -1, (0, 0, 255), 2)
+    cv2.drawContours(vis_img, spot_contours, -1, SPOT_CONTOUR_COLOR, 2)
     
     return len(spot_contours), vis_img
 
+def encode_spot_feature(found, img):
+    """
+    count_spots output for the feature cache: the count and the pixels it drew over `img`.
+    """
+    count, vis_img = found
+    overlay = None if vis_img is None else np.any(vis_img != img, axis=2).astype(np.uint8) * 255
+    return [count, feature_cache.pack_mask(overlay)]
+
+def decode_spot_feature(data, img):
+    count, overlay = data[0], feature_cache.unpack_mask(data[1])
+    if overlay is None:
+        return count, None
+    vis_img = img.copy()
+    vis_img[overlay > 0] = SPOT_CONTOUR_COLOR
+    return count, vis_img
+
+# Stands in for classify_content when validation is skipped. Too weak to reject anything.
+UNCHECKED_CLASSIFICATION = {'is_tree': False, 'primary_part': 'unknown', 'confidence': 0.0}
+
+@traced("classify_content")
 def classify_content(img):
     """
     PRIORITIZES Generic Classifier (YOLOv11-cls) to filter out non-plant objects.
@@ -395,31 +501,19 @@ def classify_content(img):
                 top5 = results[0].probs.top5
                 names = results[0].names
                 
-                trunk_keywords = ['bark', 'trunk', 'wood', 'log', 'tree']
-                leaf_keywords = ['leaf', 'foliage', 'plant', 'flower', 'green', 'vegetable', 'fruit', 'herb', 'shrub'] 
-                non_plant_keywords = [
-                    'wall', 'floor', 'paper', 'rock', 'sand', 'soil', 'fabric', 'plastic', 
-                    'keyboard', 'computer', 'laptop', 'screen', 'monitor', 'mouse', 
-                    'electronic', 'device', 'furniture', 'table', 'desk', 'room', 
-                    'interior', 'man-made', 'text', 'book', 'writing'
-                ]
-                
-                trunk_score = 0.0
-                leaf_score = 0.0
-                non_plant_score = 0.0
-                
-                for idx in top5:
-                    class_name = names[idx].lower()
-                    score = float(results[0].probs.data[idx])
-                    
-                    if any(k in class_name for k in trunk_keywords):
-                        trunk_score += score
-                    elif any(k in class_name for k in leaf_keywords):
-                        leaf_score += score
-                    elif any(k in class_name for k in non_plant_keywords):
-                        non_plant_score += score
-                        
-                    confidence = max(confidence, score)
+                # Trunk / leaf / non-plant scores: one dot product with the
+                # model's precomputed category weights (content_categories.py),
+                # or the row a batched pass already scored.
+                probabilities = content_categories.probability_vector(results[0].probs)
+                k = content_categories.top_k()
+                scores = content_categories.result_scores(results[0], k)
+                if scores is None:
+                    scores = content_categories.category_scores(
+                        probabilities, content_categories.handle_matrix(model, names), k,
+                        top_indices=top5 if k == len(top5) else None,
+                    )
+                trunk_score, leaf_score, non_plant_score = (float(score) for score in scores)
+                confidence = max(confidence, float(probabilities[top5].max()))
                 
                 # Strict filtering logic
                 # 1. HARD REJECT if non-plant score is dominant
@@ -479,19 +573,91 @@ def classify_content(img):
         
     return {'is_tree': False, 'primary_part': 'unknown', 'confidence': confidence}
 
+def classify_scan(img, mode, sub_mode='', ran=None):
+    """
+    classify_content, unless the thumbnail prefilter settles an obvious frame
+    without a forward pass (see content_prefilter.py). The validator used is
+    appended to `ran`.
+    """
+    decided = content_prefilter.decide(img, mode, sub_mode)
+    if ran is not None:
+        ran.append("classify_content" if decided is None else "content_prefilter")
+    if decided is not None:
+        return decided
+    return cached_feature("classify_content", lambda: classify_content(img))
+
+def strong_part_mismatch(classification, part):
+    """
+    Whether `classification` strongly contradicts the user-chosen `part` (trunk / leaf).
+    Only strong evidence counts, to avoid false rejections.
+    """
+    # Relaxed thresholds to reduce false rejections (User Feedback: clear trunks rejected)
+    other_part = 'leaf' if part == 'trunk' else 'trunk'
+    other_part_mismatch = (
+        classification['primary_part'] == other_part and classification['confidence'] >= 0.75
+    )
+    strong_non_tree_mismatch = (
+        classification['primary_part'] == 'unknown'
+        and not classification['is_tree']
+        and classification['confidence'] >= 0.85
+    )
+    return other_part_mismatch or strong_non_tree_mismatch
+
+def check_user_part(img, part):
+    """
+    Runs the specialised model of a user-chosen `part` (trunk / leaf) ahead of
+    classify_content. Returns (stage, prediction, settled): the stage that ran
+    (None when the model is missing or failed), its prediction, and whether it
+    and the thumbnail confirm the part (see lazy_validation.py).
+    """
+    model, predict, stage = (
+        (get_leaf_model(), predict_leaf_disease, "leaf.classify") if part == 'leaf'
+        else (get_trunk_model(), predict_trunk_disease, "trunk.detect")
+    )
+    if not model:
+        return None, None, False
+    try:
+        prediction = predict(img, model)
+    except Exception as e:
+        sys.stderr.write(f"⚠️ [Python ML] {part.title()} model check failed: {e}\n")
+        return None, None, False
+    return stage, prediction, lazy_validation.settled(part, prediction[1], content_prefilter.coverage(img))
+
+def validate_user_part(img, part, record):
+    """
+    Classification to check a user-chosen `part` (trunk / leaf) against. The
+    specialised model runs first; when it and the thumbnail confirm the part,
+    its prediction stands in for classify_content (see lazy_validation.py).
+    Returns (classification, prediction), where prediction is handed on to the
+    analysis so the model does not run twice. Validators are listed in `record`.
+    """
+    prediction = None
+    if lazy_validation.parts_enabled():
+        stage, prediction, settled = check_user_part(img, part)
+        if stage is not None:
+            record["ran"].append(stage)
+        if settled:
+            record["skipped"].append("classify_content")
+            confidence = min(float(prediction[1]) / 100, 1.0)
+            return {'is_tree': True, 'primary_part': part, 'confidence': confidence}, prediction
+    return classify_scan(img, 'tree', part, record["ran"]), prediction
+
 def download_image(url):
     try:
         if os.path.exists(url):
-            img = cv2.imread(url)
+            with tracing.stage("image.read"):
+                img = cv2.imread(url)
             if img is None:
                 raise ValueError(f"Failed to read local image: {url}")
             return img
         
         headers = {'User-Agent': 'RubberSense-AI/1.0'}
-        response = requests.get(url, headers=headers)
-        response.raise_for_status()
-        image_array = np.asarray(bytearray(response.content), dtype=np.uint8)
-        img = cv2.imdecode(image_array, cv2.IMREAD_COLOR)
+        with tracing.stage("image.download"):
+            response = requests.get(url, headers=headers)
+            response.raise_for_status()
+        with tracing.stage("image.decode"):
+            image_array = np.asarray(bytearray(response.content), dtype=np.uint8)
+            img = cv2.imdecode(image_array, cv2.IMREAD_COLOR)
         if img is None:
             raise ValueError("Failed to decode image")
         return img
@@ -499,36 +665,15 @@ def download_image(url):
         sys.stderr.write(f"Error downloading image: {str(e)}\n")
         return None
 
-def estimate_latex_presence_ratio(img):
+@traced("latex.presence_ratio")
+def estimate_latex_presence_ratio(img, features=None):
     """
     Estimate how much of the frame looks like latex (white/cream/yellow regions).
     Returns a ratio from 0.0 to 1.0.
     """
     if img is None:
         return 0.0
-
-    hsv_img = cv2.cvtColor(img, cv2.COLOR_BGR2HSV)
-
-    # Relaxed White/Cream/Off-white
-    lower_white = np.array([0, 0, 80])
-    upper_white = np.array([180, 90, 255])
-    mask_white = cv2.inRange(hsv_img, lower_white, upper_white)
-
-    lower_yellow = np.array([15, 60, 100])
-    upper_yellow = np.array([40, 200, 255])
-    mask_yellow = cv2.inRange(hsv_img, lower_yellow, upper_yellow)
-
-    latex_mask = cv2.bitwise_or(mask_white, mask_yellow)
-
-    kernel = np.ones((5, 5), np.uint8)
-    latex_mask = cv2.morphologyEx(latex_mask, cv2.MORPH_OPEN, kernel)
-    latex_mask = cv2.morphologyEx(latex_mask, cv2.MORPH_CLOSE, kernel)
-
-    total_pixels = float(img.shape[0] * img.shape[1])
-    if total_pixels <= 0:
-        return 0.0
-
-    return float(cv2.countNonZero(latex_mask)) / total_pixels
+    return (features or latex_features.LatexFeatures(img)).presence_ratio
 
 def generate_productivity_recommendation(health_status, disease_name, tappable, severity):
     status = "optimal"
@@ -570,6 +715,7 @@ def generate_productivity_recommendation(health_status, disease_name, tappable,
         "suggestions": suggestions
     }
 
+@traced("leaf.mask")
 def get_leaf_mask(img):
     """
     Generates a binary mask for the leaf area using color segmentation.
@@ -624,10 +770,33 @@ def get_leaf_mask(img):
             
     return final_mask
 
-def analyze_leaf_with_model(img, image_path_for_saving):
+def processed_output_dir():
+    """
+    Directory for annotated images: RUBBERSENSE_OUTPUT_DIR, else temp_output next to this script.
+    """
+    temp_dir = os.environ.get("RUBBERSENSE_OUTPUT_DIR") or os.path.join(
+        os.path.dirname(os.path.abspath(__file__)), 'temp_output'
+    )
+    if not os.path.exists(temp_dir):
+        os.makedirs(temp_dir, exist_ok=True)
+    return temp_dir
+
+def predict_leaf_disease(img, model):
+    """
+    Leaf.pt top-1 (class name, confidence %) for `img`.
+    """
+    def leaf_forward():
+        results = model(img, verbose=False)
+        probs = results[0].probs
+        return results[0].names[probs.top1], float(probs.top1conf.item()) * 100
+
+    return cached_feature("leaf.classify", leaf_forward, decode=tuple)
+
+def analyze_leaf_with_model(img, image_path_for_saving, prediction=None):
     """
     Uses the trained Leaf Disease Model (Leaf.pt) for analysis.
     Integrates Groq API for detailed insights.
+    `prediction` is the result of predict_leaf_disease when it already ran.
     """
     model = get_leaf_model()
     
@@ -642,23 +811,40 @@ def analyze_leaf_with_model(img, image_path_for_saving):
     
     if model:
         try:
-            results = model(img, verbose=False)
-            probs = results[0].probs
-            top1_index = probs.top1
-            disease_name = results[0].names[top1_index]
-            confidence = float(probs.top1conf.item()) * 100
-            
+            def classify_leaf():
+                name, conf = prediction if prediction is not None else predict_leaf_disease(img, model)
+                return name, conf, prefetch_groq_analysis(name, conf)
+
+            def mask_background(leaf_mask):
+                masked = img.copy()
+                masked[leaf_mask == 0] = [0, 0, 0] # Set background to black
+                return masked
+
+            # The forward pass and the visual analysis are independent; masking
+            # feeds spot counting and color analysis, which run side by side.
+            scan = stages.StageGraph()
+            scan.add("classify", classify_leaf)
             # --- Visual Analysis & Masking ---
             # Create mask to isolate leaf from background
-            leaf_mask = get_leaf_mask(img)
-            masked_img = img.copy()
-            masked_img[leaf_mask == 0] = [0, 0, 0] # Set background to black
-            
+            scan.add("mask", lambda: cached_feature(
+                "leaf.mask", lambda: get_leaf_mask(img), feature_cache.pack_mask, feature_cache.unpack_mask,
+            ))
+            scan.add("masked", mask_background, "mask")
             # 1. Spot Counting (Use masked image to avoid background noise)
-            spot_count, spotted_img = count_spots(masked_img)
-            
+            scan.add("spots", lambda masked: cached_feature(
+                "leaf.spots", lambda: count_spots(masked),
+                lambda found: encode_spot_feature(found, masked), lambda data: decode_spot_feature(data, masked),
+            ), "masked")
             # 2. Color Analysis (Use masked image)
-            color_name = get_dominant_color_name(img, mask=leaf_mask)
+            scan.add("color", lambda leaf_mask: cached_feature(
+                "leaf.color", lambda: get_dominant_color_name(img, mask=leaf_mask),
+            ), "mask")
+            done = scan.run()
+
+            disease_name, confidence, pending_insights = done["classify"]
+            masked_img = done["masked"]
+            spot_count, spotted_img = done["spots"]
+            color_name = done["color"]
             
             # Use spotted_img (which is based on masked_img) for final visualization
             vis_img = spotted_img if spotted_img is not None else masked_img.copy()
@@ -695,7 +881,7 @@ def analyze_leaf_with_model(img, image_path_for_saving):
 
             # --- AI Insights (Groq) ---
             sys.stderr.write(f"🧠 [Python ML] Requesting detailed analysis from Groq for {disease_name}...\n")
-            ai_insights = get_groq_analysis(disease_name, confidence, spot_count, color_name)
+            ai_insights = await_groq_analysis(pending_insights, disease_name, confidence, spot_count, color_name)
             
             if ai_insights and text_says_healthy(ai_insights.get("diagnosis")):
                 is_healthy_label = True
@@ -722,22 +908,22 @@ def analyze_leaf_with_model(img, image_path_for_saving):
             # Cap confidence for display
             if confidence >= 100.0: confidence = 99.9
 
-            # Draw text on image
-            cv2.putText(vis_img, label_text, (10, 30), cv2.FONT_HERSHEY_SIMPLEX, 0.7, color_cv, 2)
-            
-            # Save processed image
-            script_dir = os.path.dirname(os.path.abspath(__file__))
-            temp_dir = os.path.join(script_dir, 'temp_output')
-            if not os.path.exists(temp_dir):
-                os.makedirs(temp_dir)
-                
-            timestamp = int(time.time())
-            processed_filename = f"processed_{timestamp}_{os.path.basename(image_path_for_saving)}"
-            if 'http' in processed_filename: # Sanitize
-                processed_filename = f"processed_{timestamp}.jpg"
+            # The annotated image is optional; a short deadline leaves processed_image_path None.
+            if deadline.allows("annotation"):
+                # Draw text on image
+                cv2.putText(vis_img, label_text, (10, 30), cv2.FONT_HERSHEY_SIMPLEX, 0.7, color_cv, 2)
                 
-            processed_image_path = os.path.join(temp_dir, processed_filename)
-            cv2.imwrite(processed_image_path, vis_img)
+                # Save processed image
+                temp_dir = processed_output_dir()
+                    
+                timestamp = int(time.time())
+                processed_filename = f"processed_{timestamp}_{os.path.basename(image_path_for_saving)}"
+                if 'http' in processed_filename: # Sanitize
+                    processed_filename = f"processed_{timestamp}.jpg"
+                    
+                processed_image_path = os.path.join(temp_dir, processed_filename)
+                with tracing.stage("encode_write"):
+                    cv2.imwrite(processed_image_path, vis_img)
             
             # --- Final Response Construction ---
             # Prepare prevention suggestions (flatten if needed)
@@ -809,7 +995,138 @@ def analyze_leaf_with_model(img, image_path_for_saving):
         "productivityRecommendation": {"status": "unknown", "suggestions": []}
     }
 
+def parse_suggestion_requests(raw):
+    """
+    Parses ai_suggestions input: a single JSON object, a JSON array, or JSON lines.
+    Returns (data, is_batch).
+    """
+    text = raw.strip()
+    try:
+        data = json.loads(text)
+    except json.JSONDecodeError:
+        # JSON lines
+        return [json.loads(line) for line in text.splitlines() if line.strip()], True
+    return data, isinstance(data, list)
+
+def generate_ai_suggestions(data):
+    """
+    Groq suggestions for one detection dict, with a basic fallback if Groq fails.
+    """
+    disease_name = data.get('disease_name', 'Unknown')
+    confidence = data.get('confidence', 0)
+    spot_count = data.get('spot_count', 0)
+    color_name = data.get('color_name', 'Green')
+    
+    sys.stderr.write(f"🧠 [Python AI] Generating suggestions for {disease_name}...\n")
+    
+    ai_insights = get_groq_analysis(disease_name, confidence, spot_count, color_name)
+    
+    # If Groq fails or returns null, provide basic fallback
+    if not ai_insights:
+        ai_insights = {
+            "diagnosis": f"Detected {disease_name}. Detailed AI diagnosis unavailable.",
+            "treatment": "Standard fungicide application recommended.",
+            "prevention": "Monitor regularly.",
+            "severity_reasoning": "Based on visual detection.",
+            "tappability_advice": "Proceed with caution."
+        }
+    return ai_insights
+
+def suggestion_key(data):
+    """
+    Two detections with the same key produce the same Groq prompt.
+    """
+    try:
+        confidence = f"{float(data.get('confidence', 0)):.1f}"
+    except (TypeError, ValueError):
+        confidence = str(data.get('confidence'))
+    return json.dumps([
+        str(data.get('disease_name', 'Unknown')),
+        confidence,
+        str(data.get('spot_count', 0)),
+        str(data.get('color_name', 'Green')),
+    ])
+
+def generate_ai_suggestions_batch(items, concurrency=None, rate_per_sec=None):
+    """
+    Suggestions for many detections. Identical detections share one Groq call and the
+    remaining calls run concurrently, bounded by RUBBERSENSE_LLM_CONCURRENCY (default 4)
+    and RUBBERSENSE_LLM_RATE_PER_SEC (default 0 = unlimited). Results keep input order.
+    """
+    if concurrency is None:
+        concurrency = int(os.environ.get("RUBBERSENSE_LLM_CONCURRENCY", "4") or 4)
+    if rate_per_sec is None:
+        rate_per_sec = float(os.environ.get("RUBBERSENSE_LLM_RATE_PER_SEC", "0") or 0)
+
+    keys = []
+    unique = {}
+    for item in items:
+        if not isinstance(item, dict):
+            keys.append(None)
+            continue
+        key = suggestion_key(item)
+        keys.append(key)
+        unique.setdefault(key, item)
+
+    limiter = RateLimiter(rate_per_sec)
+
+    def run(item):
+        limiter.acquire()
+        return generate_ai_suggestions(item)
+
+    # Each worker call runs in a copy of this context so it stays on the request's trace.
+    def run_in_context(item):
+        return contextvars.copy_context().run(run, item)
+
+    start = time.time()
+    results = {}
+    if unique:
+        with ThreadPoolExecutor(max_workers=max(1, min(concurrency, len(unique)))) as pool:
+            for key, insights in zip(unique, pool.map(run_in_context, unique.values())):
+                results[key] = insights
+
+    sys.stderr.write(
+        f"🧠 [Python AI] {len(items)} suggestion requests, {len(unique)} unique, "
+        f"done in {time.time() - start:.2f}s\n"
+    )
+    return [results[key] if key is not None else {"error": "Detection must be a JSON object"} for key in keys]
+
+def attach_timings(result, trace):
+    """
+    Adds the request's timing trace to a dict response (no-op when timings are off).
+    """
+    if trace is not None and isinstance(result, dict):
+        result["timings"] = trace.to_dict()
+    return result
+
 def main():
+    # Opt-in per-stage timings (also RUBBERSENSE_TIMINGS=1)
+    timings = tracing.timings_requested('--timings' in sys.argv)
+    # Opt-in cProfile + tracemalloc for this request (also RUBBERSENSE_PROFILE, see profiling.py)
+    force_profile = '--profile' in sys.argv
+    sys.argv = [arg for arg in sys.argv if arg not in ('--timings', '--profile')]
+    # Absolute deadline in epoch ms; optional work is skipped as it nears (see deadline.py)
+    deadline_ms = None
+    if '--deadline' in sys.argv:
+        at = sys.argv.index('--deadline')
+        deadline_ms = deadline.parse(sys.argv[at + 1] if at + 1 < len(sys.argv) else None)
+        del sys.argv[at:at + 2]
+
+    if len(sys.argv) > 1 and sys.argv[1] == 'batch':
+        # Mode: analyze a directory, glob or JSON-lines manifest of images (see batch.py)
+        from batch import run_batch
+        sys.exit(run_batch(sys.argv[2:]))
+
+    if len(sys.argv) > 1 and sys.argv[1] == 'serve':
+        # Mode: persistent worker over HTTP with Prometheus metrics (see server.py)
+        from server import run_server
+        sys.exit(run_server(sys.argv[2:]))
+
+    if len(sys.argv) > 1 and sys.argv[1] == 'reanalyze':
+        # Mode: bulk re-score stored scans on a process pool (see reanalyze.py)
+        from reanalyze import run_reanalysis
+        sys.exit(run_reanalysis(sys.argv[2:]))
+
     if len(sys.argv) < 3:
         print(json.dumps({"error": "Missing arguments"}))
         return
@@ -818,31 +1135,18 @@ def main():
 
     if mode == 'ai_suggestions':
         # Mode: Generate AI suggestions only (skipping image processing)
-        # argv[2] should be a JSON string with detection data
+        # argv[2] is a JSON object with detection data, a JSON array of them,
+        # or '-' to read a JSON array / JSON lines from stdin.
         try:
-            data_json = sys.argv[2]
-            data = json.loads(data_json)
-            
-            disease_name = data.get('disease_name', 'Unknown')
-            confidence = data.get('confidence', 0)
-            spot_count = data.get('spot_count', 0)
-            color_name = data.get('color_name', 'Green')
-            
-            sys.stderr.write(f"🧠 [Python AI] Generating suggestions for {disease_name}...\n")
-            
-            ai_insights = get_groq_analysis(disease_name, confidence, spot_count, color_name)
-            
-            # If Groq fails or returns null, provide basic fallback
-            if not ai_insights:
-                ai_insights = {
-                    "diagnosis": f"Detected {disease_name}. Detailed AI diagnosis unavailable.",
-                    "treatment": "Standard fungicide application recommended.",
-                    "prevention": "Monitor regularly.",
-                    "severity_reasoning": "Based on visual detection.",
-                    "tappability_advice": "Proceed with caution."
-                }
-                
-            print(json.dumps(ai_insights))
+            data_json = sys.stdin.read() if sys.argv[2] == '-' else sys.argv[2]
+            data, is_batch = parse_suggestion_requests(data_json)
+
+            with profiling.profiled(mode, force_profile) as profile, tracing.trace(timings) as trace:
+                if is_batch:
+                    result = generate_ai_suggestions_batch(data)
+                else:
+                    result = generate_ai_suggestions(data)
+            print(json.dumps(profiling.attach(attach_timings(result, trace), profile)))
             return
 
         except Exception as e:
@@ -853,15 +1157,53 @@ def main():
     image_url = sys.argv[2]
     # Robust argument parsing for sub_mode
     raw_sub_mode = sys.argv[3] if len(sys.argv) > 3 else ''
-    sub_mode = raw_sub_mode.strip().lower()
+
+    with profiling.profiled(mode, force_profile) as profile, tracing.trace(timings) as trace, \
+            deadline.scope(deadline_ms) as request_deadline:
+        result = analyze_request(mode, image_url, raw_sub_mode)
+    result = deadline.attach(result, request_deadline)
+    print(json.dumps(profiling.attach(attach_timings(result, trace), profile)))
+
+def analyze_request(mode, image_url, raw_sub_mode=''):
+    """
+    Loads the image at `image_url` (URL or local path) and runs the `tree` or `latex` analysis.
+    Returns the response dict; failures are reported as {"error": ...}.
+    """
+    sub_mode = (raw_sub_mode or '').strip().lower()
     
     sys.stderr.write(f"ℹ️ [Python ML] Mode: {mode}, SubMode: '{sub_mode}' (Raw: '{raw_sub_mode}')\n")
 
     img = download_image(image_url)
     if img is None:
-        print(json.dumps({"error": "Failed to load image"}))
-        return
+        return {"error": "Failed to load image"}
 
+    return analyze_image(img, mode, sub_mode, image_url)
+
+def analyze_image(img, mode, sub_mode='', image_url=''):
+    """
+    Runs the `tree` or `latex` analysis on an already decoded BGR image.
+    Photos that fail the quality gate are rejected before any model runs.
+    Intermediate features are read from / stored in the feature cache when it is
+    enabled, and near duplicates of a recent scan reuse its result (near_duplicate.py).
+    The subject validators that ran, or were skipped, are listed under "validation".
+    """
+    rejected = quality_gate.check(img, mode)
+    if rejected is not None:
+        sys.stderr.write(f"❌ [Python ML] Photo failed the quality gate ({rejected['reason']}): {rejected['quality']}\n")
+        return rejected
+    scan_key = (mode, sub_mode, model_fingerprint())
+    phash, reused = near_duplicate.lookup(img, scan_key)
+    if reused is not None:
+        sys.stderr.write(f"♻️ [Python ML] Near duplicate of {reused['nearDuplicate']['source']}; reusing its result.\n")
+        return reused
+    validation = lazy_validation.new_record()
+    with feature_cache.scope(img):
+        result = _analyze_image(img, mode, sub_mode, image_url, validation)
+    if isinstance(result, dict) and (validation["ran"] or validation["skipped"]):
+        result["validation"] = validation
+    return near_duplicate.remember(phash, scan_key, image_url, result)
+
+def _analyze_image(img, mode, sub_mode, image_url, validation):
     if mode == 'tree':
         # 1. Determine Scan Subtype (Leaf vs Trunk)
         # Priority: User Input (sub_mode) > AI Classification > Default
@@ -869,29 +1211,26 @@ def main():
         is_user_specified_trunk = sub_mode == 'trunk'
         is_user_specified_leaf = sub_mode == 'leaf'
         
-        # Only run generic classification if user didn't specify, OR to validate
-        classification = classify_content(img)
+        # Only run generic classification if user didn't specify, OR to validate.
+        # Validation is optional work: past the deadline reserve the user's choice is accepted as is.
+        prediction = None
+        if (is_user_specified_trunk or is_user_specified_leaf) and not deadline.allows("classification"):
+            classification = dict(UNCHECKED_CLASSIFICATION)
+            validation["skipped"].append("classify_content")
+        elif is_user_specified_trunk or is_user_specified_leaf:
+            classification, prediction = validate_user_part(img, sub_mode, validation)
+        else:
+            classification = classify_scan(img, mode, sub_mode, validation["ran"])
         
         # Override classification if user explicitly selected a mode.
         # IMPORTANT: reject only on STRONG mismatch evidence to avoid false negatives.
         if is_user_specified_trunk:
-            # Relaxed thresholds to reduce false rejections (User Feedback: clear trunks rejected)
-            strong_leaf_mismatch = (
-                classification['primary_part'] == 'leaf' and classification['confidence'] >= 0.75
-            )
-            strong_non_tree_mismatch = (
-                classification['primary_part'] == 'unknown'
-                and not classification['is_tree']
-                and classification['confidence'] >= 0.85
-            )
-
-            if strong_leaf_mismatch or strong_non_tree_mismatch:
+            if strong_part_mismatch(classification, 'trunk'):
                  sys.stderr.write(
                      f"❌ [Python ML] User specified 'Trunk', strong mismatch "
                      f"(detected='{classification['primary_part']}', conf={classification['confidence']:.2f}). Rejecting.\n"
                  )
-                 print(json.dumps({"error": "Detected part non-trunk only. Please try again."}))
-                 return
+                 return {"error": "Detected part non-trunk only. Please try again."}
 
             sys.stderr.write("✅ [Python ML] User specified 'Trunk' scan accepted.\n")
             classification['primary_part'] = 'trunk'
@@ -899,23 +1238,12 @@ def main():
             classification['confidence'] = max(float(classification['confidence']), 0.35)
 
         elif is_user_specified_leaf:
-            # Relaxed thresholds to reduce false rejections
-            strong_trunk_mismatch = (
-                classification['primary_part'] == 'trunk' and classification['confidence'] >= 0.75
-            )
-            strong_non_tree_mismatch = (
-                classification['primary_part'] == 'unknown'
-                and not classification['is_tree']
-                and classification['confidence'] >= 0.85
-            )
-
-            if strong_trunk_mismatch or strong_non_tree_mismatch:
+            if strong_part_mismatch(classification, 'leaf'):
                  sys.stderr.write(
                      f"❌ [Python ML] User specified 'Leaf', strong mismatch "
                      f"(detected='{classification['primary_part']}', conf={classification['confidence']:.2f}). Rejecting.\n"
                  )
-                 print(json.dumps({"error": "Detected part non-leaf only. Please try again."}))
-                 return
+                 return {"error": "Detected part non-leaf only. Please try again."}
 
             sys.stderr.write("✅ [Python ML] User specified 'Leaf' scan accepted.\n")
             classification['primary_part'] = 'leaf'
@@ -937,7 +1265,7 @@ def main():
         # Logic: If it's a leaf scan (user specified OR detected)
         if classification['primary_part'] == 'leaf':
             # Use the Specialized Leaf Model
-            analysis_result = analyze_leaf_with_model(img, image_url)
+            analysis_result = analyze_leaf_with_model(img, image_url, prediction)
             
             # Merge with tree ID
             analysis_result["treeIdentification"] = tree_id_result
@@ -964,26 +1292,65 @@ def main():
         else:
             # TRUNK ANALYSIS (Default fallback if not leaf)
             # Use the Specialized Trunk Model (Trunks.pt)
-            analysis_result = analyze_trunk_with_model(img, image_url, base_confidence)
+            analysis_result = analyze_trunk_with_model(img, image_url, base_confidence, prediction)
             
             # Merge with existing tree ID (though trunk model also predicts it)
             # We trust the initial tree ID for "isRubberTree" but use trunk model for specifics
             analysis_result["treeIdentification"]["detectedPart"] = "trunk"
 
-        print(json.dumps(analysis_result))
+        return analysis_result
 
     elif mode == 'latex':
         # Latex-only validation tuned to reduce false negatives on valid latex photos.
-        classification = classify_content(img)
-        latex_presence_ratio = estimate_latex_presence_ratio(img)
+        # The presence ratio and the latex analysis are independent, so they run
+        # side by side (the analysis on this thread). The generic classifier can
+        # only tip a rejection when both of them are weak, so it runs only then
+        # (lazy_validation.py), or alongside them when lazy validation is off.
+        # We can optionally save a processed image if we add visualization later
+        processed_path = None
+        # Masks, ratios and mean colors, computed once for all latex stages.
+        features = latex_features.LatexFeatures(img)
+        latex_ran = []
+
+        def latex_analysis():
+            try:
+                return analyze_latex_with_model(img, processed_path, features, latex_ran), None
+            except Exception as e:
+                return None, e
+
+        def classify():
+            if not deadline.allows("classification"):
+                validation["skipped"].append("classify_content")
+                return dict(UNCHECKED_CLASSIFICATION)
+            return classify_scan(img, mode, ran=validation["ran"])
+
+        lazy = lazy_validation.enabled()
+        scan = stages.StageGraph()
+        if not lazy:
+            scan.add("classify", classify)
+        scan.add("presence", lambda: cached_feature("latex.presence_ratio", lambda: estimate_latex_presence_ratio(img, features)))
+        scan.add("analysis", latex_analysis)
+        done = scan.run()
+        latex_presence_ratio = done["presence"]
+        validation["ran"][:0] = ["latex.presence_ratio"] + latex_ran
 
         # Latex analysis
         try:
-            # We can optionally save a processed image if we add visualization later
-            processed_path = None
-            result = analyze_latex_with_model(img, processed_path)
+            result, error = done["analysis"]
+            if error is not None:
+                raise error
 
             model_confidence = float(result.get("qualityClassification", {}).get("confidence", 0) or 0)
+            weak_latex_signal = latex_presence_ratio < 0.01
+            weak_latex_model = model_confidence < 30
+
+            if not lazy:
+                classification = done["classify"]
+            elif weak_latex_signal and weak_latex_model:
+                classification = classify()
+            else:
+                validation["skipped"].append("classify_content")
+                classification = dict(UNCHECKED_CLASSIFICATION)
             
             # Relaxed for user feedback (Latex not detected)
             strong_tree_signal = (
@@ -995,8 +1362,6 @@ def main():
                 and not classification['is_tree']
                 and classification['confidence'] >= 0.85
             )
-            weak_latex_signal = latex_presence_ratio < 0.01
-            weak_latex_model = model_confidence < 30
 
             # Reject only when multiple signals strongly say this is not latex.
             if (strong_tree_signal or strong_non_tree_signal) and weak_latex_signal and weak_latex_model:
@@ -1005,22 +1370,62 @@ def main():
                     f"(detected='{classification['primary_part']}', conf={classification['confidence']:.2f}, "
                     f"model_conf={model_confidence:.1f}, latex_ratio={latex_presence_ratio:.3f}).\n"
                 )
-                print(json.dumps({"error": "Detected part non-latex only. Please try again."}))
-                return
+                return {"error": "Detected part non-latex only. Please try again."}
 
-            print(json.dumps(result))
+            return result
         except Exception as e:
             sys.stderr.write(f"Latex analysis failed: {e}\n")
             # Fallback
-            result = analyze_latex_heuristic(img)
-            print(json.dumps(result))
+            return analyze_latex_heuristic(img, features)
+
+    return {"error": f"Unknown mode: {mode}"}
 
-def analyze_latex_with_model(img, image_path_for_saving=None):
+@traced("latex.segment")
+def segment_latex_region(img, features=None):
+    """
+    Latex-colored (white/yellowish) region of the image, ignoring dark bark and
+    background. Falls back to a center crop when too little is found.
+    Returns (mask, segmented) where `segmented` is False for the center crop.
+    """
+    features = features or latex_features.LatexFeatures(img)
+    return features.segment_mask, features.segmented
+
+def read_latex_prediction(results):
+    """
+    (latex_type, confidence, box) from a Latex.pt result. `box` is the xyxy of
+    the most confident detection, or None for a classification model.
+    """
+    latex_type, confidence, box = "Unknown", 0.0, None
+    # Check if Classification or Detection model
+    if hasattr(results[0], 'probs') and results[0].probs is not None:
+        # Classification Model
+        probs = results[0].probs
+        top1_index = probs.top1
+        latex_type = results[0].names[top1_index]
+        confidence = float(probs.top1conf.item()) * 100
+    elif hasattr(results[0], 'boxes') and results[0].boxes is not None:
+        # Detection Model - find the class with highest confidence or most occurrences
+        boxes = results[0].boxes
+        if len(boxes) > 0:
+            # Get the box with highest confidence
+            best_box_idx = boxes.conf.argmax()
+            cls_id = int(boxes.cls[best_box_idx].item())
+            latex_type = results[0].names[cls_id]
+            confidence = float(boxes.conf[best_box_idx].item()) * 100
+    if hasattr(results[0], 'boxes') and results[0].boxes is not None and len(results[0].boxes) > 0:
+        best_box_idx = results[0].boxes.conf.argmax()
+        box = results[0].boxes.xyxy[best_box_idx].cpu().numpy().astype(int)
+    return latex_type, confidence, box
+
+def analyze_latex_with_model(img, image_path_for_saving=None, features=None, ran=None):
     """
     Uses the trained Latex Quality Model (Latex.pt) for analysis.
     Integrates Groq API for detailed insights.
+    `features` are the scan's LatexFeatures, shared with the other latex stages.
+    "latex.classify" is appended to `ran` when the model ran.
     """
     model = get_latex_model()
+    features = features or latex_features.LatexFeatures(img)
     
     # Default values
     latex_type = "Unknown"
@@ -1030,111 +1435,63 @@ def analyze_latex_with_model(img, image_path_for_saving=None):
     drc = 40.0 # Default DRC
     description = "Standard latex."
     
-    # Heuristic Fallback logic components
-    hsv = cv2.cvtColor(img, cv2.COLOR_BGR2HSV)
-    avg_color_per_row = np.average(img, axis=0)
-    avg_color = np.average(avg_color_per_row, axis=0)
-    
-    gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
-    _, thresh = cv2.threshold(gray, 100, 255, cv2.THRESH_BINARY_INV)
-    contamination_pixels = cv2.countNonZero(thresh)
-    contamination_ratio = contamination_pixels / (img.shape[0] * img.shape[1])
-    
     if model:
         try:
-            results = model(img, verbose=False)
-            
-            # Check if Classification or Detection model
-            if hasattr(results[0], 'probs') and results[0].probs is not None:
-                # Classification Model
-                probs = results[0].probs
-                top1_index = probs.top1
-                latex_type = results[0].names[top1_index]
-                confidence = float(probs.top1conf.item()) * 100
-            elif hasattr(results[0], 'boxes') and results[0].boxes is not None:
-                # Detection Model - find the class with highest confidence or most occurrences
-                boxes = results[0].boxes
-                if len(boxes) > 0:
-                    # Get the box with highest confidence
-                    best_box_idx = boxes.conf.argmax()
-                    cls_id = int(boxes.cls[best_box_idx].item())
-                    latex_type = results[0].names[cls_id]
-                    confidence = float(boxes.conf[best_box_idx].item()) * 100
-                else:
-                    latex_type = "Unknown"
-                    confidence = 0.0
+            # The HSV segmentation is only needed when the model returns no box,
+            # but it does not depend on the model and overlaps the forward pass.
+            scan = stages.StageGraph()
+            scan.add("forward", lambda: cached_feature(
+                "latex.classify", lambda: read_latex_prediction(model(img, verbose=False)),
+                encode_detection_feature, decode_detection_feature,
+            ))
+            scan.add("segment", lambda: cached_feature(
+                "latex.segment", lambda: segment_latex_region(img, features), encode_mask_feature, decode_mask_feature,
+            ))
+            done = scan.run()
+            if ran is not None:
+                ran.append("latex.classify")
+            latex_type, confidence, box = done["forward"]
             
             sys.stderr.write(f"✅ [Python ML] Latex Model Prediction: {latex_type} ({confidence:.1f}%)\n")
             
             # --- Combine AI Prediction with Heuristics ---
             
-            # Use detection box if available to mask the latex area for accurate color
-            latex_mask = None
-            if hasattr(results[0], 'boxes') and results[0].boxes is not None and len(results[0].boxes) > 0:
-                best_box_idx = results[0].boxes.conf.argmax()
-                box = results[0].boxes.xyxy[best_box_idx].cpu().numpy().astype(int)
-                x1, y1, x2, y2 = box
+            with tracing.stage("latex.masks"):
+                # Use detection box if available to mask the latex area for accurate color
+                latex_mask = None
+                if box is not None:
+                    x1, y1, x2, y2 = box
                 
-                # Create mask for color analysis
-                latex_mask = np.zeros(img.shape[:2], dtype=np.uint8)
-                latex_mask[y1:y2, x1:x2] = 255
-            else:
-                # Fallback: Use HSV segmentation to find latex-colored regions (White/Yellowish)
-                # This ignores dark bark/background
-                hsv_img = cv2.cvtColor(img, cv2.COLOR_BGR2HSV)
-                
-                # Define range for white/cream/yellowish latex
-                # Hue: 0-180 (OpenCV), allow yellowish (20-40) and neutral/white
-                # Saturation: Low for white (0-60), higher for yellow (up to 150)
-                # Value: High brightness (>100)
-                
-                # White/Light Grey Mask
-                lower_white = np.array([0, 0, 100])
-                upper_white = np.array([180, 60, 255])
-                mask_white = cv2.inRange(hsv_img, lower_white, upper_white)
-                
-                # Yellowish Mask (for oxidized latex)
-                lower_yellow = np.array([15, 60, 100])
-                upper_yellow = np.array([40, 200, 255])
-                mask_yellow = cv2.inRange(hsv_img, lower_yellow, upper_yellow)
-                
-                # Combine masks
-                latex_mask = cv2.bitwise_or(mask_white, mask_yellow)
-                
-                # Clean up mask (morphology)
-                kernel = np.ones((5,5), np.uint8)
-                latex_mask = cv2.morphologyEx(latex_mask, cv2.MORPH_OPEN, kernel)
-                latex_mask = cv2.morphologyEx(latex_mask, cv2.MORPH_CLOSE, kernel)
-                
-                # If mask is empty (e.g., lighting issues), fallback to center crop
-                if cv2.countNonZero(latex_mask) < (img.shape[0] * img.shape[1] * 0.05): # Less than 5% latex found
-                    sys.stderr.write("⚠️ [Python ML] Latex segmentation failed, falling back to center crop.\n")
-                    h, w = img.shape[:2]
-                    center_h, center_w = h // 2, w // 2
-                    crop_h, crop_w = h // 3, w // 3
+                    # Create mask for color analysis
                     latex_mask = np.zeros(img.shape[:2], dtype=np.uint8)
-                    latex_mask[center_h-crop_h//2:center_h+crop_h//2, center_w-crop_w//2:center_w+crop_w//2] = 255
+                    latex_mask[y1:y2, x1:x2] = 255
+                else:
+                    # Fallback: HSV segmentation, computed alongside the forward pass
+                    latex_mask, segmented = done["segment"]
+                    if not segmented:
+                        sys.stderr.write("⚠️ [Python ML] Latex segmentation failed, falling back to center crop.\n")
 
-            # Calculate average color ONLY within the mask
-            avg_color = cv2.mean(img, mask=latex_mask)[:3]
+                # Calculate average color ONLY within the mask
+                avg_color = cv2.mean(img, mask=latex_mask)[:3]
             
-            # Re-calculate contamination ratio within the MASKED area only
-            # Invert mask to find dark spots inside the latex area
-            # We want pixels that are INSIDE latex_mask but are DARK (contamination)
-            gray_masked = cv2.bitwise_and(gray, gray, mask=latex_mask)
-            _, contamination_thresh = cv2.threshold(gray_masked, 90, 255, cv2.THRESH_BINARY)
-            # Dark pixels will be 0, bright will be 255. 
-            # But outside mask is 0 too. So we need to distinguish background (0) from contamination (0).
-            # Easier: Find pixels where (latex_mask > 0) AND (gray < 90)
+                # Re-calculate contamination ratio within the MASKED area only
+                # Invert mask to find dark spots inside the latex area
+                # We want pixels that are INSIDE latex_mask but are DARK (contamination)
+                gray = features.gray
+                gray_masked = cv2.bitwise_and(gray, gray, mask=latex_mask)
+                _, contamination_thresh = cv2.threshold(gray_masked, 90, 255, cv2.THRESH_BINARY)
+                # Dark pixels will be 0, bright will be 255. 
+                # But outside mask is 0 too. So we need to distinguish background (0) from contamination (0).
+                # Easier: Find pixels where (latex_mask > 0) AND (gray < 90)
             
-            latex_pixels_count = cv2.countNonZero(latex_mask)
-            if latex_pixels_count > 0:
-                # Contamination = pixels inside mask that are dark
-                contamination_mask = cv2.inRange(gray_masked, 1, 90) # 1 to exclude background 0
-                contamination_pixels = cv2.countNonZero(contamination_mask)
-                contamination_ratio = contamination_pixels / latex_pixels_count
-            else:
-                contamination_ratio = 0.0
+                latex_pixels_count = cv2.countNonZero(latex_mask)
+                if latex_pixels_count > 0:
+                    # Contamination = pixels inside mask that are dark
+                    contamination_mask = cv2.inRange(gray_masked, 1, 90) # 1 to exclude background 0
+                    contamination_pixels = cv2.countNonZero(contamination_mask)
+                    contamination_ratio = contamination_pixels / latex_pixels_count
+                else:
+                    contamination_ratio = 0.0
 
             # Adjust Grade/DRC based on Model Class
             primary_color_class = "Unknown"
@@ -1265,16 +1622,52 @@ def analyze_latex_with_model(img, image_path_for_saving=None):
         except Exception as e:
             sys.stderr.write(f"❌ [Python ML] Model inference error: {e}\n")
             # Fallback to heuristic
-            return analyze_latex_heuristic(img)
+            return analyze_latex_heuristic(img, features)
     
     # Fallback if no model
-    return analyze_latex_heuristic(img)
+    return analyze_latex_heuristic(img, features)
 
 
 
-def analyze_trunk_with_model(img, image_path_for_saving=None, base_confidence=0.0):
+def predict_trunk_disease(img, model):
+    """
+    Trunks.pt best detection (class name, confidence %, bounding box or None) for `img`.
+    """
+    def trunk_forward():
+        # Raw prediction, independent of base_confidence so it can be cached.
+        name, conf, bbox = "Healthy", 0.0, None
+        results = model(img, verbose=False)
+
+        # Check for detections (OBB or Standard Box)
+        # The bounding box is kept for better girth estimation.
+        if hasattr(results[0], 'obb') and results[0].obb is not None and len(results[0].obb) > 0:
+            # OBB Detection
+            best_idx = results[0].obb.conf.argmax()
+            cls_id = int(results[0].obb.cls[best_idx].item())
+            name = results[0].names[cls_id]
+            conf = float(results[0].obb.conf[best_idx].item()) * 100
+            bbox = results[0].obb.xyxyxyxy[best_idx].cpu().numpy().astype(int) # 4 points
+        elif hasattr(results[0], 'boxes') and results[0].boxes is not None and len(results[0].boxes) > 0:
+            # Standard Box Detection
+            best_idx = results[0].boxes.conf.argmax()
+            cls_id = int(results[0].boxes.cls[best_idx].item())
+            name = results[0].names[cls_id]
+            conf = float(results[0].boxes.conf[best_idx].item()) * 100
+            bbox = results[0].boxes.xyxy[best_idx].cpu().numpy().astype(int) # [x1, y1, x2, y2]
+        elif hasattr(results[0], 'probs') and results[0].probs is not None:
+            # Classification Fallback
+            probs = results[0].probs
+            top1_index = probs.top1
+            name = results[0].names[top1_index]
+            conf = float(probs.top1conf.item()) * 100
+        return name, conf, bbox
+
+    return cached_feature("trunk.detect", trunk_forward, encode_detection_feature, decode_detection_feature)
+
+def analyze_trunk_with_model(img, image_path_for_saving=None, base_confidence=0.0, prediction=None):
     """
     Uses the trained Trunks.pt model for disease detection and analysis.
+    `prediction` is the result of predict_trunk_disease when it already ran.
     """
     model = get_trunk_model()
     
@@ -1287,65 +1680,50 @@ def analyze_trunk_with_model(img, image_path_for_saving=None, base_confidence=0.
     
     if model:
         try:
-            results = model(img, verbose=False)
-            
-            # Check for detections (OBB or Standard Box)
-            if hasattr(results[0], 'obb') and results[0].obb is not None and len(results[0].obb) > 0:
-                # OBB Detection
-                best_idx = results[0].obb.conf.argmax()
-                cls_id = int(results[0].obb.cls[best_idx].item())
-                disease_name = results[0].names[cls_id]
-                confidence = float(results[0].obb.conf[best_idx].item()) * 100
-            elif hasattr(results[0], 'boxes') and results[0].boxes is not None and len(results[0].boxes) > 0:
-                # Standard Box Detection
-                best_idx = results[0].boxes.conf.argmax()
-                cls_id = int(results[0].boxes.cls[best_idx].item())
-                disease_name = results[0].names[cls_id]
-                confidence = float(results[0].boxes.conf[best_idx].item()) * 100
-            elif hasattr(results[0], 'probs') and results[0].probs is not None:
-                # Classification Fallback
-                probs = results[0].probs
-                top1_index = probs.top1
-                disease_name = results[0].names[top1_index]
-                confidence = float(probs.top1conf.item()) * 100
-            
-            # Ensure confidence is not zero if we default to healthy but have a base confidence
-            if confidence == 0.0 and base_confidence > 0:
-                 confidence = base_confidence
+            def detect_trunk():
+                name, conf, bbox = prediction if prediction is not None else predict_trunk_disease(img, model)
 
-            # Keep the raw class label from Trunks model for disease display.
-            classified_name = str(disease_name).strip()
+                # Ensure confidence is not zero if we default to healthy but have a base confidence
+                if conf == 0.0 and base_confidence > 0:
+                     conf = base_confidence
 
-            # Map classification to severity/recommendation.
-            mapped_name, severity, recommendation = map_trunk_disease(classified_name)
+                # Keep the raw class label from Trunks model for disease display.
+                classified_name = str(name).strip()
 
-            # For diseased trunks, show the actual class label from model.
-            # For healthy classes, show the mapped healthy label.
-            if severity == "none":
-                disease_name = mapped_name
-            else:
-                disease_name = classified_name or mapped_name
-            
-            sys.stderr.write(f"✅ [Python ML] Trunk Model Prediction: {disease_name} ({confidence:.1f}%)\n")
+                # Map classification to severity/recommendation.
+                mapped_name, sev, rec = map_trunk_disease(classified_name)
+
+                # For diseased trunks, show the actual class label from model.
+                # For healthy classes, show the mapped healthy label.
+                if sev == "none":
+                    name = mapped_name
+                else:
+                    name = classified_name or mapped_name
+                
+                sys.stderr.write(f"✅ [Python ML] Trunk Model Prediction: {name} ({conf:.1f}%)\n")
+                pending = prefetch_groq_analysis(name, conf, spot_count=0)
+                return name, conf, sev, rec, pending, bbox
+
+            # --- Physical Properties (Real Analysis) ---
+            # Texture and color do not need the detection, so they run while the
+            # detector does; girth waits for its bounding box.
+            scan = stages.StageGraph()
+            scan.add("detect", detect_trunk)
+            scan.add("surface", lambda: cached_feature("trunk.surface", lambda: analyze_trunk_surface(img), decode=tuple))
+            scan.add("girth", lambda detection: cached_feature(
+                "trunk.girth", lambda: estimate_trunk_girth(img, detection[5]), decode=tuple,
+            ), "detect")
+            done = scan.run()
+
+            disease_name, confidence, severity, recommendation, pending_insights, _ = done["detect"]
+            trunk_phys = trunk_physical_summary(done["girth"], done["surface"])
             
             # Get Groq Analysis
             sys.stderr.write(f"🧠 [Python ML] Requesting detailed trunk analysis from Groq...\n")
             
-            # --- Physical Properties (Real Analysis) ---
-            # Pass bounding box if available for better girth estimation
-            bbox = None
-            if hasattr(results[0], 'obb') and results[0].obb is not None and len(results[0].obb) > 0:
-                 best_idx = results[0].obb.conf.argmax()
-                 bbox = results[0].obb.xyxyxyxy[best_idx].cpu().numpy().astype(int) # 4 points
-            elif hasattr(results[0], 'boxes') and results[0].boxes is not None and len(results[0].boxes) > 0:
-                 best_idx = results[0].boxes.conf.argmax()
-                 bbox = results[0].boxes.xyxy[best_idx].cpu().numpy().astype(int) # [x1, y1, x2, y2]
-            
-            trunk_phys = analyze_trunk_physical(img, bbox)
-            
             # We can reuse the leaf analysis prompt structure or create a new one. 
             # For simplicity, we reuse get_groq_analysis but contextually it works for diseases.
-            ai_insights = get_groq_analysis(disease_name, confidence, 0, trunk_phys["color"]) # Use real color
+            ai_insights = await_groq_analysis(pending_insights, disease_name, confidence, 0, trunk_phys["color"]) # Use real color
             
             if ai_insights and text_says_healthy(ai_insights.get("diagnosis")):
                  severity = "none"
@@ -1396,6 +1774,7 @@ def analyze_trunk_with_model(img, image_path_for_saving=None, base_confidence=0.
 
 def analyze_trunk_heuristic_wrapper(img):
     # Wrapper to format heuristic output to match full analysis structure
+    tracing.record_fallback("trunk.heuristic")
     trunk_data = analyze_trunk_physical(img) # Use new physical analysis
     return {
         "treeIdentification": {"isRubberTree": True, "confidence": 100, "detectedPart": "trunk", "maturity": "mature"},
@@ -1420,11 +1799,20 @@ def analyze_trunk_heuristic_wrapper(img):
         "productivityRecommendation": {"status": "optimal", "suggestions": ["Monitor growth."]}
     }
 
+@traced("trunk.physical")
 def analyze_trunk_physical(img, bbox=None):
     """
     Analyzes physical properties of the trunk from the image.
     Uses bounding box if available, otherwise heuristic center crop.
     """
+    return trunk_physical_summary(estimate_trunk_girth(img, bbox), analyze_trunk_surface(img))
+
+@traced("trunk.girth")
+def estimate_trunk_girth(img, bbox=None):
+    """
+    Girth and diameter in cm, from the detection box width or the strongest
+    vertical edges of the middle row. Returns (girth_cm, diameter_cm).
+    """
     height, width = img.shape[:2]
     
     # 1. Girth/Diameter Estimation (Pixel-based)
@@ -1442,7 +1830,6 @@ def analyze_trunk_physical(img, bbox=None):
     if pixel_width == 0:
         # Heuristic: Find strong vertical edges in the middle third
         gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
-        center_row = gray[height//2, :]
         edges = cv2.Canny(gray, 50, 150)
         row_edges = edges[height//2, :]
         edge_indices = np.where(row_edges > 0)[0]
@@ -1462,6 +1849,15 @@ def analyze_trunk_physical(img, bbox=None):
     # Clamp to realistic values (10cm - 150cm)
     estimated_girth_cm = max(10.0, min(150.0, estimated_girth_cm))
     estimated_diameter_cm = estimated_girth_cm / 3.14159
+    return estimated_girth_cm, estimated_diameter_cm
+
+@traced("trunk.surface")
+def analyze_trunk_surface(img):
+    """
+    Bark texture and color from the center of the image. Does not need the
+    detection, so it can run alongside the trunk model. Returns (texture, color).
+    """
+    height, width = img.shape[:2]
 
     # 2. Texture Analysis
     gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
@@ -1494,7 +1890,11 @@ def analyze_trunk_physical(img, bbox=None):
     # Refine color name for trunk context
     if "Green" in dominant_color: dominant_color = "Mossy/Greenish"
     if "Yellow" in dominant_color: dominant_color = "Pale/Yellowish"
-    
+    return texture, dominant_color
+
+def trunk_physical_summary(girth, surface):
+    estimated_girth_cm, estimated_diameter_cm = girth
+    texture, dominant_color = surface
     return {
         "girth": round(float(estimated_girth_cm), 1),
         "diameter": round(float(estimated_diameter_cm), 1),
@@ -1509,18 +1909,15 @@ def analyze_trunk_heuristic(img):
     # Legacy wrapper
     return analyze_trunk_physical(img)
 
-def analyze_latex_heuristic(img):
+@traced("latex.heuristic")
+def analyze_latex_heuristic(img, features=None):
     # Heuristic grade estimation + Groq recommendations (no static product templates)
-    hsv = cv2.cvtColor(img, cv2.COLOR_BGR2HSV)
-    avg_color_per_row = np.average(img, axis=0)
-    avg_color = np.average(avg_color_per_row, axis=0)
-    mean_saturation = np.mean(hsv[:, :, 1])
-    mean_value = np.mean(hsv[:, :, 2])
-    
-    gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
-    _, thresh = cv2.threshold(gray, 100, 255, cv2.THRESH_BINARY_INV)
-    contamination_pixels = cv2.countNonZero(thresh)
-    contamination_ratio = contamination_pixels / (img.shape[0] * img.shape[1])
+    tracing.record_fallback("latex.heuristic")
+    features = features or latex_features.LatexFeatures(img)
+    avg_color = features.avg_color
+    mean_saturation = features.mean_saturation
+    mean_value = features.mean_value
+    contamination_ratio = features.contamination_ratio
     
     grade = 'A'
     drc = 40.0
@@ -1602,4 +1999,9 @@ def analyze_latex_heuristic(img):
 
 if __name__ == "__main__":
     # print("DEBUG: MAIN CALLED")
+    # Helper modules (batch.py, ...) `import main`; make that resolve to this module
+    # instead of loading a second copy with its own model cache.
+    sys.modules.setdefault('main', sys.modules[__name__])
     main()
+    if os.environ.get("RUBBERSENSE_MODEL_STATS") == "1":
+        sys.stderr.write(f"📊 [Model Manager] {json.dumps(MODEL_MANAGER.stats())}\n")
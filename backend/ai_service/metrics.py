@@ -0,0 +1,292 @@
+"""
+Process-wide service metrics in Prometheus text exposition format.
+
+The persistent worker (server.py) runs every request under a trace (see
+tracing.py) and folds it into these metrics when the request finishes, so the
+analysis code needs no metrics-specific hooks:
+  - requests and latency per mode, errors and fallbacks taken
+  - latency per model forward pass (`model.*` stages)
+  - latency per external call (image download, Groq)
+  - latency of the remaining CV stages
+  - cold/warm model accesses and cache hits/misses (hit ratio = hits / (hits + misses))
+Queue depth, admission rejections, coalesced and in-flight requests are set by the server; process RSS
+and per-model residency are read at scrape time.
+"""
+import os
+import threading
+
+from model_manager import MB, current_rss_bytes
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+KNOWN_MODES = ('tree', 'latex', 'ai_suggestions')
+EXTERNAL_STAGES = ('image.download', 'llm.groq', 'llm.local')
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _format_labels(names, values, extra=()):
+    pairs = list(zip(names, values)) + list(extra)
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in pairs) + '}'
+
+
+def _format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+class _Metric:
+    kind = None
+
+    def __init__(self, name, help_text, labelnames=()):
+        self.name = name
+        self.help_text = help_text
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def _key(self, labels):
+        return tuple(str(labels.get(name, '')) for name in self.labelnames)
+
+    def reset(self):
+        with self._lock:
+            self._values.clear()
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} {self.kind}"]
+        with self._lock:
+            items = sorted(self._values.items())
+        for key, value in items:
+            lines.extend(self._render_sample(key, value))
+        return lines
+
+    def _render_sample(self, key, value):
+        return [f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}"]
+
+
+class Counter(_Metric):
+    kind = 'counter'
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels):
+        with self._lock:
+            return self._values.get(self._key(labels), 0)
+
+
+class Gauge(_Metric):
+    kind = 'gauge'
+
+    def set(self, value, **labels):
+        with self._lock:
+            self._values[self._key(labels)] = value
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def dec(self, amount=1, **labels):
+        self.inc(-amount, **labels)
+
+    def value(self, **labels):
+        with self._lock:
+            return self._values.get(self._key(labels), 0)
+
+
+class Histogram(_Metric):
+    kind = 'histogram'
+
+    def __init__(self, name, help_text, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, help_text, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            entry = self._values.get(key)
+            if entry is None:
+                entry = self._values[key] = {'buckets': [0] * len(self.buckets), 'sum': 0.0, 'count': 0}
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    entry['buckets'][i] += 1
+            entry['sum'] += value
+            entry['count'] += 1
+
+    def count(self, **labels):
+        with self._lock:
+            entry = self._values.get(self._key(labels))
+            return entry['count'] if entry else 0
+
+    def _render_sample(self, key, entry):
+        lines = []
+        for bound, count in zip(self.buckets, entry['buckets']):
+            labels = _format_labels(self.labelnames, key, [('le', _format_value(bound))])
+            lines.append(f"{self.name}_bucket{labels} {count}")
+        labels = _format_labels(self.labelnames, key, [('le', '+Inf')])
+        lines.append(f"{self.name}_bucket{labels} {entry['count']}")
+        labels = _format_labels(self.labelnames, key)
+        lines.append(f"{self.name}_sum{labels} {_format_value(entry['sum'])}")
+        lines.append(f"{self.name}_count{labels} {entry['count']}")
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self._metrics = []
+        self._collectors = []
+
+    def register(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def add_collector(self, fn):
+        """
+        `fn()` runs before every render to refresh scrape-time gauges.
+        """
+        self._collectors.append(fn)
+
+    def reset(self):
+        for metric in self._metrics:
+            metric.reset()
+
+    def render(self):
+        for collector in self._collectors:
+            collector()
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+REQUESTS = REGISTRY.register(Counter(
+    'rubbersense_requests_total', 'Analysis requests by mode and outcome.', ('mode', 'outcome')))
+REQUEST_SECONDS = REGISTRY.register(Histogram(
+    'rubbersense_request_duration_seconds', 'End-to-end request latency by mode.', ('mode',)))
+MODEL_FORWARD_SECONDS = REGISTRY.register(Histogram(
+    'rubbersense_model_forward_seconds', 'Model forward pass latency.', ('model',)))
+EXTERNAL_CALL_SECONDS = REGISTRY.register(Histogram(
+    'rubbersense_external_call_seconds', 'Latency of external calls (image download, Groq).', ('call',)))
+STAGE_SECONDS = REGISTRY.register(Histogram(
+    'rubbersense_stage_duration_seconds', 'Latency of the remaining pipeline stages.', ('stage',)))
+MODEL_ACCESSES = REGISTRY.register(Counter(
+    'rubbersense_model_accesses_total', 'Model accesses per request, cold (loaded) or warm.', ('model', 'state')))
+CACHE_LOOKUPS = REGISTRY.register(Counter(
+    'rubbersense_cache_lookups_total', 'Cache lookups by cache and result (hit/miss).', ('cache', 'result')))
+FALLBACKS = REGISTRY.register(Counter(
+    'rubbersense_fallbacks_total', 'Degraded paths taken (heuristic analysis, canned LLM text).', ('mode', 'fallback')))
+QUEUE_DEPTH = REGISTRY.register(Gauge(
+    'rubbersense_queue_depth', 'Requests waiting for a worker slot.'))
+QUEUE_DEPTH_BY_PRIORITY = REGISTRY.register(Gauge(
+    'rubbersense_queue_depth_by_priority', 'Requests waiting for a worker slot, by priority class.', ('priority',)))
+QUEUE_WAIT_SECONDS = REGISTRY.register(Histogram(
+    'rubbersense_queue_wait_seconds', 'Time admitted requests waited for a worker slot.', ('priority',)))
+REJECTED = REGISTRY.register(Counter(
+    'rubbersense_rejected_requests_total', 'Requests turned away by admission control.', ('mode', 'reason')))
+COALESCED = REGISTRY.register(Counter(
+    'rubbersense_coalesced_requests_total', 'Requests served by an identical request already in flight.', ('mode',)))
+IN_FLIGHT = REGISTRY.register(Gauge(
+    'rubbersense_requests_in_flight', 'Requests currently being analyzed.'))
+PROCESS_RSS = REGISTRY.register(Gauge(
+    'rubbersense_process_resident_memory_bytes', 'Resident set size of the worker process.'))
+MODEL_RESIDENT = REGISTRY.register(Gauge(
+    'rubbersense_model_resident_bytes', 'Estimated memory held by each loaded model.', ('model',)))
+MODEL_LOADS = REGISTRY.register(Gauge(
+    'rubbersense_model_loads', 'Times each model has been loaded into this process.', ('model',)))
+
+
+def mode_label(mode):
+    # Bounded label values: arbitrary mode strings from callers would explode the series count.
+    return mode if mode in KNOWN_MODES else 'unknown'
+
+
+def observe_request(mode, result, trace, seconds):
+    """
+    Folds one finished request (its result and trace) into the metrics.
+    """
+    mode = mode_label(mode)
+    failed = isinstance(result, dict) and bool(result.get('error'))
+    REQUESTS.inc(mode=mode, outcome='error' if failed else 'ok')
+    REQUEST_SECONDS.observe(seconds, mode=mode)
+    if trace is None:
+        return
+
+    timings = trace.to_dict()
+    for stage in timings['stages']:
+        name = stage['name']
+        seconds = stage['wall_ms'] / 1000.0
+        if name.startswith('model.'):
+            MODEL_FORWARD_SECONDS.observe(seconds, model=name[len('model.'):])
+        elif name in EXTERNAL_STAGES:
+            EXTERNAL_CALL_SECONDS.observe(seconds, call=name)
+        else:
+            STAGE_SECONDS.observe(seconds, stage=name)
+    for model, state in timings['models'].items():
+        MODEL_ACCESSES.inc(model=model, state=state)
+    for cache, counts in timings['cache'].items():
+        if counts['hits']:
+            CACHE_LOOKUPS.inc(counts['hits'], cache=cache, result='hit')
+        if counts['misses']:
+            CACHE_LOOKUPS.inc(counts['misses'], cache=cache, result='miss')
+    for fallback in timings['fallbacks']:
+        FALLBACKS.inc(mode=mode, fallback=fallback)
+
+
+def collect_process_metrics(manager=None):
+    PROCESS_RSS.set(current_rss_bytes())
+    if manager is None:
+        return
+    for name, entry in manager.stats()['models'].items():
+        MODEL_RESIDENT.set(int(entry['resident_mb'] * MB), model=name)
+        MODEL_LOADS.set(entry['loads'], model=name)
+
+
+def write_metrics_file(path, registry=REGISTRY):
+    """
+    Atomically replaces `path` with the current exposition (node_exporter textfile style).
+    """
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, 'w') as f:
+        f.write(registry.render())
+    os.replace(tmp, path)
+
+
+class MetricsFileWriter:
+    """
+    Background thread that dumps the registry to a file every `interval` seconds.
+    """
+
+    def __init__(self, path, interval=15.0, registry=REGISTRY):
+        self.path = path
+        self.interval = max(0.1, float(interval))
+        self.registry = registry
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="metrics-writer", daemon=True)
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            try:
+                write_metrics_file(self.path, self.registry)
+            except OSError:
+                pass
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join(timeout=self.interval + 1)
+        write_metrics_file(self.path, self.registry)
@@ -0,0 +1,550 @@
+import os
+import sys
+import gc
+import hashlib
+import time
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+
+import tracing
+
+MB = 1024 * 1024
+
+
+def _env_float(name, default):
+    raw = os.environ.get(name, "")
+    try:
+        return float(raw) if raw.strip() else default
+    except ValueError:
+        sys.stderr.write(f"⚠️ [Model Manager] Ignoring invalid {name}={raw!r}\n")
+        return default
+
+
+def _env_list(name):
+    raw = os.environ.get(name, "")
+    return [item.strip().lower() for item in raw.split(",") if item.strip()]
+
+
+def current_rss_bytes():
+    """
+    Resident set size of this process in bytes (0 if it cannot be determined).
+    """
+    try:
+        with open("/proc/self/statm") as f:
+            pages = int(f.read().split()[1])
+        return pages * os.sysconf("SC_PAGE_SIZE")
+    except Exception:
+        pass
+    try:
+        import resource
+        # ru_maxrss is KB on Linux, bytes on macOS. It is a peak, not current, but better than nothing.
+        rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return rss if sys.platform == "darwin" else rss * 1024
+    except Exception:
+        return 0
+
+
+_FILE_DIGESTS = {}
+
+
+def _file_digest(path):
+    stat = os.stat(path)
+    key = (os.path.abspath(path), stat.st_size, stat.st_mtime_ns)
+    if key not in _FILE_DIGESTS:
+        digest = hashlib.sha256()
+        with open(path, "rb") as f:
+            for block in iter(lambda: f.read(1024 * 1024), b""):
+                digest.update(block)
+        _FILE_DIGESTS[key] = digest.digest()
+    return _FILE_DIGESTS[key]
+
+
+def estimate_model_bytes(model):
+    """
+    Sum of parameter and buffer bytes of a torch-backed model (e.g. an ultralytics YOLO).
+    Returns 0 when the model does not expose torch tensors.
+    """
+    inner = getattr(model, "model", model)
+    total = 0
+    try:
+        for tensor in list(inner.parameters()) + list(inner.buffers()):
+            total += tensor.numel() * tensor.element_size()
+    except Exception:
+        return 0
+    return total
+
+
+def _replica_setting(name):
+    per_model = os.environ.get(f"RUBBERSENSE_MODEL_REPLICAS_{name.upper()}", "")
+    if per_model.strip():
+        return max(1, int(_env_float(f"RUBBERSENSE_MODEL_REPLICAS_{name.upper()}", 1)))
+    return max(1, int(_env_float("RUBBERSENSE_MODEL_REPLICAS", 1)))
+
+
+class HandleEvicted(RuntimeError):
+    """
+    Raised by checkout() on a handle its manager has evicted.
+    """
+
+
+class ModelHandle:
+    """
+    Thread-safe access to one model.
+
+    A single ultralytics predictor must not be used by two threads at once, so a
+    handle owns up to `max_replicas` independent copies of the model. Callers
+    check a replica out, run inference, and check it back in. Replicas beyond the
+    first are loaded on demand when every existing replica is busy.
+
+    Calling the handle like a model (`handle(img, verbose=False)`) does the
+    checkout/checkin around a single forward pass. Batch jobs can run one
+    forward pass over many images with `predict_batch()` and `prime()` the
+    per-image results so the regular single-image code path reuses them.
+
+    Once evicted, a handle hands out no more replicas: requests still holding
+    it run on the handle `reopen()` returns (the manager's current one), so
+    every loaded replica counts against the memory budget.
+    """
+
+    def __init__(self, name, loader, first_replica, max_replicas=1, on_grow=None, reopen=None):
+        self.name = name
+        self.max_replicas = max(1, int(max_replicas))
+        self._loader = loader
+        self._on_grow = on_grow
+        self._reopen = reopen
+        self._cond = threading.Condition()
+        self._idle = [first_replica]
+        self._replicas = [first_replica]
+        self._loading = 0
+        self._in_use = 0
+        self._primed = {}
+        self._derived = {}
+        self.evicted = False
+
+    def replica_count(self):
+        with self._cond:
+            return len(self._replicas)
+
+    def in_use(self):
+        with self._cond:
+            return self._in_use
+
+    def checkout(self, timeout=None):
+        """
+        Take an idle replica, loading another one if all are busy and the handle may grow.
+        Raises TimeoutError if none became free within `timeout` seconds, and
+        HandleEvicted once the handle has been evicted.
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._cond:
+            while True:
+                if self.evicted:
+                    raise HandleEvicted(f"'{self.name}' was evicted")
+                if self._idle:
+                    self._in_use += 1
+                    return self._idle.pop()
+                if len(self._replicas) + self._loading < self.max_replicas:
+                    self._loading += 1
+                    break
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    raise TimeoutError(f"No free '{self.name}' replica within {timeout}s")
+                self._cond.wait(remaining)
+
+        # Load the extra replica without holding the condition so other threads can check in.
+        replica = None
+        try:
+            replica = self._loader()
+        except Exception as e:
+            sys.stderr.write(f"❌ [Model Manager] Extra '{self.name}' replica failed to load: {e}\n")
+
+        with self._cond:
+            self._loading -= 1
+            if replica is not None and self.evicted:
+                # Evicted while loading: the replica was never counted, drop it.
+                self._cond.notify_all()
+                raise HandleEvicted(f"'{self.name}' was evicted")
+            if replica is None:
+                # Could not grow; fall back to waiting for an existing replica.
+                self.max_replicas = len(self._replicas)
+                self._cond.notify_all()
+            else:
+                self._replicas.append(replica)
+                self._in_use += 1
+        if replica is None:
+            return self.checkout(None if deadline is None else max(0.0, deadline - time.monotonic()))
+        if self._on_grow:
+            self._on_grow(self)
+        return replica
+
+    def checkin(self, replica):
+        with self._cond:
+            self._in_use -= 1
+            if self.evicted:
+                if replica in self._replicas:
+                    self._replicas.remove(replica)
+            else:
+                self._idle.append(replica)
+            self._cond.notify()
+
+    @contextmanager
+    def replica(self, timeout=None):
+        handle = self
+        try:
+            model = self.checkout(timeout)
+        except HandleEvicted:
+            handle = self._reopen() if self._reopen else None
+            if handle is None:
+                raise
+            model = handle.checkout(timeout)
+        try:
+            yield model
+        finally:
+            handle.checkin(model)
+
+    def __call__(self, *args, **kwargs):
+        if args and self._primed:
+            entry = self._primed.get(id(args[0]))
+            if entry is not None and entry[0] is args[0]:
+                tracing.record_cache("primed_prediction", True)
+                return [entry[1]]
+        with self.replica() as model, tracing.stage(f"model.{self.name}"):
+            return model(*args, **kwargs)
+
+    def predict_batch(self, imgs, **kwargs):
+        """
+        Run one forward pass over a list of images. Returns one result per image.
+        """
+        with self.replica() as model:
+            return list(model(list(imgs), **kwargs))
+
+    def prime(self, img, result):
+        """
+        Make calls with this exact image object return `result` instead of running the model.
+        """
+        with self._cond:
+            self._primed[id(img)] = (img, result)
+
+    def discard_primed(self, img):
+        with self._cond:
+            self._primed.pop(id(img), None)
+
+    def derived(self, key, build):
+        """
+        `build()`, computed once for this handle (this load of the weights) and
+        dropped with it, e.g. lookup tables derived from the model's class names.
+        """
+        with self._cond:
+            if key in self._derived:
+                return self._derived[key]
+        value = build()
+        with self._cond:
+            return self._derived.setdefault(key, value)
+
+    def release(self):
+        """
+        Drop idle replicas; busy ones are dropped as they are checked in.
+        """
+        with self._cond:
+            self.evicted = True
+            for replica in self._idle:
+                if replica in self._replicas:
+                    self._replicas.remove(replica)
+            self._idle = []
+            # Waiting checkouts re-check and move to the reopened handle.
+            self._cond.notify_all()
+
+
+class ModelManager:
+    """
+    Keeps the AI models resident under a memory budget.
+
+    Models are registered with a loader callable and loaded lazily on first use.
+    When loading a model would push the resident total over the budget, the
+    least-recently-used unpinned models that are not in use are evicted first.
+    A budget of 0 means unlimited (every model stays resident once loaded, the
+    historical behaviour).
+
+    `get()` returns a ModelHandle. Loads are serialized per model, so two threads
+    asking for the same cold model load it once, while different models can load
+    in parallel.
+
+    Configuration (environment):
+      RUBBERSENSE_MODEL_BUDGET_MB        - memory budget for all resident models (0 = unlimited)
+      RUBBERSENSE_PINNED_MODELS          - comma separated model names that are never evicted
+      RUBBERSENSE_MODEL_REPLICAS         - predictor replicas per model (default 1)
+      RUBBERSENSE_MODEL_REPLICAS_<NAME>  - per-model override, e.g. RUBBERSENSE_MODEL_REPLICAS_LEAF=2
+    """
+
+    def __init__(self, budget_bytes=None, pinned=None):
+        if budget_bytes is None:
+            budget_bytes = int(_env_float("RUBBERSENSE_MODEL_BUDGET_MB", 0) * MB)
+        self.budget_bytes = max(0, int(budget_bytes))
+        self.pinned = set(pinned if pinned is not None else _env_list("RUBBERSENSE_PINNED_MODELS"))
+
+        self._lock = threading.RLock()
+        self._loaders = {}
+        self._load_locks = {}
+        self._replica_limits = {}
+        self._size_hints = {}
+        self._identities = {}
+        self._resident = OrderedDict()  # name -> ModelHandle, ordered least -> most recently used
+        self._sizes = {}  # name -> bytes per replica
+        self._stats = {}
+
+    # ------------------------------------------------------------------
+    # Registration
+    # ------------------------------------------------------------------
+    def register(self, name, loader, size_hint_path=None, replicas=None, identity=None):
+        """
+        Register a model loader. `size_hint_path` (usually the weights file, as an
+        absolute path) is used to estimate the resident size before the model has
+        been loaded once, and its contents identify the weights in fingerprint().
+        `identity` stands in for the contents while that file does not exist (e.g.
+        the name and version of weights the loader downloads).
+        """
+        with self._lock:
+            self._loaders[name] = loader
+            self._load_locks.setdefault(name, threading.Lock())
+            self._replica_limits[name] = replicas if replicas is not None else _replica_setting(name)
+            self._size_hints[name] = size_hint_path
+            self._identities[name] = identity
+            self._stats.setdefault(name, {
+                "hits": 0,
+                "loads": 0,
+                "load_failures": 0,
+                "evictions": 0,
+                "load_seconds_total": 0.0,
+                "last_load_seconds": 0.0,
+            })
+
+    def pin(self, name):
+        with self._lock:
+            self.pinned.add(name)
+
+    def unpin(self, name):
+        with self._lock:
+            self.pinned.discard(name)
+
+    # ------------------------------------------------------------------
+    # Access
+    # ------------------------------------------------------------------
+    def _lookup(self, name):
+        handle = self._resident.get(name)
+        if handle is not None:
+            self._resident.move_to_end(name)
+            self._stats[name]["hits"] += 1
+            tracing.record_model(name, cold=False)
+        return handle
+
+    def get(self, name):
+        """
+        Return the ModelHandle for `name`, loading (and evicting others) if needed.
+        Returns None if the model is unavailable.
+        """
+        with self._lock:
+            if name not in self._loaders:
+                raise KeyError(f"Unknown model '{name}'")
+            handle = self._lookup(name)
+            if handle is not None:
+                return handle
+            load_lock = self._load_locks[name]
+
+        with load_lock:
+            with self._lock:
+                # Another thread may have finished loading while we waited.
+                handle = self._lookup(name)
+                if handle is not None:
+                    return handle
+                evicted = self._make_room(self.expected_size(name), exclude=name)
+                loader = self._loaders[name]
+                max_replicas = self._replica_limits[name]
+            self._release_memory(evicted)
+
+            rss_before = current_rss_bytes()
+            start = time.perf_counter()
+            try:
+                model = loader()
+            except Exception as e:
+                sys.stderr.write(f"❌ [Model Manager] Loader for '{name}' raised: {e}\n")
+                model = None
+            elapsed = time.perf_counter() - start
+
+            with self._lock:
+                stats = self._stats[name]
+                if model is None:
+                    stats["load_failures"] += 1
+                    return None
+
+                # Parameter bytes are exact; the RSS delta is only a fallback because
+                # other threads may be allocating at the same time.
+                rss_delta = max(0, current_rss_bytes() - rss_before)
+                size = estimate_model_bytes(model) or max(rss_delta, self.expected_size(name))
+
+                handle = ModelHandle(
+                    name, loader, model, max_replicas,
+                    on_grow=self._handle_grew, reopen=lambda: self.get(name),
+                )
+                self._resident[name] = handle
+                self._sizes[name] = size
+                stats["loads"] += 1
+                stats["load_seconds_total"] += elapsed
+                stats["last_load_seconds"] = elapsed
+                tracing.record_model(name, cold=True)
+
+                # The estimate may have been low; shed others if we are now over budget.
+                evicted = self._make_room(0, exclude=name)
+            self._release_memory(evicted)
+            return handle
+
+    def _handle_grew(self, handle):
+        evicted = []
+        with self._lock:
+            if self._resident.get(handle.name) is handle:
+                evicted = self._make_room(0, exclude=handle.name)
+        self._release_memory(evicted)
+
+    def expected_size(self, name):
+        """
+        Best guess of a model's per-replica resident size: the last measured size, else the weights file size.
+        """
+        if name in self._sizes:
+            return self._sizes[name]
+        path = self._size_hints.get(name)
+        if path and os.path.exists(path):
+            return os.path.getsize(path)
+        return 0
+
+    def fingerprint(self, extra="", names=None):
+        """
+        Short hash identifying the current model weights (plus `extra`, e.g. a pipeline
+        version). Results computed under a different fingerprint are stale.
+        `names` limits the hash to those models. A model whose weights file does
+        not exist is identified by its registered identity, else as missing, so
+        the value does not depend on the working directory.
+        """
+        digest = hashlib.sha256(extra.encode("utf-8"))
+        with self._lock:
+            entries = sorted((name, path, self._identities.get(name)) for name, path in self._size_hints.items())
+        for name, path, identity in entries:
+            if names is not None and name not in names:
+                continue
+            digest.update(name.encode("utf-8"))
+            if path and os.path.exists(path):
+                digest.update(_file_digest(path))
+            else:
+                digest.update(f"\0{identity or 'missing'}".encode("utf-8"))
+        return digest.hexdigest()[:16]
+
+    def is_resident(self, name):
+        with self._lock:
+            return name in self._resident
+
+    def resident_bytes(self):
+        with self._lock:
+            return sum(
+                self._sizes.get(name, 0) * handle.replica_count()
+                for name, handle in self._resident.items()
+            )
+
+    # ------------------------------------------------------------------
+    # Eviction
+    # ------------------------------------------------------------------
+    def evict(self, name):
+        """
+        Drop a resident model. Returns True if something was evicted.
+        Threads that still hold a replica keep using it until they check it in.
+        """
+        with self._lock:
+            handle = self._evict_locked(name)
+        if handle is None:
+            return False
+        self._release_memory([handle])
+        return True
+
+    def _evict_locked(self, name):
+        """
+        Drop `name` from the resident set (the manager lock is held). Returns the
+        evicted handle, or None; the caller frees its memory after releasing the lock.
+        """
+        handle = self._resident.pop(name, None)
+        if handle is None:
+            return None
+        handle.release()
+        self._stats[name]["evictions"] += 1
+        sys.stderr.write(
+            f"♻️ [Model Manager] Evicted '{name}' ({self._sizes.get(name, 0) / MB:.1f} MB per replica)\n"
+        )
+        return handle
+
+    def _make_room(self, incoming_bytes, exclude=None):
+        """
+        Evicts least-recently-used models until `incoming_bytes` fit (the manager
+        lock is held). Returns the evicted handles for _release_memory.
+        """
+        evicted = []
+        if not self.budget_bytes:
+            return evicted
+        while self.resident_bytes() + incoming_bytes > self.budget_bytes:
+            victim = next(
+                (
+                    n for n, handle in self._resident.items()
+                    if n != exclude and n not in self.pinned and not handle.in_use()
+                ),
+                None
+            )
+            if victim is None:
+                sys.stderr.write(
+                    f"⚠️ [Model Manager] Budget {self.budget_bytes / MB:.0f} MB exceeded "
+                    f"but only pinned/in-use models remain resident.\n"
+                )
+                return evicted
+            evicted.append(self._evict_locked(victim))
+        return evicted
+
+    @staticmethod
+    def _release_memory(evicted):
+        """
+        Frees the memory of evicted handles. Called without the manager lock, so
+        a collection does not stall concurrent get() calls.
+        """
+        if not evicted:
+            return
+        del evicted[:]
+        gc.collect()
+        torch = sys.modules.get("torch")
+        if torch is not None:
+            try:
+                if torch.cuda.is_available():
+                    torch.cuda.empty_cache()
+            except Exception:
+                pass
+
+    # ------------------------------------------------------------------
+    # Reporting
+    # ------------------------------------------------------------------
+    def stats(self):
+        """
+        Snapshot of per-model counters plus the overall budget usage.
+        """
+        with self._lock:
+            models = {}
+            for name, counters in self._stats.items():
+                entry = dict(counters)
+                loads = entry["loads"]
+                entry["avg_load_seconds"] = entry["load_seconds_total"] / loads if loads else 0.0
+                handle = self._resident.get(name)
+                entry["resident"] = handle is not None
+                entry["replicas"] = handle.replica_count() if handle else 0
+                entry["max_replicas"] = self._replica_limits.get(name, 1)
+                entry["resident_mb"] = round(self._sizes.get(name, 0) * entry["replicas"] / MB, 2)
+                entry["pinned"] = name in self.pinned
+                models[name] = entry
+
+            return {
+                "budget_mb": round(self.budget_bytes / MB, 2),
+                "resident_mb": round(self.resident_bytes() / MB, 2),
+                "process_rss_mb": round(current_rss_bytes() / MB, 2),
+                "models": models,
+            }
@@ -0,0 +1,146 @@
+"""
+Reuses the result of a recent scan for a near-identical photo.
+
+Farmers often take several shots of the same leaf or trunk panel seconds
+apart; they differ only by recompression or a slight shift, so an exact
+image hash misses them. Each scan gets a 64-bit perceptual hash (DCT of the
+32x32 grayscale thumbnail, as in pHash). A scan whose hash is within
+RUBBERSENSE_NEAR_DUPLICATE_BITS (Hamming distance) of a recent scan with the
+same mode, sub mode and model fingerprint gets a copy of that scan's result
+instead of running the classifiers and analysis models again.
+
+Results carry "nearDuplicate": {"reused": false} when they were computed, or
+{"reused": true, "source": <image of the original scan>, "distance": N,
+"ageSeconds": S} when they were reused. Only complete, successful results are
+remembered, for at most RUBBERSENSE_NEAR_DUPLICATE_TTL_S seconds (default 300)
+and the last RUBBERSENSE_NEAR_DUPLICATE_RECENT scans (default 256) of this
+process, so it pays off in the persistent service (server.py). Unset
+RUBBERSENSE_NEAR_DUPLICATE_BITS disables it.
+"""
+import copy
+import os
+import threading
+import time
+from collections import deque
+
+import cv2
+import numpy as np
+
+import deadline
+import tracing
+
+HASH_SIZE = 8
+THUMBNAIL_SIZE = 32
+
+
+def perceptual_hash(img):
+    """
+    64-bit DCT hash of a BGR or grayscale image.
+    """
+    gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY) if img.ndim == 3 else img
+    thumbnail = cv2.resize(gray, (THUMBNAIL_SIZE, THUMBNAIL_SIZE), interpolation=cv2.INTER_AREA)
+    low = cv2.dct(np.float32(thumbnail))[:HASH_SIZE, :HASH_SIZE].flatten()
+    # The DC term only carries overall brightness; leave it out of the median.
+    bits = low > np.median(low[1:])
+    return int(sum(1 << i for i, bit in enumerate(bits) if bit))
+
+
+def hamming(a, b):
+    return bin(a ^ b).count("1")
+
+
+class RecentScans:
+    def __init__(self, max_bits, capacity=256, ttl=300.0):
+        self.max_bits = max(0, int(max_bits))
+        self.ttl = float(ttl)
+        self._entries = deque(maxlen=max(1, int(capacity)))
+        self._lock = threading.Lock()
+
+    def find(self, phash, key):
+        """
+        (entry, distance) of the closest recent scan under `key` within the
+        threshold, or (None, None).
+        """
+        now = time.monotonic()
+        best, best_distance = None, None
+        with self._lock:
+            for entry in self._entries:
+                if entry["key"] != key or now - entry["at"] > self.ttl:
+                    continue
+                distance = hamming(phash, entry["hash"])
+                if distance <= self.max_bits and (best is None or distance < best_distance):
+                    best, best_distance = entry, distance
+        return best, best_distance
+
+    def add(self, phash, key, source, result):
+        with self._lock:
+            self._entries.append({
+                "hash": phash, "key": key, "source": source,
+                "result": copy.deepcopy(result), "at": time.monotonic(),
+            })
+
+
+_RECENT = None
+_RECENT_LOCK = threading.Lock()
+
+
+def recent_scans():
+    """
+    The process-wide RecentScans, or None when near-duplicate reuse is off.
+    """
+    global _RECENT
+    raw = os.environ.get("RUBBERSENSE_NEAR_DUPLICATE_BITS")
+    if raw in (None, ""):
+        return None
+    with _RECENT_LOCK:
+        if _RECENT is None:
+            _RECENT = RecentScans(
+                int(raw),
+                int(os.environ.get("RUBBERSENSE_NEAR_DUPLICATE_RECENT", "") or 256),
+                float(os.environ.get("RUBBERSENSE_NEAR_DUPLICATE_TTL_S", "") or 300),
+            )
+        return _RECENT
+
+
+def reset():
+    global _RECENT
+    with _RECENT_LOCK:
+        _RECENT = None
+
+
+def lookup(img, key):
+    """
+    Returns (phash, reused result or None). phash is None when reuse is off.
+    """
+    recent = recent_scans()
+    if recent is None or img is None:
+        return None, None
+    with tracing.stage("near_duplicate.hash"):
+        phash = perceptual_hash(img)
+    entry, distance = recent.find(phash, key)
+    tracing.record_cache("near_duplicate", entry is not None)
+    if entry is None:
+        return phash, None
+    result = copy.deepcopy(entry["result"])
+    result["nearDuplicate"] = {
+        "reused": True,
+        "source": entry["source"],
+        "distance": distance,
+        "ageSeconds": round(time.monotonic() - entry["at"], 1),
+    }
+    return phash, result
+
+
+def remember(phash, key, source, result):
+    """
+    Records a freshly computed result for later near duplicates and marks it
+    as not reused. Failed and deadline-shortened results are not recorded.
+    """
+    recent = recent_scans()
+    if recent is None or phash is None or not isinstance(result, dict):
+        return result
+    active = deadline.current()
+    if not result.get("error") and not (active is not None and active.skipped):
+        recent.add(phash, key, source, result)
+    result["nearDuplicate"] = {"reused": False}
+    return result
@@ -0,0 +1,28 @@
+def percentile(values, pct):
+    """
+    Linear-interpolated percentile of `values` (pct in 0-100). Returns 0.0 for no values.
+    """
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    if len(ordered) == 1:
+        return float(ordered[0])
+    rank = (len(ordered) - 1) * (pct / 100.0)
+    low = int(rank)
+    high = min(low + 1, len(ordered) - 1)
+    return float(ordered[low] + (ordered[high] - ordered[low]) * (rank - low))
+
+
+def summarize_latencies(values_ms):
+    """
+    p50/p95/p99/mean/max summary of a list of latencies in milliseconds.
+    """
+    count = len(values_ms)
+    return {
+        "count": count,
+        "mean": round(sum(values_ms) / count, 2) if count else 0.0,
+        "p50": round(percentile(values_ms, 50), 2),
+        "p95": round(percentile(values_ms, 95), 2),
+        "p99": round(percentile(values_ms, 99), 2),
+        "max": round(max(values_ms), 2) if count else 0.0,
+    }
@@ -0,0 +1,207 @@
+"""
+On-demand CPU and memory profiling of single analyses.
+
+Enable it per request (`main.py ... --profile`, `"profile": true` on a service
+request) or process-wide with RUBBERSENSE_PROFILE=1. RUBBERSENSE_PROFILE_SAMPLE_RATE
+(0..1, default 1.0 when enabled) profiles only that fraction of requests, so it
+can stay on in production; a per-request flag always profiles.
+
+A profiled request writes two files to RUBBERSENSE_PROFILE_DIR (default: a
+`profiles` folder in the annotated-image output directory):
+  <stem>.prof  cProfile data (pstats, snakeviz)
+  <stem>.txt   functions by cumulative and self time, tracemalloc peak and the
+               largest allocation sites still live when the request finished
+and its response gains a "profile" object with the paths and headline numbers.
+
+cProfile and tracemalloc are process-wide, so one request is profiled at a
+time; a request sampled while another is being profiled runs unprofiled.
+cProfile only sees the thread that enabled it, so a profiled request runs its
+stage graphs inline (stages.inline()) rather than on the shared stage pool.
+tracemalloc also counts allocations made by other threads during the request.
+"""
+import cProfile
+import io
+import os
+import pstats
+import random
+import re
+import threading
+import time
+import tracemalloc
+import uuid
+from contextlib import contextmanager
+
+import stages
+
+TOP_N = 10
+
+_ACTIVE = threading.Lock()
+
+
+def sample_rate():
+    raw = os.environ.get("RUBBERSENSE_PROFILE_SAMPLE_RATE")
+    if raw not in (None, ""):
+        try:
+            return min(1.0, max(0.0, float(raw)))
+        except ValueError:
+            pass
+    return 1.0 if os.environ.get("RUBBERSENSE_PROFILE") == "1" else 0.0
+
+
+def should_profile(force=False):
+    if force:
+        return True
+    rate = sample_rate()
+    return rate >= 1.0 or (rate > 0 and random.random() < rate)
+
+
+def profile_dir():
+    directory = os.environ.get("RUBBERSENSE_PROFILE_DIR")
+    if not directory:
+        import main as ai
+        directory = os.path.join(ai.processed_output_dir(), 'profiles')
+    os.makedirs(directory, exist_ok=True)
+    return directory
+
+
+def _function_name(key):
+    filename, line, name = key
+    if filename == '~':
+        return name  # builtins, e.g. "<method 'copy' of 'numpy.ndarray' objects>"
+    return f"{os.path.basename(filename)}:{line}({name})"
+
+
+class ProfileRun:
+    def __init__(self, label):
+        self.label = label
+        self.summary = None
+        self._profiler = cProfile.Profile()
+        self._started_tracemalloc = False
+
+    def start(self):
+        self._started_tracemalloc = not tracemalloc.is_tracing()
+        if self._started_tracemalloc:
+            tracemalloc.start()
+        else:
+            tracemalloc.reset_peak()
+        self._baseline = tracemalloc.get_traced_memory()[0]
+        self._wall = time.perf_counter()
+        try:
+            self._profiler.enable()
+        except ValueError:
+            # Another profiler (e.g. a coverage tool) owns the hook.
+            self._stop_tracemalloc()
+            raise
+
+    def _stop_tracemalloc(self):
+        if self._started_tracemalloc:
+            tracemalloc.stop()
+
+    def stop(self):
+        self._profiler.disable()
+        wall_ms = (time.perf_counter() - self._wall) * 1000
+        peak = tracemalloc.get_traced_memory()[1]
+        snapshot = tracemalloc.take_snapshot().filter_traces([
+            tracemalloc.Filter(False, tracemalloc.__file__),
+            tracemalloc.Filter(False, "<frozen importlib._bootstrap*>"),
+        ])
+        self._stop_tracemalloc()
+        try:
+            self.summary = self._write(wall_ms, max(0, peak - self._baseline), snapshot)
+        except OSError as e:
+            self.summary = {"error": f"Profile not written: {e}"}
+        return self.summary
+
+    def _write(self, wall_ms, peak_bytes, snapshot):
+        stem = "{}_{}_{}".format(
+            time.strftime("%Y%m%d-%H%M%S"),
+            re.sub(r'[^A-Za-z0-9_.-]+', '_', self.label)[:40] or 'request',
+            uuid.uuid4().hex[:8],
+        )
+        directory = profile_dir()
+        prof_path = os.path.join(directory, stem + ".prof")
+        text_path = os.path.join(directory, stem + ".txt")
+        self._profiler.dump_stats(prof_path)
+
+        stats = pstats.Stats(self._profiler)
+        by_self = sorted(stats.stats.items(), key=lambda item: item[1][2], reverse=True)[:TOP_N]
+        top_functions = [
+            {
+                "function": _function_name(key),
+                "calls": calls,
+                "self_ms": round(self_time * 1000, 3),
+                "cumulative_ms": round(cumulative * 1000, 3),
+            }
+            for key, (_, calls, self_time, cumulative, _) in by_self
+        ]
+        top_allocations = [
+            {
+                "site": f"{os.path.basename(stat.traceback[0].filename)}:{stat.traceback[0].lineno}",
+                "size_kb": round(stat.size / 1024, 1),
+                "blocks": stat.count,
+            }
+            for stat in snapshot.statistics('lineno')[:TOP_N]
+        ]
+
+        report = io.StringIO()
+        report.write(f"Request: {self.label}\nWall: {wall_ms:.1f} ms\n")
+        report.write(f"tracemalloc peak above start: {peak_bytes / 1024 / 1024:.2f} MB\n\n")
+        report.write("Largest allocation sites still live at the end of the request:\n")
+        for entry in top_allocations:
+            report.write(f"  {entry['size_kb']:>10.1f} KB  {entry['blocks']:>7} blocks  {entry['site']}\n")
+        report.write("\nTop functions by self time:\n")
+        for entry in top_functions:
+            report.write(
+                f"  {entry['self_ms']:>10.3f} ms self  {entry['cumulative_ms']:>10.3f} ms cum  "
+                f"{entry['calls']:>7} calls  {entry['function']}\n"
+            )
+        report.write("\n")
+        stats.stream = report
+        stats.sort_stats('cumulative').print_stats(30)
+        with open(text_path, 'w') as f:
+            f.write(report.getvalue())
+
+        return {
+            "profile": prof_path,
+            "summary": text_path,
+            "wall_ms": round(wall_ms, 3),
+            "peak_alloc_mb": round(peak_bytes / 1024 / 1024, 3),
+            "top_functions": top_functions[:5],
+            "top_allocations": top_allocations[:5],
+        }
+
+
+@contextmanager
+def profiled(label, force=False):
+    """
+    Profile the block if requested or sampled. Yields the ProfileRun (or None);
+    its `summary` is filled in when the block exits.
+    """
+    if not should_profile(force) or not _ACTIVE.acquire(blocking=False):
+        yield None
+        return
+    run = ProfileRun(label)
+    try:
+        try:
+            run.start()
+        except ValueError:
+            run = None
+        if run is None:
+            yield None
+            return
+        try:
+            with stages.inline():
+                yield run
+        finally:
+            run.stop()
+    finally:
+        _ACTIVE.release()
+
+
+def attach(result, run):
+    """
+    Adds the profile summary to a dict response (no-op when the request was not profiled).
+    """
+    if run is not None and run.summary is not None and isinstance(result, dict):
+        result["profile"] = run.summary
+    return result
@@ -0,0 +1,106 @@
+"""
+Pre-inference photo quality gate.
+
+Blurry, dark or tiny photos still went through the classifiers, masking and
+the LLM, and came back with a confident-looking but meaningless result. The
+gate measures the photo on a copy downscaled to at most ANALYSIS_SIDE pixels
+(a few milliseconds) and rejects it before any model runs:
+  too_small    shorter side below min_side pixels
+  too_dark     mean brightness below min_brightness
+  overexposed  more than max_clipped of the pixels blown out to white
+  blurry       variance of the Laplacian below min_sharpness (tree mode only:
+               a latex close-up is legitimately smooth)
+The rejection is a normal error response with "code": "retake_photo", the
+reason and the measurements, so the app can ask for another shot.
+
+RUBBERSENSE_QUALITY_GATE=0 disables the gate; thresholds can be changed with
+RUBBERSENSE_QUALITY_<NAME> (e.g. RUBBERSENSE_QUALITY_MIN_SHARPNESS=30).
+"""
+import os
+
+import cv2
+
+import tracing
+
+ANALYSIS_SIDE = 512
+
+THRESHOLDS = {
+    "min_side": 128,
+    "min_brightness": 25.0,
+    "max_clipped": 0.9,
+    "min_sharpness": 15.0,
+}
+
+MESSAGES = {
+    "too_small": "Photo resolution is too low. Please retake the photo closer to the subject.",
+    "too_dark": "Photo is too dark. Please retake the photo in better light.",
+    "overexposed": "Photo is overexposed. Please retake the photo out of direct glare.",
+    "blurry": "Photo is too blurry. Please hold the camera steady and retake the photo.",
+}
+
+
+def enabled():
+    return os.environ.get("RUBBERSENSE_QUALITY_GATE", "1") != "0"
+
+
+def threshold(name):
+    raw = os.environ.get(f"RUBBERSENSE_QUALITY_{name.upper()}")
+    if raw not in (None, ""):
+        try:
+            return float(raw)
+        except ValueError:
+            pass
+    return THRESHOLDS[name]
+
+
+def measure(img):
+    """
+    Resolution, brightness, clipped fraction and sharpness of a BGR image.
+    """
+    height, width = img.shape[:2]
+    scale = ANALYSIS_SIDE / max(height, width)
+    small = cv2.resize(img, (max(1, round(width * scale)), max(1, round(height * scale))),
+                       interpolation=cv2.INTER_AREA) if scale < 1 else img
+    gray = cv2.cvtColor(small, cv2.COLOR_BGR2GRAY) if small.ndim == 3 else small
+    return {
+        "width": int(width),
+        "height": int(height),
+        "brightness": round(float(gray.mean()), 1),
+        "clipped": round(float((gray >= 250).mean()), 3),
+        "sharpness": round(float(cv2.Laplacian(gray, cv2.CV_64F).var()), 1),
+    }
+
+
+def problem(measurements, mode):
+    """
+    The first reason the photo cannot be analyzed, or None.
+    """
+    if min(measurements["width"], measurements["height"]) < threshold("min_side"):
+        return "too_small"
+    if measurements["brightness"] < threshold("min_brightness"):
+        return "too_dark"
+    if measurements["clipped"] > threshold("max_clipped"):
+        return "overexposed"
+    if mode == "tree" and measurements["sharpness"] < threshold("min_sharpness"):
+        return "blurry"
+    return None
+
+
+@tracing.traced("quality_gate")
+def check(img, mode):
+    """
+    None when the photo is good enough for `mode`, else the retake-photo error response.
+    """
+    if not enabled() or img is None:
+        return None
+    measurements = measure(img)
+    reason = problem(measurements, mode)
+    if reason is None:
+        return None
+    tracing.record_fallback(f"quality_gate.{reason}")
+    return {
+        "error": MESSAGES[reason],
+        "code": "retake_photo",
+        "reason": reason,
+        "quality": measurements,
+    }
@@ -0,0 +1,362 @@
+"""
+Bulk re-analysis of stored scans after a model update.
+
+Usage:
+  python main.py reanalyze <scans.jsonl | scans.csv> [--out reanalysis.jsonl] [options]
+
+Input rows carry a scan id and image URL, optionally the mode/sub mode and the
+fingerprint of the model that produced the cached result:
+  {"scanId": "6996af89...", "imageUrl": "https://...", "mode": "tree", "subMode": "leaf", "modelFingerprint": "..."}
+CSV files use the same column names.
+
+Scans are fanned out over a process pool whose workers preload the models
+once. Every finished scan is appended to the output (JSON lines, one document
+per scan, ready for `mongoimport`) and its id to `<out>.checkpoint`, so an
+interrupted run resumes where it stopped. Scans whose cached fingerprint
+already matches the current one are skipped. Failures (load and analysis
+errors as in batch.py, and service requests that failed or stayed busy) go to
+`<out>.errors.jsonl` and are retried on the next run. Rejections (e.g. a
+retake_photo quality verdict or a wrong scanned part) are final results: they
+are written to the output and checkpointed like any other.
+
+With --service-url the scans are POSTed to a running `main.py serve` instead,
+marked "priority": "reanalysis" so the service keeps them behind interactive
+scans (see admission.py). Busy responses are retried after the service's
+retryAfterMs.
+
+With --feature-cache DIR (RUBBERSENSE_FEATURE_CACHE_DIR) the intermediate
+features of each scan are reused where their models and code are unchanged
+(see feature_cache.py), so a run that only refreshes insights skips the vision
+stages.
+"""
+import argparse
+import csv
+import json
+import multiprocessing
+import os
+import sys
+import time
+import urllib.error
+import urllib.request
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, FIRST_COMPLETED, wait
+from concurrent.futures.process import BrokenProcessPool
+from datetime import datetime, timezone
+
+import profiling
+from perf_stats import summarize_latencies
+
+ID_KEYS = ('scanId', 'scan_id', '_id', 'id')
+URL_KEYS = ('imageUrl', 'image_url', 'url', 'path')
+SUB_MODE_KEYS = ('subMode', 'sub_mode', 'scanSubtype')
+FINGERPRINT_KEYS = ('modelFingerprint', 'model_fingerprint')
+
+MAX_ATTEMPTS = 2
+# Give up on a scan the service keeps turning away after this long.
+MAX_BUSY_SECONDS = 600
+# Errors of --service-url runs worth retrying, besides batch.RETRYABLE_ERRORS.
+SERVICE_ERRORS = ("Service request failed", "HTTP ")
+
+
+def _first(row, keys, default=''):
+    for key in keys:
+        value = row.get(key)
+        if value not in (None, ''):
+            return value
+    return default
+
+
+def load_scans(path, default_mode='tree'):
+    """
+    Read scan rows from a JSON-lines or CSV file.
+    """
+    if path.lower().endswith('.csv'):
+        with open(path, newline='') as f:
+            rows = list(csv.DictReader(f))
+    else:
+        rows = []
+        with open(path) as f:
+            for line_no, line in enumerate(f, 1):
+                if not line.strip():
+                    continue
+                try:
+                    rows.append(json.loads(line))
+                except json.JSONDecodeError as e:
+                    sys.stderr.write(f"⚠️ [Reanalyze] Skipping line {line_no}: {e}\n")
+
+    scans = []
+    for row in rows:
+        scan_id = str(_first(row, ID_KEYS))
+        url = _first(row, URL_KEYS)
+        if not scan_id or not url:
+            sys.stderr.write(f"⚠️ [Reanalyze] Row without scan id or image url: {row}\n")
+            continue
+        scans.append({
+            'scanId': scan_id,
+            'imageUrl': url,
+            'mode': _first(row, ('mode',), default_mode),
+            'subMode': str(_first(row, SUB_MODE_KEYS)).strip().lower(),
+            'modelFingerprint': _first(row, FINGERPRINT_KEYS),
+        })
+    return scans
+
+
+def load_checkpoint(path):
+    if not os.path.exists(path):
+        return set()
+    with open(path) as f:
+        return {line.strip() for line in f if line.strip()}
+
+
+# ----------------------------------------------------------------------
+# Worker process
+# ----------------------------------------------------------------------
+_WORKER = {}
+
+
+def _worker_init(preload, threads_per_worker):
+    # Keep each worker from spawning a thread per core; the pool provides the parallelism.
+    import cv2
+    cv2.setNumThreads(threads_per_worker)
+    try:
+        import torch
+        torch.set_num_threads(threads_per_worker)
+    except Exception:
+        pass
+
+    import main as ai
+    for name in preload:
+        ai.MODEL_MANAGER.get(name)
+    _WORKER['ai'] = ai
+
+
+def _reanalyze_one(scan):
+    ai = _WORKER['ai']
+    start = time.perf_counter()
+    try:
+        with profiling.profiled(scan['mode']) as profile:
+            result = ai.analyze_request(scan['mode'], scan['imageUrl'], scan['subMode'])
+        profiling.attach(result, profile)
+    except Exception as e:
+        result = {"error": f"Analysis failed: {e}"}
+    return scan, result, (time.perf_counter() - start) * 1000
+
+
+# ----------------------------------------------------------------------
+# Service client
+# ----------------------------------------------------------------------
+def _post_json(url, payload, timeout):
+    request = urllib.request.Request(
+        url, data=json.dumps(payload).encode('utf-8'), headers={"Content-Type": "application/json"},
+    )
+    try:
+        with urllib.request.urlopen(request, timeout=timeout) as response:
+            return json.loads(response.read())
+    except urllib.error.HTTPError as e:
+        # Error bodies (400, 503 busy) are JSON too.
+        try:
+            return json.loads(e.read())
+        except ValueError:
+            return {"error": f"HTTP {e.code}"}
+
+
+def _reanalyze_remote(service_url, scan, timeout=300):
+    start = time.perf_counter()
+    payload = {
+        "imageUrl": scan['imageUrl'],
+        "mode": scan['mode'],
+        "subMode": scan['subMode'],
+        "priority": "reanalysis",
+    }
+    give_up = time.monotonic() + MAX_BUSY_SECONDS
+    try:
+        while True:
+            result = _post_json(service_url.rstrip('/') + "/analyze", payload, timeout)
+            if not (isinstance(result, dict) and result.get('code') == 'busy') or time.monotonic() >= give_up:
+                break
+            time.sleep(max(0.1, result.get('retryAfterMs', 1000) / 1000.0))
+    except (urllib.error.URLError, OSError, ValueError) as e:
+        result = {"error": f"Service request failed: {e}"}
+    return scan, result, (time.perf_counter() - start) * 1000
+
+
+def retryable(result):
+    """
+    Whether a result is a failed attempt rather than a final (possibly rejected) result.
+    """
+    import batch
+    if batch.retryable(result):
+        return True
+    error = result.get('error') if isinstance(result, dict) else None
+    return isinstance(error, str) and (result.get('code') == 'busy' or error.startswith(SERVICE_ERRORS))
+
+
+def _preload_for(scans):
+    names = {'cls'}
+    for scan in scans:
+        if scan['mode'] == 'latex':
+            names.add('latex')
+        else:
+            names.update(['leaf', 'trunk'])
+    return sorted(names)
+
+
+# ----------------------------------------------------------------------
+# Driver
+# ----------------------------------------------------------------------
+def run_reanalysis(argv):
+    parser = argparse.ArgumentParser(prog="main.py reanalyze", description="Re-score stored scans with the current models")
+    parser.add_argument("scans", help="JSON-lines or CSV file with scanId and imageUrl columns")
+    parser.add_argument("--out", default="reanalysis.jsonl", help="JSON-lines results for bulk import")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="Worker processes (default: all cores)")
+    parser.add_argument("--threads-per-worker", type=int, default=1, help="Torch/OpenCV threads per worker")
+    parser.add_argument("--mode", default="tree", choices=["tree", "latex"], help="Mode for rows without one")
+    parser.add_argument("--max-tasks-per-child", type=int, default=500,
+                        help="Recycle workers after this many scans to bound memory growth (Python 3.11+)")
+    parser.add_argument("--force", action="store_true", help="Re-score scans even if their fingerprint is current")
+    parser.add_argument("--service-url", default=None,
+                        help="Send scans to a running service (main.py serve) at reanalysis priority; "
+                             "--workers is then the number of requests in flight")
+    parser.add_argument("--feature-cache", default=None, metavar="DIR",
+                        help="Reuse cached intermediate features from DIR (default: RUBBERSENSE_FEATURE_CACHE_DIR)")
+    args = parser.parse_args(argv)
+    if args.feature_cache:
+        # Inherited by the spawned workers.
+        os.environ['RUBBERSENSE_FEATURE_CACHE_DIR'] = args.feature_cache
+
+    import main as ai
+    fingerprint = ai.model_fingerprint()
+    checkpoint_path = args.out + ".checkpoint"
+    errors_path = args.out + ".errors.jsonl"
+
+    scans = load_scans(args.scans, args.mode)
+    done = load_checkpoint(checkpoint_path)
+    pending = []
+    skipped_current = 0
+    for scan in scans:
+        if scan['scanId'] in done:
+            continue
+        if not args.force and scan['modelFingerprint'] == fingerprint:
+            skipped_current += 1
+            continue
+        pending.append(scan)
+
+    sys.stderr.write(
+        f"ℹ️ [Reanalyze] fingerprint={fingerprint} scans={len(scans)} checkpointed={len(done)} "
+        f"current={skipped_current} pending={len(pending)} workers={args.workers}\n"
+    )
+
+    workers = max(1, args.workers)
+    # Inherited by the spawned workers before they import torch.
+    os.environ.setdefault('OMP_NUM_THREADS', str(max(1, args.threads_per_worker)))
+    pool_kwargs = {
+        'max_workers': workers,
+        # spawn: forking a parent that already imported torch/OpenCV thread pools is unsafe.
+        'mp_context': multiprocessing.get_context('spawn'),
+        'initializer': _worker_init,
+        'initargs': (_preload_for(pending), max(1, args.threads_per_worker)),
+    }
+    if sys.version_info >= (3, 11) and args.max_tasks_per_child > 0:
+        pool_kwargs['max_tasks_per_child'] = args.max_tasks_per_child
+    if args.service_url:
+        make_pool = lambda: ThreadPoolExecutor(max_workers=workers, thread_name_prefix="reanalyze")
+        task = lambda scan: _reanalyze_remote(args.service_url, scan)
+    else:
+        make_pool = lambda: ProcessPoolExecutor(**pool_kwargs)
+        task = _reanalyze_one
+
+    queue = list(reversed(pending))
+    attempts = {}
+    latencies = []
+    succeeded = 0
+    rejected = 0
+    failed = 0
+    start = time.perf_counter()
+    last_report = start
+
+    with open(args.out, 'a') as out, open(checkpoint_path, 'a') as ckpt, open(errors_path, 'a') as errors:
+        while queue:
+            in_flight = {}
+            pool = make_pool()
+            try:
+                while queue or in_flight:
+                    # Keep a bounded number of scans in flight so memory stays flat on huge inputs.
+                    while queue and len(in_flight) < workers * 2:
+                        scan = queue.pop()
+                        attempts[scan['scanId']] = attempts.get(scan['scanId'], 0) + 1
+                        in_flight[pool.submit(task, scan)] = scan
+
+                    finished, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+                    for future in finished:
+                        scan = in_flight[future]
+                        # Raises BrokenProcessPool while the scan is still in flight, so it is requeued.
+                        _, result, latency_ms = future.result()
+                        del in_flight[future]
+                        latencies.append(latency_ms)
+
+                        if retryable(result):
+                            failed += 1
+                            errors.write(json.dumps({'scanId': scan['scanId'], 'imageUrl': scan['imageUrl'], 'error': result['error']}) + "\n")
+                            errors.flush()
+                            continue
+
+                        succeeded += 1
+                        if isinstance(result, dict) and result.get('error'):
+                            rejected += 1
+                        out.write(json.dumps({
+                            'scanId': scan['scanId'],
+                            'mode': scan['mode'],
+                            'subMode': scan['subMode'],
+                            'imageUrl': scan['imageUrl'],
+                            'modelFingerprint': fingerprint,
+                            'analyzedAt': datetime.now(timezone.utc).isoformat(),
+                            'result': result,
+                        }) + "\n")
+                        out.flush()
+                        # Checkpoint only after the result line is on disk.
+                        ckpt.write(scan['scanId'] + "\n")
+                        ckpt.flush()
+
+                    now = time.perf_counter()
+                    if now - last_report >= 30:
+                        last_report = now
+                        rate = (succeeded + failed) / (now - start)
+                        remaining = len(queue) + len(in_flight)
+                        eta = remaining / rate if rate > 0 else 0
+                        sys.stderr.write(
+                            f"📦 [Reanalyze] {succeeded} ok, {failed} failed, {remaining} left, "
+                            f"{rate:.2f} scans/s, ETA {eta / 60:.1f} min\n"
+                        )
+                pool.shutdown()
+            except BrokenProcessPool as e:
+                # A worker died (e.g. OOM-killed). Requeue what it was holding and start a fresh pool.
+                sys.stderr.write(f"⚠️ [Reanalyze] Worker pool broke ({e}); restarting.\n")
+                pool.shutdown(wait=False, cancel_futures=True)
+                for scan in in_flight.values():
+                    if attempts[scan['scanId']] < MAX_ATTEMPTS:
+                        queue.append(scan)
+                    else:
+                        failed += 1
+                        errors.write(json.dumps({'scanId': scan['scanId'], 'imageUrl': scan['imageUrl'], 'error': 'Worker crashed'}) + "\n")
+                        errors.flush()
+
+    wall_seconds = time.perf_counter() - start
+    summary = {
+        "fingerprint": fingerprint,
+        "total": len(scans),
+        "skipped_checkpoint": len([s for s in scans if s['scanId'] in done]),
+        "skipped_current": skipped_current,
+        "succeeded": succeeded,
+        "rejected": rejected,
+        "failed": failed,
+        "wall_seconds": round(wall_seconds, 3),
+        "throughput_per_second": round((succeeded + failed) / wall_seconds, 3) if wall_seconds > 0 else 0.0,
+        "latency_ms": summarize_latencies(latencies),
+        "output": os.path.abspath(args.out),
+        "errors": os.path.abspath(errors_path),
+    }
+    print(json.dumps(summary))
+    return 0 if failed == 0 else 1
+
+
+if __name__ == "__main__":
+    sys.exit(run_reanalysis(sys.argv[1:]))
@@ -0,0 +1,317 @@
+"""
+Persistent inference worker.
+
+Usage:
+  python main.py serve [--host 127.0.0.1] [--port 8765] [--workers 4] [--max-queue 32]
+                       [--max-queue-wait-ms 30000] [--metrics-file PATH]
+
+Keeps the models loaded across requests instead of paying the interpreter and
+weight load on every scan. Endpoints:
+  POST /analyze         {"imageUrl": "...", "mode": "tree" | "latex", "subMode": "leaf",
+                         "timings": false, "profile": false, "deadline": <epoch ms>,
+                         "priority": "interactive" | "reanalysis" | "batch"}
+  POST /ai_suggestions  one detection object or an array of them (same as `main.py ai_suggestions`)
+  GET  /metrics         Prometheus text format (see metrics.py)
+  GET  /healthz
+
+Responses are the same JSON documents main.py prints; analysis failures are
+reported as {"error": ...} with HTTP 200, malformed requests with HTTP 400.
+When the worker slots and the queue are full (or the queue wait runs out)
+the request is rejected at once with HTTP 503, a Retry-After header and
+  {"error": "Service busy, retry later", "code": "busy", "reason": "queue_full" | "queue_timeout",
+   "retryAfterMs": N, "queueDepth": N}
+
+An /analyze request identical to one already running (same image, mode, sub
+mode, response options, priority and model versions) does not run again: it
+waits for the running one and gets a copy of its result. It only joins when
+its deadline is no earlier than the running request's (no deadline counts as
+the latest), so waiting never outlasts its own deadline; and when the shared
+result came back partial under the earlier deadline, it runs the analysis
+again under its own. Coalesced requests are counted in
+rubbersense_coalesced_requests_total and /healthz.
+"""
+import argparse
+import json
+import os
+import sys
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import admission
+import deadline
+import knowledge_base
+import metrics
+import profiling
+import tracing
+from single_flight import SingleFlight
+
+
+class InferenceService:
+    """
+    Runs analyses on at most `workers` threads at a time; up to `max_queue`
+    more wait in line for at most `max_queue_wait_ms`, served by priority class
+    (see admission.py). Every request is traced so its stages feed the metrics.
+    """
+
+    def __init__(self, workers=None, max_queue=None, max_queue_wait_ms=None, priority_caps=None, starvation_ms=None):
+        import main as ai
+        self.ai = ai
+        if workers is None:
+            workers = int(os.environ.get("RUBBERSENSE_SERVICE_WORKERS", "4") or 4)
+        self.workers = max(1, workers)
+        if max_queue is None:
+            max_queue = int(os.environ.get("RUBBERSENSE_SERVICE_MAX_QUEUE", "") or self.workers * 8)
+        if max_queue_wait_ms is None:
+            max_queue_wait_ms = float(os.environ.get("RUBBERSENSE_SERVICE_MAX_QUEUE_WAIT_MS", "") or 30000)
+        if priority_caps is None:
+            priority_caps = parse_priority_caps(os.environ.get("RUBBERSENSE_SERVICE_PRIORITY_CAPS", ""))
+        if starvation_ms is None:
+            starvation_ms = float(os.environ.get("RUBBERSENSE_SERVICE_STARVATION_MS", "") or 10000)
+        self.admission = admission.AdmissionController(
+            self.workers, max_queue, max_queue_wait_ms / 1000.0, priority_caps, starvation_ms / 1000.0,
+        )
+        self.flights = SingleFlight()
+
+    def queue_depth(self):
+        return self.admission.queue_depth()
+
+    def run(self, mode, fn, want_timings=False, want_profile=False, deadline_ms=None,
+            priority=admission.DEFAULT_PRIORITY):
+        # A request never waits in line past its own deadline.
+        max_wait = None if deadline_ms is None else deadline_ms / 1000.0 - time.time()
+        try:
+            self.admission.acquire(max_wait, priority)
+        except admission.Busy as busy:
+            sys.stderr.write(f"⚠️ [Service] Rejected {mode} request: {busy}\n")
+            metrics.REJECTED.inc(mode=metrics.mode_label(mode), reason=busy.reason)
+            metrics.REQUESTS.inc(mode=metrics.mode_label(mode), outcome='rejected')
+            return busy.to_response()
+        metrics.IN_FLIGHT.inc()
+        start = time.perf_counter()
+        trace = None
+        try:
+            with profiling.profiled(mode, bool(want_profile)) as profile, tracing.trace() as trace, \
+                    deadline.scope(deadline_ms) as request_deadline:
+                try:
+                    result = fn()
+                except Exception as e:
+                    sys.stderr.write(f"❌ [Service] {mode} request failed: {e}\n")
+                    result = {"error": f"Analysis failed: {e}"}
+            result = deadline.attach(result, request_deadline)
+        finally:
+            self.admission.release(time.perf_counter() - start, priority)
+            metrics.IN_FLIGHT.dec()
+        metrics.observe_request(mode, result, trace, time.perf_counter() - start)
+        if want_timings or tracing.timings_requested():
+            self.ai.attach_timings(result, trace)
+        return profiling.attach(result, profile)
+
+    def analyze(self, payload):
+        mode = payload.get('mode', 'tree')
+        image_url = payload.get('imageUrl') or payload.get('image_url')
+        if not image_url:
+            return None
+        sub_mode = payload.get('subMode', payload.get('sub_mode', '')) or ''
+        priority = request_priority(payload)
+        deadline_ms = deadline.parse(payload.get('deadline'))
+        key = (
+            mode, sub_mode.strip().lower(), image_key(image_url), priority,
+            bool(payload.get('timings')), bool(payload.get('profile')), self.ai.model_fingerprint(),
+        )
+        run = lambda: self.run(
+            mode,
+            lambda: self.ai.analyze_request(mode, image_url, sub_mode),
+            payload.get('timings'),
+            payload.get('profile'),
+            deadline_ms,
+            priority,
+        )
+        result, shared = self.flights.do(
+            key, run, tag=deadline_ms, joins=lambda leader_ms: deadline_no_earlier(deadline_ms, leader_ms),
+        )
+        if shared:
+            metrics.COALESCED.inc(mode=metrics.mode_label(mode))
+            if isinstance(result, dict) and result.get("partial"):
+                # Cut short by the running request's earlier deadline, not ours.
+                result = run()
+        return result
+
+    def ai_suggestions(self, payload):
+        if isinstance(payload, list):
+            fn = lambda: self.ai.generate_ai_suggestions_batch(payload)
+        else:
+            fn = lambda: self.ai.generate_ai_suggestions(payload)
+        return self.run('ai_suggestions', fn, priority=request_priority(payload))
+
+
+def image_key(image_url):
+    """
+    Identity of the image behind `image_url`: local files also by size and
+    modification time, so a rewritten file is not coalesced with the old one.
+    """
+    if os.path.isfile(image_url):
+        stat = os.stat(image_url)
+        return os.path.abspath(image_url), stat.st_size, stat.st_mtime_ns
+    return image_url
+
+
+def deadline_no_earlier(deadline_ms, leader_ms):
+    """
+    Whether a request with `deadline_ms` may share the result of one running
+    under `leader_ms` (None: no deadline).
+    """
+    if deadline_ms is None:
+        return True
+    return leader_ms is not None and deadline_ms >= leader_ms
+
+
+def request_priority(payload):
+    """
+    Priority class of a request body. Raises ValueError for an unknown class.
+    """
+    priority = payload.get('priority') if isinstance(payload, dict) else None
+    priority = str(priority or admission.DEFAULT_PRIORITY).strip().lower()
+    if priority not in admission.PRIORITIES:
+        raise ValueError(f"Unknown priority: {priority} (expected one of {', '.join(admission.PRIORITIES)})")
+    return priority
+
+
+def parse_priority_caps(text):
+    """
+    "reanalysis=2,batch=1" -> {"reanalysis": 2, "batch": 1}.
+    """
+    caps = {}
+    for part in filter(None, (p.strip() for p in (text or '').split(','))):
+        name, _, value = part.partition('=')
+        if name.strip() not in admission.PRIORITIES:
+            raise ValueError(f"Unknown priority in caps: {name.strip()}")
+        caps[name.strip()] = int(value)
+    return caps
+
+
+def make_handler(service):
+    class Handler(BaseHTTPRequestHandler):
+        def _send(self, status, body, content_type="application/json", headers=()):
+            data = body.encode('utf-8')
+            self.send_response(status)
+            for name, value in headers:
+                self.send_header(name, value)
+            self.send_header("Content-Type", content_type)
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def _send_json(self, status, payload):
+            self._send(status, json.dumps(payload))
+
+        def _send_result(self, result):
+            if isinstance(result, dict) and result.get("code") == "busy":
+                retry_after = str(max(1, -(-result["retryAfterMs"] // 1000)))
+                self._send(503, json.dumps(result), headers=[("Retry-After", retry_after)])
+            else:
+                self._send_json(200, result)
+
+        def _read_json(self):
+            length = int(self.headers.get("Content-Length") or 0)
+            raw = self.rfile.read(length) if length else b""
+            return json.loads(raw or b"null")
+
+        def do_GET(self):
+            if self.path == "/metrics":
+                self._send(200, metrics.REGISTRY.render(), "text/plain; version=0.0.4")
+            elif self.path == "/healthz":
+                self._send_json(200, {"status": "ok", "queueDepth": service.queue_depth(),
+                                      "admission": service.admission.stats(),
+                                      "singleFlight": service.flights.stats()})
+            else:
+                self._send_json(404, {"error": f"Unknown path: {self.path}"})
+
+        def do_POST(self):
+            try:
+                payload = self._read_json()
+            except (ValueError, UnicodeDecodeError) as e:
+                self._send_json(400, {"error": f"Invalid JSON body: {e}"})
+                return
+
+            if self.path == "/analyze":
+                if not isinstance(payload, dict):
+                    self._send_json(400, {"error": "Body must be a JSON object"})
+                    return
+                try:
+                    result = service.analyze(payload)
+                except ValueError as e:
+                    self._send_json(400, {"error": str(e)})
+                    return
+                if result is None:
+                    self._send_json(400, {"error": "Missing imageUrl"})
+                    return
+                self._send_result(result)
+            elif self.path == "/ai_suggestions":
+                if not isinstance(payload, (dict, list)):
+                    self._send_json(400, {"error": "Body must be a detection object or array"})
+                    return
+                try:
+                    result = service.ai_suggestions(payload)
+                except ValueError as e:
+                    self._send_json(400, {"error": str(e)})
+                    return
+                self._send_result(result)
+            else:
+                self._send_json(404, {"error": f"Unknown path: {self.path}"})
+
+        def log_message(self, format, *args):
+            # Per-request access lines would drown the pipeline's own stderr logging.
+            pass
+
+    return Handler
+
+
+def run_server(argv):
+    parser = argparse.ArgumentParser(prog="main.py serve", description="Persistent RubberSense inference worker")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=int(os.environ.get("RUBBERSENSE_SERVICE_PORT", "8765")))
+    parser.add_argument("--workers", type=int, default=None, help="Concurrent analyses (default: RUBBERSENSE_SERVICE_WORKERS or 4)")
+    parser.add_argument("--max-queue", type=int, default=None,
+                        help="Requests allowed to wait for a worker (default: RUBBERSENSE_SERVICE_MAX_QUEUE or 8 per worker)")
+    parser.add_argument("--max-queue-wait-ms", type=float, default=None,
+                        help="Longest wait for a worker before rejecting (default: RUBBERSENSE_SERVICE_MAX_QUEUE_WAIT_MS or 30000)")
+    parser.add_argument("--preload", default="cls,leaf,trunk,latex", help="Models to load before accepting requests")
+    parser.add_argument("--priority-caps", default=None,
+                        help="Concurrency caps per priority class, e.g. reanalysis=2,batch=1 "
+                             "(default: RUBBERSENSE_SERVICE_PRIORITY_CAPS or half the workers for bulk classes)")
+    parser.add_argument("--starvation-ms", type=float, default=None,
+                        help="Serve a passed-over request after this wait regardless of class "
+                             "(default: RUBBERSENSE_SERVICE_STARVATION_MS or 10000)")
+    parser.add_argument("--metrics-file", default=os.environ.get("RUBBERSENSE_METRICS_FILE"),
+                        help="Also dump metrics to this file periodically")
+    parser.add_argument("--metrics-interval", type=float, default=15.0, help="Seconds between metrics file dumps")
+    args = parser.parse_args(argv)
+
+    caps = parse_priority_caps(args.priority_caps) if args.priority_caps is not None else None
+    service = InferenceService(args.workers, args.max_queue, args.max_queue_wait_ms, caps, args.starvation_ms)
+    metrics.REGISTRY.add_collector(lambda: metrics.collect_process_metrics(service.ai.MODEL_MANAGER))
+    for name in filter(None, (n.strip() for n in args.preload.split(','))):
+        service.ai.MODEL_MANAGER.get(name)
+    if knowledge_base.enabled():
+        knowledge_base.get_store()
+
+    writer = None
+    if args.metrics_file:
+        writer = metrics.MetricsFileWriter(args.metrics_file, args.metrics_interval).start()
+
+    httpd = ThreadingHTTPServer((args.host, args.port), make_handler(service))
+    httpd.daemon_threads = True
+    sys.stderr.write(f"🚀 [Service] Listening on http://{args.host}:{httpd.server_address[1]} with {service.workers} workers\n")
+    try:
+        httpd.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        httpd.server_close()
+        if writer is not None:
+            writer.stop()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(run_server(sys.argv[1:]))
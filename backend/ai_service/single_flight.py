@@ -0,0 +1,73 @@
+"""
+Single-flight coalescing of identical in-flight requests.
+
+Double taps in the app and retries after a client timeout send the same scan
+several times at once. `SingleFlight.do(key, fn)` runs fn() for the first
+caller with a given key; callers that arrive with the same key while it runs
+wait for that computation and receive a copy of its result (or its error)
+instead of running the pipeline again. A caller can decline to join a
+running call whose `tag` (e.g. its deadline) does not suit it; it then runs
+fn() on its own.
+"""
+import copy
+import threading
+
+
+class _Call:
+    __slots__ = ('done', 'result', 'error', 'followers', 'tag')
+
+    def __init__(self, tag=None):
+        self.done = threading.Event()
+        self.tag = tag
+        self.result = None
+        self.error = None
+        self.followers = 0
+
+
+class SingleFlight:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls = {}
+        self.coalesced = 0
+
+    def do(self, key, fn, tag=None, joins=None):
+        """
+        Returns (result, shared): fn()'s result, and whether it came from a call
+        another caller had already started. `tag` is recorded when this caller
+        leads; with `joins`, this caller only waits for a running call if
+        joins(that call's tag) is true.
+        """
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call(tag)
+            elif joins is not None and not joins(call.tag):
+                call = None
+            else:
+                call.followers += 1
+                self.coalesced += 1
+
+        if call is None:
+            return fn(), False
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            # Each caller gets its own document; the handlers may annotate it.
+            return copy.deepcopy(call.result), True
+
+        try:
+            call.result = fn()
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+        return call.result, False
+
+    def stats(self):
+        with self._lock:
+            return {"inFlight": len(self._calls), "coalesced": self.coalesced}
@@ -0,0 +1,144 @@
+"""
+Runs the independent stages of a single scan in parallel.
+
+A scan is described as a small graph: each stage is a function of the
+results of the stages it depends on. `run()` starts every stage whose
+inputs are ready on a shared thread pool and runs one of them on the calling
+thread, so a request never idles while its stages are queued. OpenCV, numpy
+and torch release the GIL in their heavy calls, so stages of one request
+overlap on a multi-core node.
+
+RUBBERSENSE_STAGE_WORKERS sets the shared pool size (default: CPU count, at
+most 4). 1 or 0 runs every stage inline, in the order it was added.
+
+Stages that themselves build a graph (e.g. analyze_latex_with_model inside the
+latex request graph) run it inline when they are on a pool thread, so pool
+threads never block waiting for other pool work. A request inside `inline()`
+(e.g. one being profiled: cProfile only sees the calling thread) runs all of
+its graphs inline.
+
+The CPU time stages spend on pool threads is added to the request's trace
+(`pool_cpu_ms` in the trace total), since the request thread's CPU time does
+not include it.
+"""
+import contextvars
+import os
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from contextlib import contextmanager
+
+import tracing
+
+_POOL = None
+_POOL_LOCK = threading.Lock()
+_IN_POOL = threading.local()
+_INLINE = contextvars.ContextVar("rubbersense_stages_inline", default=False)
+
+
+def configured_workers():
+    raw = os.environ.get("RUBBERSENSE_STAGE_WORKERS")
+    if raw not in (None, ""):
+        try:
+            return max(0, int(raw))
+        except ValueError:
+            pass
+    return min(4, os.cpu_count() or 1)
+
+
+def _mark_pool_thread():
+    _IN_POOL.active = True
+
+
+def _pool():
+    global _POOL
+    with _POOL_LOCK:
+        if _POOL is None:
+            _POOL = ThreadPoolExecutor(
+                max_workers=configured_workers(),
+                thread_name_prefix="scan-stage",
+                initializer=_mark_pool_thread,
+            )
+        return _POOL
+
+
+def parallel_enabled():
+    return configured_workers() > 1 and not getattr(_IN_POOL, "active", False) and not _INLINE.get()
+
+
+@contextmanager
+def inline():
+    """
+    Runs every graph of the current request (context) on its calling thread within the block.
+    """
+    token = _INLINE.set(True)
+    try:
+        yield
+    finally:
+        _INLINE.reset(token)
+
+
+def _pooled(fn, *args):
+    cpu = time.thread_time()
+    try:
+        return fn(*args)
+    finally:
+        tracing.record_pool_cpu(time.thread_time() - cpu)
+
+
+class StageGraph:
+    def __init__(self):
+        self._stages = {}
+
+    def add(self, name, fn, *deps):
+        """
+        Adds stage `name`, computed as fn(*results of deps). Dependencies must
+        already be in the graph.
+        """
+        missing = [dep for dep in deps if dep not in self._stages]
+        if missing:
+            raise ValueError(f"Stage {name} depends on unknown stages: {missing}")
+        self._stages[name] = (fn, deps)
+        return self
+
+    def run(self):
+        """
+        Runs every stage and returns {name: result}. The first stage to raise
+        re-raises here; stages not started yet are dropped.
+        """
+        results = {}
+        if not parallel_enabled():
+            for name, (fn, deps) in self._stages.items():
+                results[name] = fn(*(results[dep] for dep in deps))
+            return results
+
+        pending = dict(self._stages)
+        running = {}
+        while pending or running:
+            ready = [name for name, (_, deps) in pending.items() if all(dep in results for dep in deps)]
+            for name in ready[:-1]:
+                fn, deps = pending.pop(name)
+                future = _pool().submit(contextvars.copy_context().run, _pooled, fn, *(results[dep] for dep in deps))
+                running[future] = name
+            if ready:
+                # The calling thread takes the last ready stage itself.
+                name = ready[-1]
+                fn, deps = pending.pop(name)
+                try:
+                    results[name] = fn(*(results[dep] for dep in deps))
+                except BaseException:
+                    for future in running:
+                        future.cancel()
+                    raise
+                continue
+
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                name = running.pop(future)
+                try:
+                    results[name] = future.result()
+                except BaseException:
+                    for other in running:
+                        other.cancel()
+                    raise
+        return results
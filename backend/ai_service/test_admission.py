@@ -0,0 +1,133 @@
+import sys
+import os
+import threading
+import time
+import unittest
+
+# Add current directory to path so we can import admission
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+import admission
+import metrics
+
+
+class TestAdmission(unittest.TestCase):
+
+    def setUp(self):
+        metrics.REGISTRY.reset()
+        self.addCleanup(metrics.REGISTRY.reset)
+
+    def test_queue_full_rejects_immediately(self):
+        control = admission.AdmissionController(concurrency=1, max_queue=1, max_wait=5)
+        control.acquire()
+        waiter = threading.Thread(target=control.acquire)
+        waiter.start()
+        while control.queue_depth() == 0:
+            time.sleep(0.001)
+
+        start = time.perf_counter()
+        with self.assertRaises(admission.Busy) as ctx:
+            control.acquire()
+        self.assertLess(time.perf_counter() - start, 0.5)
+        response = ctx.exception.to_response()
+        self.assertEqual(response["code"], "busy")
+        self.assertEqual(response["reason"], "queue_full")
+        self.assertGreaterEqual(response["retryAfterMs"], admission.MIN_RETRY_AFTER_MS)
+        self.assertEqual(metrics.QUEUE_DEPTH.value(), 1)
+
+        control.release(0.5)
+        waiter.join(5)
+        self.assertEqual(control.stats()["active"], 1)
+        self.assertEqual(control.stats()["rejected"], {"queue_full": 1, "queue_timeout": 0})
+
+    def test_queue_wait_is_bounded(self):
+        control = admission.AdmissionController(concurrency=1, max_queue=4, max_wait=0.05)
+        control.acquire()
+        with self.assertRaises(admission.Busy) as ctx:
+            control.acquire()
+        self.assertEqual(ctx.exception.reason, "queue_timeout")
+        # A shorter per-request limit (its deadline) wins.
+        start = time.perf_counter()
+        with self.assertRaises(admission.Busy):
+            control.acquire(max_wait=0)
+        self.assertLess(time.perf_counter() - start, 0.05)
+        self.assertEqual(control.queue_depth(), 0)
+
+    def test_waiters_admitted_in_order(self):
+        control = admission.AdmissionController(concurrency=1, max_queue=8, max_wait=5)
+        control.acquire()
+        order = []
+
+        def worker(index):
+            with control.slot():
+                order.append(index)
+
+        threads = []
+        for index in range(4):
+            thread = threading.Thread(target=worker, args=(index,))
+            thread.start()
+            threads.append(thread)
+            while control.queue_depth() < index + 1:
+                time.sleep(0.001)
+        control.release(0.01)
+        for thread in threads:
+            thread.join(5)
+        self.assertEqual(order, [0, 1, 2, 3])
+
+    def _queue(self, control, priority, order, tag):
+        def worker():
+            with control.slot(priority=priority):
+                order.append(tag)
+        depth = control.queue_depth()
+        thread = threading.Thread(target=worker)
+        thread.start()
+        while control.queue_depth() < depth + 1:
+            time.sleep(0.001)
+        return thread
+
+    def test_interactive_served_before_queued_bulk(self):
+        control = admission.AdmissionController(concurrency=1, max_queue=8, max_wait=5)
+        control.acquire()
+        order = []
+        threads = [
+            self._queue(control, 'batch', order, 'batch'),
+            self._queue(control, 'reanalysis', order, 'reanalysis'),
+            self._queue(control, 'interactive', order, 'interactive'),
+        ]
+        control.release(0.01)
+        for thread in threads:
+            thread.join(5)
+        self.assertEqual(order, ['interactive', 'reanalysis', 'batch'])
+        self.assertEqual(metrics.QUEUE_WAIT_SECONDS.count(priority='batch'), 1)
+        with self.assertRaises(ValueError):
+            control.acquire(priority='urgent')
+
+    def test_bulk_class_is_capped(self):
+        control = admission.AdmissionController(concurrency=4, max_queue=8, max_wait=5, caps={'reanalysis': 1})
+        control.acquire(priority='reanalysis')
+        # A second reanalysis request waits although slots are free ...
+        with self.assertRaises(admission.Busy):
+            control.acquire(max_wait=0.01, priority='reanalysis')
+        # ... while interactive requests still get in.
+        control.acquire(max_wait=0, priority='interactive')
+        stats = control.stats()["priorities"]
+        self.assertEqual(stats['reanalysis'], {"active": 1, "queued": 0, "cap": 1})
+        self.assertEqual(stats['interactive']["active"], 1)
+        self.assertEqual(stats['batch']["cap"], 2)
+
+    def test_starved_bulk_request_is_promoted(self):
+        control = admission.AdmissionController(concurrency=1, max_queue=8, max_wait=5, starvation_after=0.05)
+        control.acquire()
+        order = []
+        threads = [self._queue(control, 'batch', order, 'batch')]
+        time.sleep(0.06)
+        threads.append(self._queue(control, 'interactive', order, 'interactive'))
+        control.release(0.01)
+        for thread in threads:
+            thread.join(5)
+        self.assertEqual(order, ['batch', 'interactive'])
+        self.assertEqual(control.stats()["starvationPromotions"], 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,77 @@
+import sys
+import os
+import io
+import threading
+import time
+import unittest
+from unittest import mock
+
+# Add current directory to path so we can import main
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+import main
+from rate_limit import RateLimiter
+
+
+class TestAiSuggestionsBatch(unittest.TestCase):
+
+    def setUp(self):
+        err = mock.patch.object(sys, 'stderr', new=io.StringIO())
+        err.start()
+        self.addCleanup(err.stop)
+
+    def test_parse_inputs(self):
+        self.assertEqual(main.parse_suggestion_requests('{"disease_name": "a"}'), ({"disease_name": "a"}, False))
+        self.assertEqual(main.parse_suggestion_requests('[{"disease_name": "a"}]'), ([{"disease_name": "a"}], True))
+        data, is_batch = main.parse_suggestion_requests('{"disease_name": "a"}\n\n{"disease_name": "b"}\n')
+        self.assertTrue(is_batch)
+        self.assertEqual([d["disease_name"] for d in data], ["a", "b"])
+
+    def test_batch_dedupes_and_keeps_order(self):
+        """Duplicates share one call; results line up with the inputs"""
+        calls = []
+        lock = threading.Lock()
+
+        def fake_groq(disease_name, confidence, spot_count, color_name):
+            with lock:
+                calls.append(disease_name)
+            time.sleep(0.05)
+            return {"diagnosis": disease_name}
+
+        items = [
+            {"disease_name": "Powdery_Mildew", "confidence": 80, "spot_count": 3, "color_name": "Green"},
+            {"disease_name": "Leaf_Spot", "confidence": 60},
+            {"disease_name": "Powdery_Mildew", "confidence": 80.01, "spot_count": 3, "color_name": "Green"},
+            "not a detection",
+            {"disease_name": "Anthracnose"},
+        ]
+        with mock.patch.object(main, 'get_groq_analysis', fake_groq):
+            start = time.time()
+            results = main.generate_ai_suggestions_batch(items, concurrency=4, rate_per_sec=0)
+            elapsed = time.time() - start
+
+        self.assertEqual(sorted(calls), ["Anthracnose", "Leaf_Spot", "Powdery_Mildew"])
+        self.assertEqual(
+            [r.get("diagnosis") for r in results],
+            ["Powdery_Mildew", "Leaf_Spot", "Powdery_Mildew", None, "Anthracnose"]
+        )
+        self.assertIn("error", results[3])
+        # Three concurrent 50 ms calls take about as long as one.
+        self.assertLess(elapsed, 0.14)
+
+    def test_fallback_when_groq_fails(self):
+        with mock.patch.object(main, 'get_groq_analysis', return_value=None):
+            results = main.generate_ai_suggestions_batch([{"disease_name": "Leaf_Spot"}])
+        self.assertIn("Leaf_Spot", results[0]["diagnosis"])
+
+    def test_rate_limiter_spacing(self):
+        limiter = RateLimiter(rate=50)
+        start = time.monotonic()
+        for _ in range(6):
+            limiter.acquire()
+        # First call uses the burst token, the other five wait ~20 ms each.
+        self.assertGreaterEqual(time.monotonic() - start, 0.09)
+
+if __name__ == '__main__':
+    print("🧪 Running AI Suggestions Tests...")
+    unittest.main()
@@ -0,0 +1,196 @@
+import sys
+import os
+import io
+import json
+import tempfile
+import unittest
+from unittest import mock
+
+import cv2
+import numpy as np
+
+# Add current directory to path so we can import batch
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+import batch
+import content_categories
+import main
+from fakes import FAKE_NAMES, FakeClassifier
+from model_manager import ModelManager
+
+
+def write_image(path, value):
+    img = np.full((32, 32, 3), value, dtype=np.uint8)
+    cv2.imwrite(path, img)
+
+
+class CountingModel:
+    def __init__(self):
+        self.single_calls = 0
+        self.batch_calls = 0
+
+    def __call__(self, source, verbose=False):
+        if isinstance(source, list):
+            self.batch_calls += 1
+            return [f"batched-{i}" for i in range(len(source))]
+        self.single_calls += 1
+        return ["single"]
+
+
+class BatchedClassifier(FakeClassifier):
+    def __init__(self, names):
+        super().__init__(names)
+        self.batches = []
+        self.single_calls = 0
+
+    def __call__(self, source, verbose=False):
+        if isinstance(source, list):
+            self.batches.append(len(source))
+            return [super(BatchedClassifier, self).__call__(img, verbose)[0] for img in source]
+        self.single_calls += 1
+        return super().__call__(source, verbose)
+
+
+class TestBatch(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.images = []
+        for i in range(5):
+            path = os.path.join(self.tmp.name, f"img_{i}.jpg")
+            write_image(path, i * 40)
+            self.images.append(path)
+        err = mock.patch.object(sys, 'stderr', new=io.StringIO())
+        err.start()
+        self.addCleanup(err.stop)
+
+    def test_load_items_from_directory_glob_and_manifest(self):
+        self.assertEqual([i['source'] for i in batch.load_items(self.tmp.name)], self.images)
+        self.assertEqual(len(batch.load_items(os.path.join(self.tmp.name, "img_[0-1].jpg"))), 2)
+
+        manifest = os.path.join(self.tmp.name, "scans.jsonl")
+        with open(manifest, "w") as f:
+            f.write(json.dumps({"id": "a", "path": self.images[0], "mode": "latex"}) + "\n")
+            f.write("not json\n")
+            f.write(json.dumps({"url": self.images[1], "sub_mode": "leaf"}) + "\n")
+        items = batch.load_items(manifest)
+        self.assertEqual([i['id'] for i in items], ["a", self.images[1]])
+        self.assertEqual(items[0]['mode'], "latex")
+        self.assertEqual(items[1]['mode'], "tree")
+        self.assertEqual(items[1]['sub_mode'], "leaf")
+
+    def test_resume_skips_completed_items(self):
+        """Re-running picks up after the last written result, even after a torn line; failures are retried"""
+        out = os.path.join(self.tmp.name, "results.jsonl")
+        with open(out, "w") as f:
+            f.write(json.dumps({"id": self.images[0], "result": {}}) + "\n")
+            f.write(json.dumps({"id": self.images[2], "result": {"error": "Failed to load image"}}) + "\n")
+            f.write('{"id": "' + self.images[1])  # interrupted mid-write
+
+        seen = []
+
+        def fake_analyze(img, mode, sub_mode, source):
+            seen.append(source)
+            return {"ok": True}
+
+        with mock.patch.object(main, 'analyze_image', fake_analyze), \
+                mock.patch('sys.stdout', new=io.StringIO()) as stdout:
+            batch.run_batch([self.tmp.name, "--out", out, "--batch-size", "2"])
+
+        self.assertEqual(seen, self.images[1:])
+        summary = json.loads(stdout.getvalue())
+        self.assertEqual(summary["skipped_checkpoint"], 1)
+        self.assertEqual(summary["processed"], 4)
+
+        ids = []
+        with open(out) as f:
+            for line in f:
+                try:
+                    ids.append(json.loads(line)["id"])
+                except ValueError:
+                    pass  # the torn line from the interrupted run
+        # The failed download is retried and its new result appended.
+        self.assertEqual(ids, [self.images[0], self.images[2]] + self.images[1:])
+        self.assertEqual(batch.load_checkpoint(out), set(self.images))
+
+    def test_chunk_inference_is_batched_and_primed(self):
+        """One batched pass per model; per-image calls reuse the primed results"""
+        models = {"cls": CountingModel(), "latex": CountingModel()}
+        manager = ModelManager(budget_bytes=0, pinned=set())
+        for name, model in models.items():
+            manager.register(name, lambda m=model: m, replicas=1)
+
+        imgs = [cv2.imread(p) for p in self.images[:3]]
+        loaded = [({"mode": "latex", "sub_mode": ""}, img, 0.0) for img in imgs]
+        with mock.patch.object(main, 'MODEL_MANAGER', manager):
+            primed = batch.prime_chunk(loaded)
+            handle = manager.get("latex")
+            self.assertEqual(handle(imgs[2], verbose=False), ["batched-2"])
+            for h, img in primed:
+                h.discard_primed(img)
+            self.assertEqual(handle(imgs[2], verbose=False), ["single"])
+
+        # Latex scans only run the generic classifier when both latex signals are weak.
+        self.assertEqual(models["cls"].batch_calls, 0)
+        self.assertEqual(models["latex"].batch_calls, 1)
+        self.assertEqual(models["latex"].single_calls, 1)
+
+    def test_primed_cls_results_are_scored_in_one_product(self):
+        """The chunk's category scores come from one matrix product, not one per image"""
+        manager = ModelManager(budget_bytes=0, pinned=set())
+        manager.register("cls", lambda: BatchedClassifier(FAKE_NAMES['cls']), replicas=1)
+        manager.register("leaf", lambda: FakeClassifier(FAKE_NAMES['leaf']), replicas=1)
+        imgs = [np.random.default_rng(i).integers(0, 255, (64, 64, 3), dtype=np.uint8) for i in range(3)]
+        loaded = [({"mode": "tree", "sub_mode": ""}, img, 0.0) for img in imgs]
+
+        with mock.patch.object(main, 'MODEL_MANAGER', manager), \
+                mock.patch.object(main, 'YOLO_AVAILABLE', True), \
+                mock.patch.object(batch.content_prefilter, 'decide', return_value=None):
+            expected = [main.classify_content(img) for img in imgs]
+            real_scores = content_categories.category_scores
+            with mock.patch.object(content_categories, 'category_scores', side_effect=real_scores) as scores:
+                primed = batch.prime_chunk(loaded)
+                self.assertEqual(scores.call_count, 1)
+                self.assertEqual([main.classify_content(img) for img in imgs], expected)
+                self.assertEqual(scores.call_count, 1)
+            for h, img in primed:
+                h.discard_primed(img)
+
+
+    def test_cls_primed_only_for_scans_the_lazy_gate_leaves_open(self):
+        """Leaf scans the specialised model settles are not batched through the generic classifier"""
+        models = {"cls": BatchedClassifier(FAKE_NAMES['cls']), "leaf": BatchedClassifier(FAKE_NAMES['leaf'])}
+        manager = ModelManager(budget_bytes=0, pinned=set())
+        for name, model in models.items():
+            manager.register(name, lambda m=model: m, replicas=1)
+        imgs = [np.random.default_rng(i).integers(0, 255, (64, 64, 3), dtype=np.uint8) for i in range(4)]
+        loaded = [({"mode": "tree", "sub_mode": "leaf"}, img, 0.0) for img in imgs]
+
+        with mock.patch.object(main, 'MODEL_MANAGER', manager), \
+                mock.patch.object(main, 'YOLO_AVAILABLE', True), \
+                mock.patch.object(batch.content_prefilter, 'decide', return_value=None), \
+                mock.patch.object(main.lazy_validation, 'settled', side_effect=[True, False, True, False]), \
+                mock.patch.dict(os.environ, {"RUBBERSENSE_LAZY_PARTS": "1"}):
+            primed = batch.prime_chunk(loaded)
+            for h, img in primed:
+                h.discard_primed(img)
+        self.assertEqual(models["leaf"].batches, [4])
+        self.assertEqual(models["leaf"].single_calls, 0)
+        self.assertEqual(models["cls"].batches, [2])
+
+        # Without the lazy gate every scan is classified.
+        models["cls"].batches.clear()
+        with mock.patch.object(main, 'MODEL_MANAGER', manager), \
+                mock.patch.object(main, 'YOLO_AVAILABLE', True), \
+                mock.patch.object(batch.content_prefilter, 'decide', return_value=None), \
+                mock.patch.dict(os.environ, {"RUBBERSENSE_LAZY_VALIDATION": "0"}):
+            primed = batch.prime_chunk(loaded)
+            for h, img in primed:
+                h.discard_primed(img)
+        self.assertEqual(models["cls"].batches, [4])
+
+
+if __name__ == '__main__':
+    print("🧪 Running Batch Tests...")
+    unittest.main()
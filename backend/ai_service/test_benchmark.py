@@ -0,0 +1,46 @@
+import sys
+import os
+import unittest
+
+# Add current directory to path so we can import benchmark
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+import benchmark
+
+
+class TestBenchmark(unittest.TestCase):
+
+    def test_synthetic_images_are_deterministic(self):
+        for maker in (benchmark.create_synthetic_leaf_image,
+                      benchmark.create_synthetic_trunk_image,
+                      benchmark.create_synthetic_latex_image):
+            first, second = maker(seed=1, size=128), maker(seed=1, size=128)
+            self.assertEqual(first.shape, (128, 128, 3))
+            self.assertTrue((first == second).all())
+
+    def test_regressions_beyond_tolerance_are_flagged(self):
+        baseline = {"stages": {
+            "leaf.count_spots": {"p50": 10.0, "p95": 20.0},
+            "leaf.groq_stub": {"p50": 0.05, "p95": 0.06},
+        }}
+        report = {
+            "leaf.count_spots": {"p50": 11.0, "p95": 30.0},
+            "leaf.groq_stub": {"p50": 0.2, "p95": 0.3},  # sub-millisecond noise is ignored
+            "latex.new_stage": {"p50": 5.0, "p95": 6.0},  # not in the baseline
+        }
+        regressions = benchmark.compare_to_baseline(report, baseline, tolerance=0.25)
+        self.assertEqual([(r["stage"], r["metric"]) for r in regressions], [("leaf.count_spots", "p95")])
+        self.assertEqual(regressions[0]["change_pct"], 50.0)
+
+    def test_stage_timer_report(self):
+        timer = benchmark.StageTimer()
+        for value in range(10):
+            timer.run("stage", lambda v: v * 2, value)
+        report = timer.report()
+        self.assertEqual(report["stage"]["count"], 10)
+        self.assertIn("p99", report["stage"])
+        self.assertGreater(report["stage"]["throughput_per_second"], 0)
+
+if __name__ == '__main__':
+    print("🧪 Running Benchmark Tests...")
+    unittest.main()
@@ -0,0 +1,95 @@
+import sys
+import os
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+from unittest import mock
+
+# Add current directory to path so we can import main
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+import main
+from fakes import FAKE_NAMES, FakeClassifier, synthetic_image
+from model_manager import ModelManager
+
+
+def fake_groq(*args):
+    return {
+        "diagnosis": f"Fake diagnosis for {args[0]}",
+        "treatment": ["Fake treatment"],
+        "prevention": ["Fake prevention"],
+        "tappability_advice": "Fake advice",
+    }
+
+
+def run_scan(kind, img):
+    if kind == 'leaf':
+        result = main.analyze_leaf_with_model(img, 'stress_leaf.jpg')
+    elif kind == 'trunk':
+        result = main.analyze_trunk_with_model(img, 'stress_trunk.jpg', 50.0)
+    else:
+        result = main.analyze_latex_with_model(img)
+    result = dict(result)
+    result.pop('processed_image_path', None)  # Contains a timestamp
+    return {'classification': main.classify_content(img), 'analysis': result}
+
+
+class TestConcurrentInference(unittest.TestCase):
+
+    def setUp(self):
+        manager = ModelManager(budget_bytes=0, pinned=set())
+        for name, names in FAKE_NAMES.items():
+            manager.register(name, lambda n=names: FakeClassifier(n), replicas=2)
+
+        patches = [
+            mock.patch.object(main, 'MODEL_MANAGER', manager),
+            mock.patch.object(main, 'YOLO_AVAILABLE', True),
+            mock.patch.object(main, 'get_groq_analysis', fake_groq),
+            mock.patch.object(main, 'get_groq_latex_analysis', fake_groq),
+            mock.patch.object(main.cv2, 'imwrite', return_value=True),
+            mock.patch.object(main.sys, 'stderr', new=open(os.devnull, 'w')),
+        ]
+        for p in patches:
+            p.start()
+            self.addCleanup(p.stop)
+        self.manager = manager
+
+    def test_concurrent_scans_match_sequential(self):
+        """Many leaf/trunk/latex scans on 8 threads give the same results as one thread"""
+        jobs = [(kind, seed) for seed in range(12) for kind in ('leaf', 'trunk', 'latex')] * 2
+        images = {seed: synthetic_image(seed) for seed in range(12)}
+
+        sequential = [run_scan(kind, images[seed]) for kind, seed in jobs]
+
+        with ThreadPoolExecutor(max_workers=8) as pool:
+            concurrent = list(pool.map(lambda job: run_scan(job[0], images[job[1]]), jobs))
+
+        self.assertEqual(len(concurrent), len(sequential))
+        for job, expected, actual in zip(jobs, sequential, concurrent):
+            self.assertEqual(expected, actual, f"Mismatch for {job}")
+            # Make sure the model paths ran rather than the error fallbacks
+            detections = actual['analysis'].get('diseaseDetection') or [{}]
+            self.assertNotIn(detections[0].get('name'), ('Error', 'System Error'))
+
+        stats = self.manager.stats()['models']
+        for name in FAKE_NAMES:
+            self.assertEqual(stats[name]['loads'], 1)
+            self.assertLessEqual(stats[name]['replicas'], 2)
+    def test_stage_graph_matches_inline_stages(self):
+        """Scans whose stages run in parallel give the same results as running them in order"""
+        images = [synthetic_image(seed) for seed in range(6)]
+        with mock.patch.dict(os.environ, {"RUBBERSENSE_STAGE_WORKERS": "1"}):
+            inline = [run_scan(kind, img) for img in images for kind in ('leaf', 'trunk', 'latex')]
+        with mock.patch.dict(os.environ, {"RUBBERSENSE_STAGE_WORKERS": "4"}):
+            parallel = [run_scan(kind, img) for img in images for kind in ('leaf', 'trunk', 'latex')]
+            with ThreadPoolExecutor(max_workers=4) as pool:
+                jobs = [(kind, img) for img in images for kind in ('leaf', 'trunk', 'latex')]
+                concurrent = list(pool.map(lambda job: run_scan(*job), jobs))
+        self.assertEqual(inline, parallel)
+        self.assertEqual(inline, concurrent)
+        # The latex request graph includes the analysis graph; both complete.
+        latex = main.analyze_image(images[0], 'latex')
+        self.assertIn('qualityClassification', latex)
+
+if __name__ == '__main__':
+    print("🧪 Running Concurrent Inference Stress Test...")
+    unittest.main()
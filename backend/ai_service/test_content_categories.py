@@ -0,0 +1,73 @@
+import sys
+import os
+import unittest
+from unittest import mock
+
+import numpy as np
+
+# Add current directory to path so we can import content_categories
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+import content_categories
+from fakes import FAKE_NAMES, FakeClassifier
+from model_manager import ModelManager
+
+NAMES = dict(enumerate(FAKE_NAMES['cls'] + ['oak tree', 'wooden desk', 'daisy flower', 'tabby cat', 'bookcase']))
+
+
+def keyword_scores(probabilities, names, top5):
+    # The per-class keyword loop classify_content used before the weight matrix.
+    scores = {'trunk': 0.0, 'leaf': 0.0, 'non_plant': 0.0}
+    for idx in top5:
+        class_name = names[idx].lower()
+        score = float(probabilities[idx])
+        for category in content_categories.CATEGORIES:
+            if any(k in class_name for k in content_categories.KEYWORDS[category]):
+                scores[category] += score
+                break
+    return [scores[category] for category in content_categories.CATEGORIES]
+
+
+class TestContentCategories(unittest.TestCase):
+
+    def setUp(self):
+        rng = np.random.default_rng(0)
+        self.batch = rng.dirichlet(np.ones(len(NAMES)) * 0.3, size=32)
+        self.matrix = content_categories.category_matrix(NAMES)
+
+    def test_matches_keyword_loop(self):
+        for row in self.batch:
+            top5 = list(np.argsort(row)[::-1][:5])
+            expected = keyword_scores(row, NAMES, top5)
+            np.testing.assert_allclose(content_categories.category_scores(row, self.matrix, 5, top5), expected)
+            np.testing.assert_allclose(content_categories.category_scores(row, self.matrix, 5), expected)
+
+    def test_batch_scoring(self):
+        scores = content_categories.category_scores(self.batch, self.matrix, 5)
+        self.assertEqual(scores.shape, (32, 3))
+        for row, expected in zip(self.batch, scores):
+            np.testing.assert_allclose(content_categories.category_scores(row, self.matrix, 5), expected)
+        # The full probability vector, on request.
+        with mock.patch.dict(os.environ, {"RUBBERSENSE_CLS_TOP_K": "0"}):
+            full = content_categories.category_scores(self.batch, self.matrix)
+        np.testing.assert_allclose(full, self.batch @ self.matrix)
+
+    def test_matrix_built_once_per_model_handle(self):
+        manager = ModelManager(budget_bytes=0, pinned=set())
+        manager.register("cls", lambda: FakeClassifier(list(NAMES.values())))
+        handle = manager.get("cls")
+        with mock.patch.object(content_categories, 'category_matrix', wraps=content_categories.category_matrix) as build:
+            matrix = content_categories.handle_matrix(handle, NAMES)
+            self.assertIs(content_categories.handle_matrix(handle, NAMES), matrix)
+            self.assertEqual(build.call_count, 1)
+            # A reloaded model gets its own.
+            manager.evict("cls")
+            content_categories.handle_matrix(manager.get("cls"), NAMES)
+            self.assertEqual(build.call_count, 2)
+        np.testing.assert_array_equal(matrix, self.matrix)
+        # "oak tree" holds both a trunk and a leaf-ish word: trunk wins, as in the keyword loop.
+        self.assertEqual(content_categories.category_of("oak tree"), "trunk")
+        self.assertEqual(self.matrix.sum(axis=1).max(), 1.0)
+
+if __name__ == '__main__':
+    unittest.main()
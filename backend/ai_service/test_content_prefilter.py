@@ -0,0 +1,74 @@
+import sys
+import os
+import io
+import unittest
+from unittest import mock
+
+# Add current directory to path so we can import content_prefilter
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+import content_prefilter
+import main
+import tracing
+from fakes import BARK, LATEX, LEAF, frame
+
+
+class TestContentPrefilter(unittest.TestCase):
+
+    def setUp(self):
+        err = mock.patch.object(sys, 'stderr', new=io.StringIO())
+        err.start()
+        self.addCleanup(err.stop)
+
+    def test_obvious_frames_are_decided(self):
+        self.assertEqual(content_prefilter.decide(LEAF, 'tree')['primary_part'], 'leaf')
+        self.assertEqual(content_prefilter.decide(BARK, 'tree')['primary_part'], 'trunk')
+        self.assertEqual(content_prefilter.decide(LATEX, 'latex'), content_prefilter.LATEX_CLASSIFICATION)
+        # Unsure: the models decide.
+        self.assertIsNone(content_prefilter.decide(LATEX, 'tree'))
+        self.assertIsNone(content_prefilter.decide(LEAF, 'latex'))
+        mixed = LEAF.copy()
+        mixed[:, 160:] = BARK[:, 160:]
+        self.assertIsNone(content_prefilter.decide(mixed, 'tree'))
+
+    def test_sub_mode_scans_always_reach_the_classifier(self):
+        # A grey wall or a green shirt is bark or foliage by color; only the
+        # classifier's non-plant verdict can reject them.
+        wall = frame((110, 110, 110))
+        shirt = frame((40, 170, 50))
+        for img, sub_mode in ((wall, 'trunk'), (BARK, 'trunk'), (shirt, 'leaf'), (LEAF, 'leaf')):
+            self.assertIsNone(content_prefilter.decide(img, 'tree', sub_mode))
+
+    def test_decided_scan_skips_classifier(self):
+        with mock.patch.object(main, 'classify_content') as classify, tracing.trace() as t:
+            result = main.analyze_image(LEAF, 'tree', '', 'leaf.jpg')
+        classify.assert_not_called()
+        self.assertEqual(result["treeIdentification"]["detectedPart"], "leaf")
+        self.assertEqual(t.to_dict()["cache"]["content_prefilter"], {"hits": 1, "misses": 0})
+
+        with mock.patch.dict(os.environ, {"RUBBERSENSE_CONTENT_PREFILTER": "0"}):
+            self.assertIsNone(content_prefilter.decide(LEAF, 'tree'))
+
+    def test_evaluate_reports_agreement(self):
+        cascade = {id(LEAF): 'leaf', id(BARK): 'leaf'}
+        items = [
+            ({'id': 'leaf', 'mode': 'tree', 'sub_mode': ''}, LEAF),
+            ({'id': 'bark', 'mode': 'tree', 'sub_mode': ''}, BARK),
+            ({'id': 'latex', 'mode': 'latex'}, LATEX),
+            ({'id': 'missing', 'mode': 'tree'}, None),
+        ]
+
+        def classify(img):
+            part = cascade.get(id(img), 'unknown')
+            return {'is_tree': part != 'unknown', 'primary_part': part, 'confidence': 0.9}
+
+        report = content_prefilter.evaluate(items, classify)
+        self.assertEqual((report["images"], report["decided"], report["agreed"]), (3, 3, 1))
+        self.assertEqual(report["by_decision"]["trunk"], {"decided": 1, "agreed": 0})
+        # A confident non-plant verdict would have rejected the latex scan.
+        self.assertEqual(report["by_decision"]["latex"], {"decided": 1, "agreed": 0})
+        self.assertEqual([d["id"] for d in report["disagreements"]], ["bark", "latex"])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,99 @@
+import sys
+import os
+import io
+import json
+import time
+import unittest
+from unittest import mock
+
+# Add current directory to path so we can import deadline
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+import deadline
+import llm
+import main
+import server
+import tracing
+from fakes import FakeClassifier, synthetic_image
+from model_manager import ModelManager
+
+
+def now_ms(offset_ms=0):
+    return time.time() * 1000 + offset_ms
+
+
+class TestDeadline(unittest.TestCase):
+
+    def setUp(self):
+        manager = ModelManager(budget_bytes=0, pinned=set())
+        manager.register('leaf', lambda: FakeClassifier(['Leaf_Spot', 'Anthracnose']))
+        manager.register('cls', lambda: FakeClassifier(['tree bark', 'oak leaf', 'keyboard']))
+        for patcher in [
+            mock.patch.dict(os.environ, {"RUBBERSENSE_KB": "0", "RUBBERSENSE_LLM_BACKENDS": "offline"}),
+            mock.patch.object(main, 'MODEL_MANAGER', manager),
+            mock.patch.object(main, 'YOLO_AVAILABLE', True),
+            mock.patch.object(main.cv2, 'imwrite', return_value=True),
+            mock.patch.object(sys, 'stderr', new=io.StringIO()),
+        ]:
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        llm.reset_backends()
+        self.addCleanup(llm.reset_backends)
+
+    def test_short_budget_skips_optional_work(self):
+        with mock.patch.object(llm, 'generate_insights', wraps=llm.generate_insights) as live, \
+                mock.patch.object(main, 'classify_content', wraps=main.classify_content) as classify:
+            with tracing.trace() as t, deadline.scope(now_ms(200)) as active:
+                result = main.analyze_image(synthetic_image(1), 'tree', 'leaf', 'leaf.jpg')
+            result = deadline.attach(result, active)
+
+        live.assert_not_called()
+        classify.assert_not_called()
+        self.assertTrue(result["partial"])
+        self.assertEqual(result["skipped"], ["classification", "llm", "annotation"])
+        self.assertIsNone(result["processed_image_path"])
+        # The detection itself is still there, with the user's part accepted.
+        self.assertIn(result["diseaseDetection"][0]["name"], ("Leaf_Spot", "Anthracnose"))
+        self.assertEqual(result["treeIdentification"]["detectedPart"], "leaf")
+        self.assertIn("skipped.llm", t.to_dict()["fallbacks"])
+
+    def test_ample_budget_runs_everything(self):
+        with deadline.scope(now_ms(60000)) as active:
+            result = main.analyze_image(synthetic_image(1), 'tree', 'leaf', 'leaf.jpg')
+        result = deadline.attach(result, active)
+        self.assertNotIn("partial", result)
+        self.assertIsNotNone(result["processed_image_path"])
+        self.assertIsNotNone(result["leafAnalysis"]["detailed_analysis"])
+
+    def test_llm_timeout_capped_by_deadline(self):
+        self.assertEqual(deadline.cap(15.0), 15.0)
+        with deadline.scope(now_ms(2000)):
+            self.assertLessEqual(deadline.cap(15.0), 2.0)
+        with deadline.scope(now_ms(-5000)):
+            self.assertEqual(deadline.cap(15.0), 0.1)
+        self.assertIsNone(deadline.parse("soon"))
+        self.assertEqual(deadline.parse("1700000000000"), 1700000000000.0)
+
+    def test_cli_and_service_accept_deadline(self):
+        seen = []
+
+        def fake_request(mode, image_url, raw_sub_mode=''):
+            seen.append(deadline.current())
+            deadline.allows("llm")
+            return {"ok": True}
+
+        with mock.patch.object(main, 'analyze_request', fake_request), \
+                mock.patch.object(sys, 'argv', ['main.py', 'latex', 'x.jpg', '--deadline', str(now_ms(100))]), \
+                mock.patch('sys.stdout', new=io.StringIO()) as out:
+            main.main()
+        printed = json.loads(out.getvalue().strip().splitlines()[-1])
+        self.assertEqual(printed, {"ok": True, "partial": True, "skipped": ["llm"]})
+
+        with mock.patch.object(main, 'analyze_request', fake_request):
+            result = server.InferenceService(workers=1).analyze({"imageUrl": "x.jpg", "deadline": now_ms(60000)})
+        self.assertEqual(result, {"ok": True})
+        self.assertIsNotNone(seen[-1])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,111 @@
+import sys
+import os
+import io
+import tempfile
+import unittest
+from unittest import mock
+
+import numpy as np
+
+# Add current directory to path so we can import feature_cache
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+import feature_cache
+import llm
+import main
+import tracing
+from fakes import FAKE_NAMES, FakeClassifier, synthetic_image
+from model_manager import ModelManager
+
+
+def without_output_path(result):
+    result = dict(result)
+    result.pop('processed_image_path', None)  # Contains a timestamp
+    return result
+
+
+class TestFeatureCache(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        manager = ModelManager(budget_bytes=0, pinned=set())
+        for name, names in FAKE_NAMES.items():
+            manager.register(name, lambda n=names: FakeClassifier(n))
+        for patcher in [
+            mock.patch.dict(os.environ, {
+                "RUBBERSENSE_FEATURE_CACHE_DIR": self.tmp.name,
+                "RUBBERSENSE_LLM_BACKENDS": "offline",
+            }),
+            mock.patch.object(main, 'MODEL_MANAGER', manager),
+            mock.patch.object(main, 'YOLO_AVAILABLE', True),
+            mock.patch.object(main.cv2, 'imwrite', return_value=True),
+            mock.patch.object(sys, 'stderr', new=io.StringIO()),
+        ]:
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        llm.reset_backends()
+        self.addCleanup(llm.reset_backends)
+
+    def scan(self, mode, sub_mode, img):
+        with tracing.trace() as t:
+            result = main.analyze_image(img, mode, sub_mode, 'scan.jpg')
+        return without_output_path(result), t.to_dict()["cache"]
+
+    def test_second_scan_reuses_every_feature(self):
+        for seed, (mode, sub_mode) in enumerate([('tree', 'leaf'), ('tree', 'trunk'), ('latex', '')]):
+            img = synthetic_image(10 + seed)
+            first, first_cache = self.scan(mode, sub_mode, img)
+            with mock.patch.object(main, 'get_leaf_mask') as mask, \
+                    mock.patch.object(main, 'count_spots') as spots, \
+                    mock.patch.object(main, 'segment_latex_region') as segment, \
+                    mock.patch.object(main, 'classify_content') as classify:
+                second, second_cache = self.scan(mode, sub_mode, img)
+            for stub in (mask, spots, segment, classify):
+                stub.assert_not_called()
+
+            self.assertEqual(second, first, mode + sub_mode)
+            features = {name for name in first_cache if name.startswith("features.")}
+            self.assertTrue(features)
+            self.assertTrue(all(first_cache[name]["hits"] == 0 for name in features))
+            self.assertTrue(all(second_cache[name] == {"hits": 1, "misses": 0} for name in features))
+
+    def test_changed_stage_recomputes_it_and_its_dependents(self):
+        img = synthetic_image(6)
+        first, _ = self.scan('tree', 'leaf', img)
+        with mock.patch.dict(main.FEATURE_VERSIONS, {"leaf.mask": "2"}):
+            second, cache = self.scan('tree', 'leaf', img)
+        self.assertEqual(second, first)
+        for name in ("leaf.mask", "leaf.spots", "leaf.color"):
+            self.assertEqual(cache["features." + name], {"hits": 0, "misses": 1})
+        for name in ("leaf.classify", "classify_content"):
+            self.assertEqual(cache["features." + name], {"hits": 1, "misses": 0})
+
+    def test_classifier_top_k_is_part_of_its_version(self):
+        img = synthetic_image(6)
+        self.scan('tree', 'leaf', img)
+        with mock.patch.dict(os.environ, {"RUBBERSENSE_CLS_TOP_K": "0"}):
+            _, cache = self.scan('tree', 'leaf', img)
+        self.assertEqual(cache["features.classify_content"], {"hits": 0, "misses": 1})
+        self.assertEqual(cache["features.leaf.classify"], {"hits": 1, "misses": 0})
+
+    def test_spot_overlay_round_trip(self):
+        img = synthetic_image(7)
+        img[20:30, 20:30] = 0  # A dark spot
+        count, vis = main.count_spots(img)
+        self.assertGreater(count, 0)
+        data = main.encode_spot_feature((count, vis), img)
+        decoded_count, decoded_vis = main.decode_spot_feature(data, img)
+        self.assertEqual(decoded_count, count)
+        self.assertTrue(np.array_equal(decoded_vis, vis))
+
+    def test_disabled_without_directory(self):
+        os.environ.pop("RUBBERSENSE_FEATURE_CACHE_DIR")
+        with feature_cache.scope(synthetic_image(1)) as entry_dir:
+            self.assertIsNone(entry_dir)
+            self.assertEqual(feature_cache.fetch("leaf.mask", "1", lambda: "computed"), "computed")
+        self.assertEqual(os.listdir(self.tmp.name), [])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,81 @@
+import sys
+import os
+import io
+import tempfile
+import unittest
+from unittest import mock
+
+# Add current directory to path so we can import knowledge_base
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+import knowledge_base
+import llm
+import main
+import tracing
+
+
+class TestKnowledgeBase(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.path = os.path.join(self.tmp.name, 'kb.json.gz')
+        env = mock.patch.dict(os.environ, {
+            "GROQ_API_KEY": "",
+            "RUBBERSENSE_LLM_BACKENDS": "",
+            "RUBBERSENSE_KB": "1",
+            "RUBBERSENSE_KB_PATH": self.path,
+        })
+        env.start()
+        self.addCleanup(env.stop)
+        err = mock.patch.object(sys, 'stderr', new=io.StringIO())
+        err.start()
+        self.addCleanup(err.stop)
+        llm.reset_backends()
+        self.addCleanup(llm.reset_backends)
+        knowledge_base.reset_store()
+        self.addCleanup(knowledge_base.reset_store)
+
+    def test_build_and_load_round_trip(self):
+        with mock.patch('sys.stdout', new=io.StringIO()):
+            self.assertEqual(knowledge_base.main(['build', '--out', self.path]), 0)
+        store = knowledge_base.load(self.path)
+        self.assertEqual(store.source, 'curated')
+        # Latex types that share text are stored once but still indexed per key.
+        self.assertLess(len(store._records), len(store))
+        self.assertEqual(
+            store.disease("Powdery_Mildew", 30),
+            llm.offline_leaf_insights("Powdery_Mildew", 35),
+        )
+
+    def test_lookups_cover_model_classes(self):
+        leaf = main.get_groq_analysis("Corynespora Leaf Fall", 91.0, 64, "Yellow")
+        self.assertIn("critical severity", leaf["severity_reasoning"])
+        trunk = main.get_groq_analysis("Brown Root Disease", 77.0, 0, "Brown")
+        self.assertIn("Brown root", trunk["diagnosis"])
+        self.assertEqual(
+            main.get_groq_analysis("Healthy (Nayang-Normal)", 95.0, 0, "Brown")["diagnosis"],
+            llm.HEALTHY_INSIGHTS["diagnosis"],
+        )
+        latex = main.get_groq_latex_analysis("Heuristic grade C latex", 0.0, "medium", 30.0)
+        self.assertEqual(latex["market_analysis"]["estimated_price_range_php"], llm.GRADE_PRICES["C"])
+
+    def test_unknown_class_goes_to_llm(self):
+        with mock.patch.object(llm, 'generate_insights', return_value={"diagnosis": "live"}) as live:
+            with tracing.trace() as t:
+                known = main.get_groq_analysis("Leaf_Spot", 80.0, 5, "Green")
+                unknown = main.get_groq_analysis("Tapping Panel Dryness", 80.0, 0, "Brown")
+        self.assertNotEqual(known["diagnosis"], "live")
+        self.assertEqual(unknown, {"diagnosis": "live"})
+        live.assert_called_once()
+        self.assertEqual(t.to_dict()["cache"]["knowledge_base"], {"hits": 1, "misses": 1})
+
+    def test_disabled_skips_store(self):
+        os.environ["RUBBERSENSE_KB"] = "0"
+        with mock.patch.object(llm, 'generate_insights', return_value=None) as live:
+            self.assertIsNone(main.get_groq_latex_analysis("white latex", 90.0, "low", 40))
+        live.assert_called_once()
+
+
+if __name__ == '__main__':
+    unittest.main()
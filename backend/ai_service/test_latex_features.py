@@ -0,0 +1,84 @@
+import sys
+import os
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+from unittest import mock
+
+import cv2
+import numpy as np
+
+# Add current directory to path so we can import latex_features
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+import latex_features
+import main
+
+
+def latex_photo(seed, sigma):
+    rng = np.random.default_rng(seed)
+    base = cv2.GaussianBlur(rng.integers(0, 256, (180, 240, 3), dtype=np.uint8), (0, 0), sigma)
+    tint = np.array([rng.integers(0, 255), rng.integers(100, 255), rng.integers(150, 255)], dtype=np.int16)
+    return np.clip(base.astype(np.int16) // 2 + tint // 2, 0, 255).astype(np.uint8)
+
+
+def separate_passes(img):
+    # The per-consumer computations the extractor replaced.
+    hsv = cv2.cvtColor(img, cv2.COLOR_BGR2HSV)
+    kernel = np.ones((5, 5), np.uint8)
+
+    def cleaned(lower_white, upper_white):
+        mask = cv2.bitwise_or(
+            cv2.inRange(hsv, np.array(lower_white), np.array(upper_white)),
+            cv2.inRange(hsv, np.array([15, 60, 100]), np.array([40, 200, 255])),
+        )
+        mask = cv2.morphologyEx(mask, cv2.MORPH_OPEN, kernel)
+        return cv2.morphologyEx(mask, cv2.MORPH_CLOSE, kernel)
+
+    presence = cleaned([0, 0, 80], [180, 90, 255])
+    segment = cleaned([0, 0, 100], [180, 60, 255])
+    gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
+    _, thresh = cv2.threshold(gray, 100, 255, cv2.THRESH_BINARY_INV)
+    return {
+        'presence_ratio': float(cv2.countNonZero(presence)) / float(img.shape[0] * img.shape[1]),
+        'segmented': cv2.countNonZero(segment) >= img.shape[0] * img.shape[1] * 0.05,
+        'segment_mask': segment,
+        'gray': gray,
+        'avg_color': np.average(np.average(img, axis=0), axis=0),
+        'mean_saturation': np.mean(hsv[:, :, 1]),
+        'mean_value': np.mean(hsv[:, :, 2]),
+        'contamination_ratio': cv2.countNonZero(thresh) / (img.shape[0] * img.shape[1]),
+    }
+
+
+class TestLatexFeatures(unittest.TestCase):
+
+    def test_matches_separate_passes(self):
+        for seed, sigma in [(1, 1), (2, 4), (3, 9)]:
+            img = latex_photo(seed, sigma)
+            features = latex_features.LatexFeatures(img)
+            expected = separate_passes(img)
+            if not expected['segmented']:
+                expected['segment_mask'] = latex_features.center_crop_mask(img.shape)
+            for name in latex_features.FIELDS:
+                np.testing.assert_array_equal(getattr(features, name), expected[name], err_msg=name)
+
+        dark = np.full((200, 200, 3), 30, np.uint8)
+        mask, segmented = main.segment_latex_region(dark)
+        self.assertFalse(segmented)
+        self.assertEqual(cv2.countNonZero(mask), 66 * 66)
+        self.assertEqual(main.estimate_latex_presence_ratio(dark), 0.0)
+
+    def test_computed_once_for_concurrent_stages(self):
+        features = latex_features.LatexFeatures(latex_photo(4, 2))
+        with mock.patch.object(features, '_compute', wraps=features._compute) as compute, \
+                ThreadPoolExecutor(max_workers=4) as pool:
+            ratios = list(pool.map(lambda _: features.presence_ratio, range(8)))
+            self.assertEqual(features.contamination_ratio, features.contamination_ratio)
+        self.assertEqual(compute.call_count, 1)
+        self.assertEqual(len(set(ratios)), 1)
+        with self.assertRaises(AttributeError):
+            features.hsv
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,127 @@
+import sys
+import os
+import io
+import unittest
+from unittest import mock
+
+# Add current directory to path so we can import lazy_validation
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+import lazy_validation
+import llm
+import main
+from fakes import BARK, FAKE_NAMES, LATEX, LEAF, FakeClassifier, frame
+from model_manager import ModelManager
+
+NOT_A_PLANT = {'is_tree': False, 'primary_part': 'unknown', 'confidence': 0.95}
+
+
+class CountingClassifier(FakeClassifier):
+    calls = 0
+
+    def __call__(self, img, verbose=False):
+        type(self).calls += 1
+        return super().__call__(img, verbose)
+
+
+class TestLazyValidation(unittest.TestCase):
+
+    def setUp(self):
+        manager = ModelManager(budget_bytes=0, pinned=set())
+        for name, names in FAKE_NAMES.items():
+            # Spread over more classes, the latex model is often unsure.
+            names = names * 5 if name == 'latex' else names
+            factory = CountingClassifier if name == 'leaf' else FakeClassifier
+            manager.register(name, lambda n=names, f=factory: f(n))
+        CountingClassifier.calls = 0
+        for patcher in [
+            mock.patch.dict(os.environ, {"RUBBERSENSE_LLM_BACKENDS": "offline", "RUBBERSENSE_LAZY_PARTS": "1"}),
+            mock.patch.object(main, 'MODEL_MANAGER', manager),
+            mock.patch.object(main, 'YOLO_AVAILABLE', True),
+            mock.patch.object(main.cv2, 'imwrite', return_value=True),
+            mock.patch.object(sys, 'stderr', new=io.StringIO()),
+        ]:
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        llm.reset_backends()
+        self.addCleanup(llm.reset_backends)
+
+    def test_confident_specialised_model_skips_generic_validation(self):
+        with mock.patch.dict(os.environ, {"RUBBERSENSE_LAZY_LEAF_MIN_CONFIDENCE": "0"}), \
+                mock.patch.object(main, 'classify_content') as classify:
+            result = main.analyze_image(LEAF, 'tree', 'leaf', 'leaf.jpg')
+        classify.assert_not_called()
+        # Leaf.pt ran once, for the check and the analysis together.
+        self.assertEqual(CountingClassifier.calls, 1)
+        self.assertEqual(result["validation"], {"ran": ["leaf.classify"], "skipped": ["classify_content"]})
+        self.assertEqual(result["treeIdentification"]["detectedPart"], "leaf")
+
+    def test_part_gate_is_off_by_default(self):
+        os.environ.pop("RUBBERSENSE_LAZY_PARTS")
+        with mock.patch.dict(os.environ, {"RUBBERSENSE_LAZY_LEAF_MIN_CONFIDENCE": "0"}), \
+                mock.patch.object(main, 'classify_content', return_value=dict(NOT_A_PLANT)):
+            result = main.analyze_image(LEAF, 'tree', 'leaf', 'leaf.jpg')
+        self.assertEqual(result["error"], "Detected part non-leaf only. Please try again.")
+        self.assertEqual(result["validation"], {"ran": ["classify_content"], "skipped": []})
+
+    def test_unconfirmed_part_is_validated_as_before(self):
+        # Leaf.pt is never confident enough here, and the photo is bark, not foliage.
+        with mock.patch.dict(os.environ, {"RUBBERSENSE_LAZY_LEAF_MIN_CONFIDENCE": "101"}), \
+                mock.patch.object(main, 'classify_content', return_value=dict(NOT_A_PLANT)):
+            rejected = main.analyze_image(BARK, 'tree', 'leaf', 'bark.jpg')
+            self.assertEqual(rejected["error"], "Detected part non-leaf only. Please try again.")
+            self.assertEqual(rejected["validation"], {"ran": ["leaf.classify", "classify_content"], "skipped": []})
+            with mock.patch.dict(os.environ, {"RUBBERSENSE_LAZY_VALIDATION": "0"}):
+                full = main.analyze_image(BARK, 'tree', 'leaf', 'bark.jpg')
+        self.assertEqual(full["error"], rejected["error"])
+        self.assertEqual(full["validation"], {"ran": ["classify_content"], "skipped": []})
+
+    def test_latex_rejections_match_full_cascade(self):
+        frames = [LATEX, LEAF, BARK] + [frame((40 * i, 90, 200 - 30 * i), seed=i) for i in range(5)]
+        rejected = 0
+        for presence in (0.0, 0.5):
+            for img in frames:
+                with mock.patch.object(main, 'estimate_latex_presence_ratio', return_value=presence), \
+                        mock.patch.object(main, 'classify_content', return_value=dict(NOT_A_PLANT)) as classify:
+                    lazy = main.analyze_image(img, 'latex', '', 'latex.jpg')
+                    with mock.patch.dict(os.environ, {"RUBBERSENSE_LAZY_VALIDATION": "0"}):
+                        full = main.analyze_image(img, 'latex', '', 'latex.jpg')
+                self.assertEqual(lazy.get("error"), full.get("error"))
+                rejected += "error" in lazy
+                if presence:
+                    # Only the full cascade classified (unless the prefilter settled it).
+                    self.assertEqual(lazy["validation"]["skipped"], ["classify_content"])
+                    self.assertLessEqual(classify.call_count, 1)
+        self.assertGreater(rejected, 0)
+
+    def test_latex_validation_lists_only_checks_that_ran(self):
+        result = main.analyze_image(LATEX, 'latex', '', 'latex.jpg')
+        self.assertEqual(result["validation"]["ran"][:2], ["latex.presence_ratio", "latex.classify"])
+        with mock.patch.object(main, 'get_latex_model', return_value=None):
+            result = main.analyze_image(LATEX, 'latex', '', 'latex.jpg')
+        self.assertNotIn("latex.classify", result["validation"]["ran"])
+        self.assertEqual(result["validation"]["ran"][0], "latex.presence_ratio")
+
+    def test_evaluate_reports_disagreements(self):
+        items = [
+            ({'id': 'leaf', 'mode': 'tree', 'sub_mode': 'leaf'}, LEAF),
+            ({'id': 'bark', 'mode': 'tree', 'sub_mode': 'leaf'}, BARK),
+            ({'id': 'no-sub-mode', 'mode': 'tree', 'sub_mode': ''}, LEAF),
+            ({'id': 'missing', 'mode': 'tree', 'sub_mode': 'trunk'}, None),
+        ]
+
+        def lazy(img, part, record):
+            record["skipped"].append("classify_content")
+            return {'is_tree': True, 'primary_part': part, 'confidence': 0.9}
+
+        def full(img, part):
+            return dict(NOT_A_PLANT) if img is BARK else {'is_tree': True, 'primary_part': part, 'confidence': 0.9}
+
+        report = lazy_validation.evaluate(items, lazy, full, main.strong_part_mismatch)
+        self.assertEqual((report["images"], report["skipped"], report["rejected_full"], report["rejected_lazy"]), (2, 2, 1, 0))
+        self.assertEqual([d["id"] for d in report["disagreements"]], ["bark"])
+        self.assertEqual(report["agreement"], 0.5)
+
+
+if __name__ == '__main__':
+    unittest.main()
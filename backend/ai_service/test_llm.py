@@ -0,0 +1,148 @@
+import sys
+import os
+import io
+import threading
+import unittest
+from unittest import mock
+
+import numpy as np
+
+# Add current directory to path so we can import llm
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+import llm
+import main
+import tracing
+from groq_stub import GroqStub, STUB_LEAF_INSIGHTS
+
+
+class TestLLM(unittest.TestCase):
+
+    def setUp(self):
+        env = mock.patch.dict(os.environ, {
+            "GROQ_API_KEY": "",
+            "RUBBERSENSE_LLM_BACKENDS": "",
+            "RUBBERSENSE_KB": "0",
+        })
+        env.start()
+        self.addCleanup(env.stop)
+        err = mock.patch.object(sys, 'stderr', new=io.StringIO())
+        err.start()
+        self.addCleanup(err.stop)
+        llm.reset_backends()
+        self.addCleanup(llm.reset_backends)
+
+    def test_parse_json_content(self):
+        self.assertEqual(llm.parse_json_content('{"a": 1}'), {"a": 1})
+        self.assertEqual(llm.parse_json_content('Sure!\n```json\n{"a": 1}\n```'), {"a": 1})
+        self.assertIsNone(llm.parse_json_content('no json here'))
+        self.assertIsNone(llm.parse_json_content('[1, 2]'))
+
+    def test_chain_falls_through_to_offline(self):
+        os.environ["RUBBERSENSE_LLM_BACKENDS"] = "groq,offline"
+        with tracing.trace() as t:
+            insights = main.get_groq_analysis("Powdery Mildew", 88.0, 30, "Yellow")
+        self.assertIn("Oidium", insights["diagnosis"])
+        self.assertIn("high severity", insights["severity_reasoning"])
+        # Groq had no API key, so it was skipped and recorded as a fallback.
+        self.assertEqual(t.to_dict()["fallbacks"], ["llm.groq"])
+
+    def test_all_backends_failing_returns_none(self):
+        self.assertIsNone(main.get_groq_latex_analysis("white latex", 90.0, "low", 40))
+
+    def test_local_backend_speaks_openai_format(self):
+        stub = GroqStub().start()
+        self.addCleanup(stub.stop)
+        os.environ.update({
+            "RUBBERSENSE_LLM_BACKENDS": "local",
+            "RUBBERSENSE_LLM_LOCAL_URL": stub.base_url,
+            "RUBBERSENSE_LLM_LOCAL_MAX_TOKENS": "256",
+        })
+        with mock.patch('llm.requests.post', wraps=llm.requests.post) as post:
+            insights = main.get_groq_analysis("Leaf Spot", 70.0, 5, "Green")
+        self.assertEqual(insights, STUB_LEAF_INSIGHTS)
+        payload = post.call_args.kwargs["json"]
+        self.assertEqual(payload["max_tokens"], 256)
+        self.assertNotIn("response_format", payload)
+        self.assertEqual(post.call_args.kwargs["timeout"], 30.0)
+
+        # Without an explicit limit, none is sent.
+        del os.environ["RUBBERSENSE_LLM_LOCAL_MAX_TOKENS"]
+        llm.reset_backends()
+        with mock.patch('llm.requests.post', wraps=llm.requests.post) as post:
+            main.get_groq_analysis("Leaf Spot", 70.0, 5, "Green")
+        self.assertNotIn("max_tokens", post.call_args.kwargs["json"])
+
+    def test_concurrency_limit_per_backend(self):
+        os.environ["RUBBERSENSE_LLM_OFFLINE_CONCURRENCY"] = "1"
+        os.environ["RUBBERSENSE_LLM_OFFLINE_TIMEOUT"] = "0.05"
+        backend = llm.get_backend("offline")
+        self.assertEqual(backend.concurrency, 1)
+
+        backend._slots.acquire()
+        try:
+            self.assertIsNone(backend.generate('leaf', {"disease_name": "Healthy"}))
+        finally:
+            backend._slots.release()
+        self.assertIsNotNone(backend.generate('leaf', {"disease_name": "Healthy"}))
+
+    def test_offline_answers_match_pipeline_expectations(self):
+        healthy = llm.offline_leaf_insights("Healthy")
+        self.assertTrue(main.text_says_healthy(healthy["diagnosis"]))
+        for disease in ("Powdery_Mildew", "Leaf Spot", "Anthracnose", "Unknown"):
+            self.assertFalse(main.text_says_healthy(llm.offline_leaf_insights(disease, 10)["diagnosis"]), disease)
+
+        latex = llm.offline_latex_insights("Heuristic grade D latex", "high")
+        self.assertEqual(latex["market_analysis"]["estimated_price_range_php"], "35-50")
+        self.assertTrue(latex["recommended_end_products"])
+
+    def test_offline_pipeline_runs_without_network(self):
+        os.environ["RUBBERSENSE_LLM_BACKENDS"] = "offline"
+        img = np.full((120, 160, 3), 235, dtype=np.uint8)
+        with mock.patch('llm.requests.post', side_effect=AssertionError("network used")):
+            result = main.analyze_latex_heuristic(img)
+        self.assertEqual(result["productRecommendation"]["recommendedProduct"], "Centrifuged latex concentrate")
+
+    def test_speculative_request_overlaps_leaf_analysis(self):
+        from fakes import FakeClassifier, synthetic_image
+        from model_manager import ModelManager
+
+        manager = ModelManager(budget_bytes=0, pinned=set())
+        manager.register('leaf', lambda: FakeClassifier(['Leaf_Spot', 'Anthracnose']))
+        sent = []
+        started = threading.Event()
+        release = threading.Event()
+
+        def slow_llm(kind, context):
+            sent.append(dict(context))
+            started.set()
+            release.wait(5)
+            return llm.offline_leaf_insights("Unknown", 0)
+
+        def spots_after_request(img):
+            # The request must already be in flight while the CV stages run.
+            self.assertTrue(started.wait(5))
+            release.set()
+            return 30, img
+
+        os.environ["RUBBERSENSE_SPECULATIVE_LLM"] = "1"
+        with mock.patch.object(main, 'MODEL_MANAGER', manager), \
+                mock.patch.object(main, 'YOLO_AVAILABLE', True), \
+                mock.patch.object(main, 'count_spots', side_effect=spots_after_request), \
+                mock.patch.object(main.cv2, 'imwrite', return_value=True), \
+                mock.patch.object(llm, 'generate_insights', side_effect=slow_llm):
+            with tracing.trace() as t:
+                result = main.analyze_leaf_with_model(synthetic_image(3), 'leaf.jpg')
+
+        self.assertEqual(len(sent), 1)
+        self.assertIsNone(sent[0]["spot_count"])
+        self.assertIn("not measured yet", llm.build_prompt('leaf', sent[0]))
+        detailed = result["leafAnalysis"]["detailed_analysis"]
+        # Refined with the spot count measured after the request went out.
+        self.assertIn("high severity", detailed["severity_reasoning"])
+        self.assertIn("llm.speculative_wait", [s["name"] for s in t.to_dict()["stages"]])
+
+
+if __name__ == '__main__':
+    print("🧪 Running LLM Tests...")
+    unittest.main()
@@ -0,0 +1,99 @@
+import sys
+import os
+import io
+import json
+import tempfile
+import threading
+import time
+import unittest
+from unittest import mock
+
+import cv2
+
+# Add current directory to path so we can import loadtest
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+import benchmark
+import loadtest
+import main
+from groq_stub import GroqStub, STUB_LATEX_INSIGHTS, STUB_LEAF_INSIGHTS
+
+
+class FakeTarget:
+    name = "fake"
+
+    def __init__(self, delay=0.02):
+        self.delay = delay
+        self.active = 0
+        self.max_active = 0
+        self._lock = threading.Lock()
+
+    def send(self, item):
+        with self._lock:
+            self.active += 1
+            self.max_active = max(self.max_active, self.active)
+        time.sleep(self.delay)
+        with self._lock:
+            self.active -= 1
+        if item['id'] == 'bad':
+            return {"error": "Failed to load image"}
+        return {"timings": {"fallbacks": ["latex.heuristic"]}}
+
+
+class TestLoadtest(unittest.TestCase):
+
+    def setUp(self):
+        err = mock.patch.object(sys, 'stderr', new=io.StringIO())
+        err.start()
+        self.addCleanup(err.stop)
+
+    def test_groq_functions_use_stub_base_url(self):
+        stub = GroqStub(latency_ms=5).start()
+        self.addCleanup(stub.stop)
+        with mock.patch.dict(os.environ, {"GROQ_BASE_URL": stub.base_url, "GROQ_API_KEY": "test", "RUBBERSENSE_KB": "0"}):
+            self.assertEqual(main.get_groq_analysis("Leaf Spot", 80.0, 3, "Green"), STUB_LEAF_INSIGHTS)
+            self.assertEqual(main.get_groq_latex_analysis("white latex", 90.0, "Low", 35), STUB_LATEX_INSIGHTS)
+            stub.failure_rate = 1.0
+            self.assertIsNone(main.get_groq_analysis("Leaf Spot", 80.0, 3, "Green"))
+        self.assertEqual(stub.stats(), {"requests": 3, "failures": 1})
+
+    def test_closed_loop_respects_concurrency(self):
+        target = FakeTarget()
+        items = [{'id': 'ok'}, {'id': 'bad'}]
+        records, wall = loadtest.run_load(target, items, 8, concurrency=3)
+        report = loadtest.summarize(records, wall, [204800, 102400])
+
+        self.assertEqual(target.max_active, 3)
+        self.assertEqual(report["requests"], 8)
+        self.assertEqual(report["error_rate"], 0.5)
+        self.assertEqual(report["errors"], {"Failed to load image": 4})
+        self.assertEqual(report["fallbacks"], {"latex.heuristic": 4})
+        self.assertEqual(report["peak_rss_mb"]["max"], 200.0)
+
+    def test_open_loop_follows_arrival_rate(self):
+        target = FakeTarget(delay=0.2)
+        records, wall = loadtest.run_load(target, [{'id': 'ok'}], 5, rate=50)
+        # Arrivals do not wait for earlier requests to finish.
+        self.assertGreater(target.max_active, 1)
+        self.assertLess(wall, 5 * 0.2)
+        self.assertEqual(len(records), 5)
+
+    def test_process_target_end_to_end(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            cv2.imwrite(os.path.join(tmp, "latex.jpg"), benchmark.create_synthetic_latex_image(3))
+            out = os.path.join(tmp, "report.json")
+            with mock.patch('sys.stdout', new=io.StringIO()):
+                code = loadtest.main([tmp, "--mode", "latex", "--requests", "2", "--concurrency", "2",
+                                      "--groq-latency-ms", "0", "--out", out])
+            self.assertEqual(code, 0)
+            with open(out) as f:
+                report = json.load(f)
+        self.assertEqual(report["requests"], 2)
+        self.assertEqual(report["error_rate"], 0.0)
+        self.assertEqual(report["peak_rss_mb"]["workers"], 2)
+        self.assertGreater(report["peak_rss_mb"]["max"], 0)
+
+
+if __name__ == '__main__':
+    print("🧪 Running Loadtest Tests...")
+    unittest.main()
@@ -0,0 +1,242 @@
+import sys
+import os
+import tempfile
+import threading
+import time
+import unittest
+from unittest import mock
+
+# Add current directory to path so we can import model_manager
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+import model_manager
+from model_manager import ModelManager, MB
+
+
+class FakeTensor:
+    def __init__(self, nbytes):
+        self.nbytes = nbytes
+
+    def numel(self):
+        return self.nbytes
+
+    def element_size(self):
+        return 1
+
+
+class FakeModel:
+    """Stands in for a YOLO model: reports a fixed size and refuses re-entrant calls."""
+
+    def __init__(self, name, size_mb=1):
+        self.name = name
+        self.size_bytes = int(size_mb * MB)
+        self.busy = False
+
+    def parameters(self):
+        return [FakeTensor(self.size_bytes)]
+
+    def buffers(self):
+        return []
+
+    def __call__(self, value, verbose=False):
+        if self.busy:
+            raise RuntimeError("predictor used by two threads at once")
+        self.busy = True
+        time.sleep(0.002)
+        self.busy = False
+        return value * 2
+
+
+def make_manager(budget_mb, sizes, pinned=(), replicas=1):
+    manager = ModelManager(budget_bytes=int(budget_mb * MB), pinned=set(pinned))
+    for name, size in sizes.items():
+        manager.register(name, lambda n=name, s=size: FakeModel(n, s), replicas=replicas)
+    return manager
+
+
+class TestModelManager(unittest.TestCase):
+
+    def test_hits_and_loads(self):
+        """Second access is a hit, not a reload"""
+        manager = make_manager(0, {"leaf": 10})
+        first = manager.get("leaf")
+        second = manager.get("leaf")
+        self.assertIs(first, second)
+        self.assertEqual(manager.resident_bytes(), 10 * MB)
+        stats = manager.stats()["models"]["leaf"]
+        self.assertEqual(stats["loads"], 1)
+        self.assertEqual(stats["hits"], 1)
+        self.assertTrue(stats["resident"])
+
+    def test_lru_eviction(self):
+        """Loading past the budget evicts the least recently used model"""
+        manager = make_manager(25, {"cls": 10, "leaf": 10, "latex": 10})
+        manager.get("cls")
+        manager.get("leaf")
+        manager.get("cls")  # leaf is now least recently used
+        manager.get("latex")
+
+        self.assertTrue(manager.is_resident("cls"))
+        self.assertFalse(manager.is_resident("leaf"))
+        self.assertTrue(manager.is_resident("latex"))
+        self.assertEqual(manager.stats()["models"]["leaf"]["evictions"], 1)
+        self.assertLessEqual(manager.resident_bytes(), 25 * MB)
+
+    def test_pinned_models_are_never_evicted(self):
+        """Pinned models survive even when they are least recently used"""
+        manager = make_manager(25, {"cls": 10, "leaf": 10, "trunk": 10}, pinned=["cls"])
+        manager.get("cls")
+        manager.get("leaf")
+        manager.get("trunk")
+
+        self.assertTrue(manager.is_resident("cls"))
+        self.assertFalse(manager.is_resident("leaf"))
+        self.assertTrue(manager.is_resident("trunk"))
+
+    def test_failed_load_is_not_cached(self):
+        """A loader returning None is counted as a failure and retried next time"""
+        manager = ModelManager(budget_bytes=0, pinned=set())
+        attempts = []
+        manager.register("trunk", lambda: attempts.append(1))
+        self.assertIsNone(manager.get("trunk"))
+        self.assertIsNone(manager.get("trunk"))
+        self.assertEqual(len(attempts), 2)
+        self.assertEqual(manager.stats()["models"]["trunk"]["load_failures"], 2)
+
+    def test_in_use_models_are_not_evicted(self):
+        """A model with a checked-out replica is skipped by eviction"""
+        manager = make_manager(15, {"leaf": 10, "trunk": 10})
+        leaf = manager.get("leaf")
+        with leaf.replica():
+            manager.get("trunk")
+            self.assertTrue(manager.is_resident("leaf"))
+        manager.get("leaf")
+        self.assertTrue(manager.is_resident("leaf"))
+
+    def test_concurrent_get_loads_once(self):
+        """Threads racing for a cold model share a single load"""
+        manager = ModelManager(budget_bytes=0, pinned=set())
+        loads = []
+
+        def slow_loader():
+            loads.append(1)
+            time.sleep(0.05)
+            return FakeModel("latex")
+
+        manager.register("latex", slow_loader, replicas=1)
+        handles = []
+        threads = [threading.Thread(target=lambda: handles.append(manager.get("latex"))) for _ in range(8)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+
+        self.assertEqual(len(loads), 1)
+        self.assertTrue(all(h is handles[0] for h in handles))
+
+    def test_replicas_grow_on_demand_and_serialize_calls(self):
+        """Busy replicas are never shared and the pool stops at the configured size"""
+        manager = make_manager(0, {"leaf": 1}, replicas=3)
+        handle = manager.get("leaf")
+        self.assertEqual(handle.replica_count(), 1)
+
+        errors = []
+
+        def worker():
+            try:
+                for i in range(20):
+                    self.assertEqual(handle(i), i * 2)
+            except Exception as e:
+                errors.append(e)
+
+        threads = [threading.Thread(target=worker) for _ in range(6)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+
+        self.assertEqual(errors, [])
+        self.assertLessEqual(handle.replica_count(), 3)
+        self.assertEqual(handle.in_use(), 0)
+        self.assertEqual(manager.resident_bytes(), handle.replica_count() * MB)
+
+    def test_checkout_timeout(self):
+        manager = make_manager(0, {"cls": 1}, replicas=1)
+        handle = manager.get("cls")
+        held = handle.checkout()
+        with self.assertRaises(TimeoutError):
+            handle.checkout(timeout=0.01)
+        handle.checkin(held)
+        handle.checkin(handle.checkout(timeout=0.01))
+
+    def test_collection_runs_outside_manager_lock(self):
+        """Freeing evicted models does not block get() for other models"""
+        manager = make_manager(15, {"leaf": 10, "trunk": 10})
+        manager.get("leaf")
+        held = []
+
+        def collect():
+            # A lock held by the evicting thread would still be acquirable here (RLock),
+            # so check from another thread.
+            def probe():
+                held.append(manager._lock.acquire(timeout=0.5))
+                if held[-1]:
+                    manager._lock.release()
+
+            thread = threading.Thread(target=probe)
+            thread.start()
+            thread.join()
+
+        with mock.patch.object(model_manager.gc, 'collect', side_effect=collect):
+            manager.get("trunk")
+        self.assertEqual(held, [True])
+        self.assertFalse(manager.is_resident("leaf"))
+
+    def test_evicted_handle_loads_no_replicas(self):
+        """A request holding an evicted handle runs on the manager's current one"""
+        manager = make_manager(15, {"leaf": 10, "trunk": 10}, replicas=2)
+        stale = manager.get("leaf")
+        manager.get("trunk")
+        self.assertFalse(manager.is_resident("leaf"))
+        with self.assertRaises(model_manager.HandleEvicted):
+            stale.checkout()
+        self.assertEqual(stale.replica_count(), 0)
+
+        self.assertEqual(stale(21), 42)
+        current = manager.get("leaf")
+        self.assertIsNot(current, stale)
+        self.assertEqual(stale.replica_count(), 0)
+        self.assertLessEqual(manager.resident_bytes(), 15 * MB)
+
+    def test_fingerprint_ignores_working_directory(self):
+        """Missing weights hash as their identity, wherever the process runs"""
+        with tempfile.TemporaryDirectory() as tmp:
+            manager = ModelManager(budget_bytes=0, pinned=set())
+            manager.register("cls", lambda: None, os.path.join(tmp, "weights", "cls.pt"), identity="hub:cls-v1")
+            manager.register("leaf", lambda: None, os.path.join(tmp, "weights", "leaf.pt"))
+            before = manager.fingerprint("1")
+            cls_only = manager.fingerprint("1", names=("cls",))
+            cwd = os.getcwd()
+            os.chdir(tmp)
+            try:
+                # A download into the working directory does not change the weights' identity.
+                with open("cls.pt", "wb") as f:
+                    f.write(b"weights")
+                self.assertEqual(manager.fingerprint("1"), before)
+            finally:
+                os.chdir(cwd)
+
+            os.makedirs(os.path.join(tmp, "weights"))
+            with open(os.path.join(tmp, "weights", "leaf.pt"), "wb") as f:
+                f.write(b"leaf weights")
+            self.assertNotEqual(manager.fingerprint("1"), before)
+            self.assertEqual(manager.fingerprint("1", names=("cls",)), cls_only)
+
+    def test_unknown_model(self):
+        manager = ModelManager(budget_bytes=0, pinned=set())
+        with self.assertRaises(KeyError):
+            manager.get("nope")
+
+if __name__ == '__main__':
+    print("🧪 Running Model Manager Tests...")
+    unittest.main()
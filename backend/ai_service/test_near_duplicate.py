@@ -0,0 +1,89 @@
+import sys
+import os
+import io
+import unittest
+from unittest import mock
+
+import cv2
+import numpy as np
+
+# Add current directory to path so we can import near_duplicate
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+import deadline
+import llm
+import main
+import near_duplicate
+import tracing
+from fakes import FAKE_NAMES, FakeClassifier, photo
+from model_manager import ModelManager
+
+
+def recompressed(img, quality=60):
+    _, encoded = cv2.imencode('.jpg', img, [cv2.IMWRITE_JPEG_QUALITY, quality])
+    return cv2.imdecode(encoded, cv2.IMREAD_COLOR)
+
+
+class TestNearDuplicate(unittest.TestCase):
+
+    def setUp(self):
+        manager = ModelManager(budget_bytes=0, pinned=set())
+        for name, names in FAKE_NAMES.items():
+            manager.register(name, lambda n=names: FakeClassifier(n))
+        for patcher in [
+            mock.patch.dict(os.environ, {
+                "RUBBERSENSE_NEAR_DUPLICATE_BITS": "10",
+                "RUBBERSENSE_LLM_BACKENDS": "offline",
+            }),
+            mock.patch.object(main, 'MODEL_MANAGER', manager),
+            mock.patch.object(main, 'YOLO_AVAILABLE', True),
+            mock.patch.object(main.cv2, 'imwrite', return_value=True),
+            mock.patch.object(sys, 'stderr', new=io.StringIO()),
+        ]:
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        llm.reset_backends()
+        self.addCleanup(llm.reset_backends)
+        near_duplicate.reset()
+        self.addCleanup(near_duplicate.reset)
+
+    def test_hash_tolerates_recompression_and_shift(self):
+        original = near_duplicate.perceptual_hash(photo(1))
+        self.assertLessEqual(near_duplicate.hamming(original, near_duplicate.perceptual_hash(recompressed(photo(1)))), 10)
+        self.assertLessEqual(near_duplicate.hamming(original, near_duplicate.perceptual_hash(np.roll(photo(1), 3, axis=1))), 10)
+        self.assertGreater(near_duplicate.hamming(original, near_duplicate.perceptual_hash(photo(2))), 10)
+
+    def test_near_duplicate_reuses_prior_result(self):
+        first = main.analyze_image(photo(1), 'tree', 'leaf', 'first.jpg')
+        self.assertEqual(first["nearDuplicate"], {"reused": False})
+
+        with mock.patch.object(main, 'classify_content') as classify, \
+                mock.patch.object(main, 'analyze_leaf_with_model') as leaf, \
+                tracing.trace() as t:
+            second = main.analyze_image(recompressed(photo(1)), 'tree', 'leaf', 'second.jpg')
+        classify.assert_not_called()
+        leaf.assert_not_called()
+        self.assertTrue(second["nearDuplicate"]["reused"])
+        self.assertEqual(second["nearDuplicate"]["source"], "first.jpg")
+        self.assertEqual(second["diseaseDetection"], first["diseaseDetection"])
+        self.assertEqual(t.to_dict()["cache"]["near_duplicate"], {"hits": 1, "misses": 0})
+
+        # Another sub mode, or another photo, is analyzed afresh.
+        self.assertFalse(main.analyze_image(photo(1), 'tree', 'trunk', 'trunk.jpg')["nearDuplicate"]["reused"])
+        self.assertFalse(main.analyze_image(photo(2), 'tree', 'leaf', 'other.jpg')["nearDuplicate"]["reused"])
+
+    def test_partial_results_are_not_remembered(self):
+        with deadline.scope(1):
+            partial = main.analyze_image(photo(3), 'tree', 'leaf', 'rushed.jpg')
+        self.assertEqual(partial["nearDuplicate"], {"reused": False})
+        self.assertFalse(main.analyze_image(photo(3), 'tree', 'leaf', 'again.jpg')["nearDuplicate"]["reused"])
+
+    def test_disabled_by_default(self):
+        os.environ.pop("RUBBERSENSE_NEAR_DUPLICATE_BITS")
+        near_duplicate.reset()
+        result = main.analyze_image(photo(1), 'tree', 'leaf', 'first.jpg')
+        self.assertNotIn("nearDuplicate", result)
+
+
+if __name__ == '__main__':
+    unittest.main()
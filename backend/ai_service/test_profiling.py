@@ -0,0 +1,93 @@
+import sys
+import os
+import io
+import tempfile
+import unittest
+from unittest import mock
+
+import numpy as np
+
+# Add current directory to path so we can import profiling
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+import main
+import profiling
+import stages
+
+
+class TestProfiling(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        env = mock.patch.dict(os.environ, {
+            "RUBBERSENSE_PROFILE_DIR": self.tmp.name,
+            "RUBBERSENSE_PROFILE": "",
+            "RUBBERSENSE_PROFILE_SAMPLE_RATE": "",
+        })
+        env.start()
+        self.addCleanup(env.stop)
+        err = mock.patch.object(sys, 'stderr', new=io.StringIO())
+        err.start()
+        self.addCleanup(err.stop)
+
+    def test_profiles_heuristic_fallback(self):
+        img = np.full((120, 160, 3), 235, dtype=np.uint8)
+        with mock.patch.object(main, 'get_groq_latex_analysis', return_value=None), \
+                profiling.profiled("latex", force=True) as run:
+            result = main.analyze_latex_heuristic(img)
+        profiling.attach(result, run)
+
+        summary = result["profile"]
+        self.assertTrue(os.path.exists(summary["profile"]))
+        with open(summary["summary"]) as f:
+            report = f.read()
+        self.assertIn("Top functions by self time", report)
+        self.assertIn("analyze_latex_heuristic", report)
+        self.assertGreaterEqual(summary["peak_alloc_mb"], 0)
+        self.assertTrue(summary["top_functions"])
+
+    def test_sampling(self):
+        with profiling.profiled("tree") as run:
+            pass
+        self.assertIsNone(run)
+
+        with mock.patch.dict(os.environ, {"RUBBERSENSE_PROFILE": "1", "RUBBERSENSE_PROFILE_SAMPLE_RATE": "0.5"}):
+            with mock.patch('profiling.random.random', return_value=0.9), profiling.profiled("tree") as run:
+                pass
+            self.assertIsNone(run)
+            with mock.patch('profiling.random.random', return_value=0.1), profiling.profiled("tree") as run:
+                pass
+            self.assertIsNotNone(run.summary)
+
+    def test_one_profile_at_a_time(self):
+        with profiling.profiled("outer", force=True) as outer:
+            with profiling.profiled("inner", force=True) as inner:
+                pass
+        self.assertIsNone(inner)
+        self.assertIsNotNone(outer.summary)
+        self.assertEqual(len([f for f in os.listdir(self.tmp.name) if f.endswith(".prof")]), 1)
+
+    def test_pooled_stages_are_profiled(self):
+        def mask_background():
+            return sum(range(20000))
+
+        def classify_leaf():
+            return sum(range(20000))
+
+        graph = stages.StageGraph()
+        graph.add("mask", mask_background)
+        graph.add("classify", classify_leaf)
+        graph.add("inline", lambda *_: None, "mask", "classify")
+        with mock.patch.dict(os.environ, {"RUBBERSENSE_STAGE_WORKERS": "4"}), \
+                profiling.profiled("leaf", force=True) as run:
+            graph.run()
+        with open(run.summary["summary"]) as f:
+            report = f.read()
+        self.assertIn("mask_background", report)
+        self.assertIn("classify_leaf", report)
+
+
+if __name__ == '__main__':
+    print("🧪 Running Profiling Tests...")
+    unittest.main()
@@ -0,0 +1,59 @@
+import sys
+import os
+import io
+import unittest
+from unittest import mock
+
+import cv2
+import numpy as np
+
+# Add current directory to path so we can import quality_gate
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+import main
+import quality_gate
+from fakes import photo
+
+
+class TestQualityGate(unittest.TestCase):
+
+    def setUp(self):
+        err = mock.patch.object(sys, 'stderr', new=io.StringIO())
+        err.start()
+        self.addCleanup(err.stop)
+
+    def test_reasons(self):
+        sharp = photo(1)
+        self.assertIsNone(quality_gate.check(sharp, 'tree'))
+        cases = {
+            "too_small": sharp[:100, :100],
+            "too_dark": sharp // 10,
+            "overexposed": np.full_like(sharp, 255),
+            "blurry": cv2.GaussianBlur(sharp, (0, 0), 6),
+        }
+        for reason, img in cases.items():
+            rejected = quality_gate.check(img, 'tree')
+            self.assertEqual((rejected["code"], rejected["reason"]), ("retake_photo", reason))
+            self.assertIn("retake", rejected["error"])
+        # Latex close-ups are smooth by nature; only tree scans are checked for blur.
+        self.assertIsNone(quality_gate.check(cases["blurry"], 'latex'))
+
+    def test_rejected_before_any_model(self):
+        dark = photo(2) // 10
+        with mock.patch.object(main, 'classify_content') as classify, \
+                mock.patch.object(main, 'analyze_latex_with_model') as latex:
+            tree = main.analyze_image(dark, 'tree', '', 'dark.jpg')
+            latex_result = main.analyze_image(dark, 'latex', '', 'dark.jpg')
+        classify.assert_not_called()
+        latex.assert_not_called()
+        self.assertEqual(tree["reason"], "too_dark")
+        self.assertEqual(latex_result["reason"], "too_dark")
+
+        with mock.patch.dict(os.environ, {"RUBBERSENSE_QUALITY_GATE": "0"}):
+            self.assertIsNone(quality_gate.check(dark, 'tree'))
+        with mock.patch.dict(os.environ, {"RUBBERSENSE_QUALITY_MIN_BRIGHTNESS": "5"}):
+            self.assertIsNone(quality_gate.check(dark, 'latex'))
+
+
+if __name__ == '__main__':
+    unittest.main()
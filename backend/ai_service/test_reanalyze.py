@@ -0,0 +1,163 @@
+import sys
+import os
+import io
+import json
+import tempfile
+import unittest
+import urllib.error
+from concurrent.futures import Future
+from concurrent.futures.process import BrokenProcessPool
+from unittest import mock
+
+# Add current directory to path so we can import reanalyze
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+import main
+import reanalyze
+
+
+class TestReanalyze(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+
+    def test_load_scans_csv_and_jsonl(self):
+        csv_path = os.path.join(self.tmp.name, "scans.csv")
+        with open(csv_path, "w") as f:
+            f.write("scanId,imageUrl,mode,subMode\n")
+            f.write("s1,https://x/1.jpg,latex,\n")
+            f.write("s2,https://x/2.jpg,,Leaf\n")
+            f.write(",https://x/3.jpg,tree,\n")
+        with mock.patch.object(sys, 'stderr', new=io.StringIO()):
+            scans = reanalyze.load_scans(csv_path)
+        self.assertEqual([s['scanId'] for s in scans], ["s1", "s2"])
+        self.assertEqual(scans[0]['mode'], "latex")
+        self.assertEqual(scans[1]['mode'], "tree")
+        self.assertEqual(scans[1]['subMode'], "leaf")
+
+        jsonl_path = os.path.join(self.tmp.name, "scans.jsonl")
+        with open(jsonl_path, "w") as f:
+            f.write(json.dumps({"_id": "s3", "image_url": "https://x/3.jpg", "model_fingerprint": "abc"}) + "\n")
+        scans = reanalyze.load_scans(jsonl_path)
+        self.assertEqual(scans[0]['scanId'], "s3")
+        self.assertEqual(scans[0]['modelFingerprint'], "abc")
+
+    def test_current_and_checkpointed_scans_are_skipped(self):
+        """Nothing is re-scored when every scan is either checkpointed or already current"""
+        fingerprint = main.model_fingerprint()
+        scans_path = os.path.join(self.tmp.name, "scans.jsonl")
+        with open(scans_path, "w") as f:
+            f.write(json.dumps({"scanId": "done", "imageUrl": "https://x/1.jpg"}) + "\n")
+            f.write(json.dumps({"scanId": "fresh", "imageUrl": "https://x/2.jpg", "modelFingerprint": fingerprint}) + "\n")
+        out = os.path.join(self.tmp.name, "out.jsonl")
+        with open(out + ".checkpoint", "w") as f:
+            f.write("done\n")
+
+        with mock.patch.object(reanalyze, 'ProcessPoolExecutor') as pool, \
+                mock.patch.object(sys, 'stderr', new=io.StringIO()), \
+                mock.patch('sys.stdout', new=io.StringIO()) as stdout:
+            code = reanalyze.run_reanalysis([scans_path, "--out", out, "--workers", "1"])
+
+        self.assertEqual(code, 0)
+        pool.assert_not_called()
+        summary = json.loads(stdout.getvalue())
+        self.assertEqual(summary["fingerprint"], fingerprint)
+        self.assertEqual(summary["skipped_checkpoint"], 1)
+        self.assertEqual(summary["skipped_current"], 1)
+        self.assertEqual(summary["succeeded"], 0)
+    def test_service_url_sends_reanalysis_priority_and_retries_busy(self):
+        scans_path = os.path.join(self.tmp.name, "scans.jsonl")
+        with open(scans_path, "w") as f:
+            f.write(json.dumps({"scanId": "s1", "imageUrl": "https://x/1.jpg", "subMode": "leaf"}) + "\n")
+        out = os.path.join(self.tmp.name, "out.jsonl")
+        responses = [{"code": "busy", "retryAfterMs": 1}, {"diseaseDetection": []}]
+        sent = []
+
+        def fake_post(url, payload, timeout):
+            sent.append((url, payload))
+            return responses.pop(0)
+
+        with mock.patch.object(reanalyze, '_post_json', fake_post), \
+                mock.patch.object(reanalyze, 'ProcessPoolExecutor') as pool, \
+                mock.patch.object(sys, 'stderr', new=io.StringIO()), \
+                mock.patch('sys.stdout', new=io.StringIO()):
+            code = reanalyze.run_reanalysis([scans_path, "--out", out, "--service-url", "http://svc:8001/"])
+
+        self.assertEqual(code, 0)
+        pool.assert_not_called()
+        self.assertEqual(len(sent), 2)
+        self.assertEqual(sent[0][0], "http://svc:8001/analyze")
+        self.assertEqual(sent[0][1]["priority"], "reanalysis")
+        with open(out) as f:
+            self.assertEqual(json.loads(f.readline())["result"], {"diseaseDetection": []})
+
+    def test_scans_of_a_broken_pool_are_retried(self):
+        """Every scan a dead worker pool was holding is requeued, including the first one read back"""
+        scans_path = os.path.join(self.tmp.name, "scans.jsonl")
+        with open(scans_path, "w") as f:
+            for scan_id in ("s1", "s2"):
+                f.write(json.dumps({"scanId": scan_id, "imageUrl": f"https://x/{scan_id}.jpg"}) + "\n")
+        out = os.path.join(self.tmp.name, "out.jsonl")
+        pools = []
+
+        class FlakyPool:
+            def __init__(self, **kwargs):
+                self.broken = not pools
+                pools.append(self)
+
+            def submit(self, fn, scan):
+                future = Future()
+                if self.broken:
+                    future.set_exception(BrokenProcessPool("worker died"))
+                else:
+                    future.set_result(fn(scan))
+                return future
+
+            def shutdown(self, wait=True, cancel_futures=False):
+                pass
+
+        with mock.patch.object(reanalyze, 'ProcessPoolExecutor', FlakyPool), \
+                mock.patch.object(reanalyze, '_reanalyze_one', lambda scan: (scan, {"diseaseDetection": []}, 1.0)), \
+                mock.patch.object(sys, 'stderr', new=io.StringIO()), \
+                mock.patch('sys.stdout', new=io.StringIO()) as stdout:
+            code = reanalyze.run_reanalysis([scans_path, "--out", out, "--workers", "1"])
+
+        self.assertEqual(code, 0)
+        self.assertEqual(len(pools), 2)
+        self.assertEqual(json.loads(stdout.getvalue())["succeeded"], 2)
+        with open(out + ".checkpoint") as f:
+            self.assertEqual(sorted(f.read().split()), ["s1", "s2"])
+
+    def test_rejections_are_final_and_failures_retried(self):
+        scans_path = os.path.join(self.tmp.name, "scans.jsonl")
+        with open(scans_path, "w") as f:
+            for scan_id in ("blurry", "wrong_part", "down"):
+                f.write(json.dumps({"scanId": scan_id, "imageUrl": f"https://x/{scan_id}.jpg"}) + "\n")
+        out = os.path.join(self.tmp.name, "out.jsonl")
+        responses = {
+            "https://x/blurry.jpg": {"error": "Photo is too blurry", "code": "retake_photo"},
+            "https://x/wrong_part.jpg": {"error": "Detected part non-leaf only. Please try again."},
+        }
+
+        def fake_post(url, payload, timeout):
+            if payload["imageUrl"] not in responses:
+                raise urllib.error.URLError("connection refused")
+            return responses[payload["imageUrl"]]
+
+        with mock.patch.object(reanalyze, '_post_json', fake_post), \
+                mock.patch.object(sys, 'stderr', new=io.StringIO()), \
+                mock.patch('sys.stdout', new=io.StringIO()) as stdout:
+            code = reanalyze.run_reanalysis([scans_path, "--out", out, "--service-url", "http://svc:8001"])
+
+        self.assertEqual(code, 1)
+        summary = json.loads(stdout.getvalue())
+        self.assertEqual((summary["succeeded"], summary["rejected"], summary["failed"]), (2, 2, 1))
+        self.assertEqual(reanalyze.load_checkpoint(out + ".checkpoint"), {"blurry", "wrong_part"})
+        with open(out + ".errors.jsonl") as f:
+            self.assertEqual([json.loads(line)["scanId"] for line in f], ["down"])
+
+
+if __name__ == '__main__':
+    print("🧪 Running Reanalysis Tests...")
+    unittest.main()
@@ -0,0 +1,244 @@
+import sys
+import os
+import io
+import json
+import tempfile
+import threading
+import time
+import unittest
+import urllib.request
+from http.server import ThreadingHTTPServer
+from unittest import mock
+
+# Add current directory to path so we can import server
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+import main
+import metrics
+import server
+import tracing
+
+
+def fake_analyze_request(mode, image_url, raw_sub_mode=''):
+    with tracing.stage("image.download"):
+        pass
+    with tracing.stage("model.latex"):
+        pass
+    with tracing.stage("latex.presence_ratio"):
+        pass
+    tracing.record_model("latex", cold=False)
+    tracing.record_cache("primed_prediction", False)
+    if image_url == "broken.jpg":
+        return {"error": "Failed to load image"}
+    tracing.record_fallback("latex.heuristic")
+    return {"qualityClassification": {"grade": "A"}}
+
+
+class TestServer(unittest.TestCase):
+
+    def setUp(self):
+        metrics.REGISTRY.reset()
+        self.addCleanup(metrics.REGISTRY.reset)
+        for target, attr, value in [
+            (main, 'analyze_request', fake_analyze_request),
+            (main, 'generate_ai_suggestions', lambda data: {"diagnosis": "ok"}),
+            (sys, 'stderr', io.StringIO()),
+        ]:
+            patcher = mock.patch.object(target, attr, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        self.service = server.InferenceService(workers=2)
+
+    def test_requests_feed_metrics(self):
+        self.service.analyze({"imageUrl": "a.jpg", "mode": "latex"})
+        self.service.analyze({"imageUrl": "broken.jpg", "mode": "latex"})
+        self.service.ai_suggestions({"disease_name": "Leaf Spot"})
+
+        self.assertEqual(metrics.REQUESTS.value(mode="latex", outcome="ok"), 1)
+        self.assertEqual(metrics.REQUESTS.value(mode="latex", outcome="error"), 1)
+        self.assertEqual(metrics.REQUESTS.value(mode="ai_suggestions", outcome="ok"), 1)
+        self.assertEqual(metrics.MODEL_FORWARD_SECONDS.count(model="latex"), 2)
+        self.assertEqual(metrics.EXTERNAL_CALL_SECONDS.count(call="image.download"), 2)
+        self.assertEqual(metrics.STAGE_SECONDS.count(stage="latex.presence_ratio"), 2)
+        self.assertEqual(metrics.FALLBACKS.value(mode="latex", fallback="latex.heuristic"), 1)
+        self.assertEqual(metrics.CACHE_LOOKUPS.value(cache="primed_prediction", result="miss"), 2)
+        self.assertEqual(metrics.MODEL_ACCESSES.value(model="latex", state="warm"), 2)
+
+        text = metrics.REGISTRY.render()
+        self.assertIn('rubbersense_requests_total{mode="latex",outcome="ok"} 1', text)
+        self.assertIn('rubbersense_model_forward_seconds_bucket{model="latex",le="+Inf"} 2', text)
+        self.assertIn('# TYPE rubbersense_request_duration_seconds histogram', text)
+
+    def test_unknown_modes_share_one_label(self):
+        self.service.analyze({"imageUrl": "a.jpg", "mode": "x" * 50})
+        self.assertEqual(metrics.REQUESTS.value(mode="unknown", outcome="ok"), 1)
+
+    def test_metrics_file_dump(self):
+        self.service.analyze({"imageUrl": "a.jpg", "mode": "tree"})
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "rubbersense.prom")
+            metrics.MetricsFileWriter(path, interval=60).start().stop()
+            with open(path) as f:
+                self.assertIn('rubbersense_requests_total{mode="tree",outcome="ok"} 1', f.read())
+
+    def test_http_endpoints(self):
+        httpd = ThreadingHTTPServer(("127.0.0.1", 0), server.make_handler(self.service))
+        thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+        thread.start()
+        self.addCleanup(httpd.server_close)
+        self.addCleanup(httpd.shutdown)
+        base = f"http://127.0.0.1:{httpd.server_address[1]}"
+
+        body = json.dumps({"imageUrl": "a.jpg", "mode": "latex", "timings": True}).encode()
+        req = urllib.request.Request(base + "/analyze", data=body, headers={"Content-Type": "application/json"})
+        with urllib.request.urlopen(req) as resp:
+            result = json.loads(resp.read())
+        self.assertEqual(result["qualityClassification"]["grade"], "A")
+        self.assertEqual(result["timings"]["fallbacks"], ["latex.heuristic"])
+
+        with urllib.request.urlopen(base + "/metrics") as resp:
+            self.assertIn('rubbersense_requests_total{mode="latex",outcome="ok"} 1', resp.read().decode())
+
+        bad = urllib.request.Request(base + "/analyze", data=b"{}", headers={"Content-Type": "application/json"})
+        with self.assertRaises(urllib.error.HTTPError) as ctx:
+            urllib.request.urlopen(bad)
+        self.assertEqual(ctx.exception.code, 400)
+
+    def test_overload_is_rejected_with_retry_after(self):
+        service = server.InferenceService(workers=1, max_queue=0, max_queue_wait_ms=1000)
+        httpd = ThreadingHTTPServer(("127.0.0.1", 0), server.make_handler(service))
+        thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+        thread.start()
+        self.addCleanup(httpd.server_close)
+        self.addCleanup(httpd.shutdown)
+        base = f"http://127.0.0.1:{httpd.server_address[1]}"
+
+        service.admission.acquire()  # The only worker is busy and nobody may queue.
+        self.addCleanup(service.admission.release)
+        body = json.dumps({"imageUrl": "a.jpg", "mode": "latex"}).encode()
+        req = urllib.request.Request(base + "/analyze", data=body, headers={"Content-Type": "application/json"})
+        with self.assertRaises(urllib.error.HTTPError) as ctx:
+            urllib.request.urlopen(req)
+        self.assertEqual(ctx.exception.code, 503)
+        self.assertGreaterEqual(int(ctx.exception.headers["Retry-After"]), 1)
+        rejected = json.loads(ctx.exception.read())
+        self.assertEqual((rejected["code"], rejected["reason"]), ("busy", "queue_full"))
+
+        self.assertEqual(metrics.REJECTED.value(mode="latex", reason="queue_full"), 1)
+        self.assertEqual(metrics.REQUESTS.value(mode="latex", outcome="rejected"), 1)
+        with urllib.request.urlopen(base + "/healthz") as resp:
+            self.assertEqual(json.loads(resp.read())["admission"]["rejected"]["queue_full"], 1)
+
+    def test_priority_reaches_admission(self):
+        with mock.patch.object(self.service.admission, 'acquire', wraps=self.service.admission.acquire) as acquire:
+            self.service.analyze({"imageUrl": "a.jpg", "mode": "latex", "priority": "Reanalysis"})
+            self.service.ai_suggestions({"disease_name": "Leaf Spot"})
+        self.assertEqual([call.args[1] for call in acquire.call_args_list], ["reanalysis", "interactive"])
+        with self.assertRaises(ValueError):
+            self.service.analyze({"imageUrl": "a.jpg", "priority": "urgent"})
+        self.assertEqual(server.parse_priority_caps("reanalysis=2, batch=1"), {"reanalysis": 2, "batch": 1})
+
+    def test_identical_requests_in_flight_are_coalesced(self):
+        calls = []
+        release = threading.Event()
+
+        def slow_request(mode, image_url, raw_sub_mode=''):
+            calls.append(image_url)
+            release.wait(5)
+            return {"qualityClassification": {"grade": "A"}}
+
+        payload = {"imageUrl": "a.jpg", "mode": "latex"}
+        results = []
+        with mock.patch.object(main, 'analyze_request', slow_request):
+            first = threading.Thread(target=lambda: results.append(self.service.analyze(payload)))
+            first.start()
+            while not calls:
+                time.sleep(0.001)
+            second = threading.Thread(target=lambda: results.append(self.service.analyze(dict(payload))))
+            second.start()
+            while self.service.flights.stats()["coalesced"] < 1:
+                time.sleep(0.001)
+            release.set()
+            first.join(5)
+            second.join(5)
+            # Once finished, the same request runs again.
+            self.service.analyze(dict(payload, subMode=""))
+
+        self.assertEqual(calls, ["a.jpg", "a.jpg"])
+        self.assertEqual(results[0], results[1])
+        self.assertIsNot(results[0], results[1])
+        self.assertEqual(metrics.COALESCED.value(mode="latex"), 1)
+        self.assertEqual(metrics.REQUESTS.value(mode="latex", outcome="ok"), 2)
+        self.assertEqual(self.service.flights.stats(), {"inFlight": 0, "coalesced": 1})
+
+    def test_other_priority_or_earlier_deadline_is_not_coalesced(self):
+        calls = []
+        release = threading.Event()
+
+        def slow_request(mode, image_url, raw_sub_mode=''):
+            calls.append(image_url)
+            release.wait(5)
+            return {"qualityClassification": {"grade": "A"}}
+
+        service = server.InferenceService(workers=3)
+        leader = {"imageUrl": "a.jpg", "mode": "latex", "priority": "interactive"}
+        with mock.patch.object(main, 'analyze_request', slow_request):
+            first = threading.Thread(target=lambda: service.analyze(leader))
+            first.start()
+            while not calls:
+                time.sleep(0.001)
+            # A batch request does not join (and so jump ahead as) the interactive one,
+            # and one with a deadline does not wait on a request without one.
+            others = [
+                threading.Thread(target=lambda: service.analyze(dict(leader, priority="batch"))),
+                threading.Thread(target=lambda: service.analyze(dict(leader, deadline=time.time() * 1000 + 60000))),
+            ]
+            for thread in others:
+                thread.start()
+            while len(calls) < 3:
+                time.sleep(0.001)
+            release.set()
+            for thread in [first] + others:
+                thread.join(5)
+
+        self.assertEqual(service.flights.stats()["coalesced"], 0)
+        self.assertTrue(server.deadline_no_earlier(2000, 1000))
+        self.assertTrue(server.deadline_no_earlier(None, 1000))
+        self.assertFalse(server.deadline_no_earlier(500, 1000))
+        self.assertFalse(server.deadline_no_earlier(500, None))
+        self.assertTrue(server.deadline_no_earlier(None, None))
+
+    def test_partial_shared_result_is_recomputed_under_own_deadline(self):
+        calls = []
+        release = threading.Event()
+
+        def slow_request(mode, image_url, raw_sub_mode=''):
+            calls.append(image_url)
+            if len(calls) == 1:
+                release.wait(5)
+                active = main.deadline.current()
+                active.skipped.append("annotation")
+            return {"qualityClassification": {"grade": "A"}}
+
+        results = []
+        leader = {"imageUrl": "a.jpg", "mode": "latex", "deadline": time.time() * 1000 + 60000}
+        with mock.patch.object(main, 'analyze_request', slow_request):
+            first = threading.Thread(target=lambda: results.append(self.service.analyze(leader)))
+            first.start()
+            while not calls:
+                time.sleep(0.001)
+            second = threading.Thread(target=lambda: results.append(self.service.analyze(dict(leader, deadline=None))))
+            second.start()
+            while self.service.flights.stats()["coalesced"] < 1:
+                time.sleep(0.001)
+            release.set()
+            first.join(5)
+            second.join(5)
+
+        self.assertEqual(len(calls), 2)
+        self.assertEqual(sorted(bool(r.get("partial")) for r in results), [False, True])
+
+
+if __name__ == '__main__':
+    print("🧪 Running Server Tests...")
+    unittest.main()
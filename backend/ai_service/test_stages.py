@@ -0,0 +1,87 @@
+import sys
+import os
+import threading
+import time
+import unittest
+from unittest import mock
+
+# Add current directory to path so we can import stages
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+import stages
+import tracing
+
+
+class TestStageGraph(unittest.TestCase):
+
+    def setUp(self):
+        env = mock.patch.dict(os.environ, {"RUBBERSENSE_STAGE_WORKERS": "4"})
+        env.start()
+        self.addCleanup(env.stop)
+
+    def test_dependencies_receive_results(self):
+        graph = stages.StageGraph()
+        graph.add("a", lambda: 2)
+        graph.add("b", lambda: 3)
+        graph.add("sum", lambda a, b: a + b, "a", "b")
+        graph.add("double", lambda total: total * 2, "sum")
+        self.assertEqual(graph.run(), {"a": 2, "b": 3, "sum": 5, "double": 10})
+        with self.assertRaises(ValueError):
+            graph.add("orphan", lambda x: x, "missing")
+
+    def test_independent_stages_overlap(self):
+        # Both stages must be running at once to get past the barrier.
+        barrier = threading.Barrier(2, timeout=5)
+        graph = stages.StageGraph()
+        graph.add("left", barrier.wait)
+        graph.add("right", barrier.wait)
+        self.assertEqual(sorted(graph.run().values()), [0, 1])
+
+    def test_inline_when_disabled(self):
+        os.environ["RUBBERSENSE_STAGE_WORKERS"] = "1"
+        threads = []
+        graph = stages.StageGraph()
+        graph.add("a", lambda: threads.append(threading.current_thread()))
+        graph.add("b", lambda: threads.append(threading.current_thread()))
+        graph.run()
+        self.assertEqual(threads, [threading.current_thread()] * 2)
+
+    def test_errors_and_trace_propagate(self):
+        def boom():
+            raise RuntimeError("stage failed")
+
+        graph = stages.StageGraph()
+        # "pooled" is submitted to the pool, "inline" runs on this thread.
+        graph.add("pooled", lambda: tracing.record_fallback("from.pool"))
+        graph.add("inline", lambda: None)
+        graph.add("bad", lambda *_: boom(), "pooled", "inline")
+        graph.add("after", lambda _: None, "bad")
+        with tracing.trace() as t:
+            with self.assertRaises(RuntimeError):
+                graph.run()
+        self.assertEqual(t.to_dict()["fallbacks"], ["from.pool"])
+
+    def test_inline_block_and_pool_cpu(self):
+        def busy():
+            end = time.thread_time() + 0.02
+            while time.thread_time() < end:
+                pass
+            return threading.current_thread()
+
+        graph = stages.StageGraph()
+        graph.add("a", busy)
+        graph.add("b", busy)
+        with tracing.trace() as t:
+            pooled = graph.run()
+            with stages.inline():
+                inline = graph.run()
+        self.assertIn(threading.current_thread(), pooled.values())
+        self.assertNotEqual(pooled["a"], pooled["b"])
+        self.assertEqual(set(inline.values()), {threading.current_thread()})
+        # The stage that went to the pool is counted once, outside the request thread's CPU time.
+        self.assertGreaterEqual(t.to_dict()["total"]["pool_cpu_ms"], 20)
+        self.assertLess(t.to_dict()["total"]["pool_cpu_ms"], 40)
+
+
+if __name__ == '__main__':
+    unittest.main()
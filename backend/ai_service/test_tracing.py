@@ -0,0 +1,78 @@
+import sys
+import os
+import io
+import json
+import unittest
+from unittest import mock
+
+import numpy as np
+
+# Add current directory to path so we can import tracing
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+import main
+import tracing
+from model_manager import ModelManager
+
+
+class FakeModel:
+    def __call__(self, source, verbose=False):
+        return ["result"]
+
+
+class TestTracing(unittest.TestCase):
+
+    def test_hooks_are_noops_without_trace(self):
+        with tracing.stage("unused"):
+            pass
+        tracing.record_model("cls", cold=True)
+        self.assertIsNone(tracing.current())
+
+    def test_stages_models_and_cache_recorded(self):
+        manager = ModelManager(budget_bytes=0, pinned=set())
+        manager.register("cls", FakeModel, replicas=1)
+        img = np.zeros((4, 4, 3), dtype=np.uint8)
+
+        with tracing.trace() as t:
+            handle = manager.get("cls")
+            handle(img, verbose=False)
+            manager.get("cls")
+            handle.prime(img, "primed")
+            handle(img, verbose=False)
+        timings = t.to_dict()
+
+        self.assertEqual(timings["models"], {"cls": "cold"})
+        self.assertEqual([s["name"] for s in timings["stages"]], ["model.cls"])
+        self.assertEqual(timings["cache"]["primed_prediction"], {"hits": 1, "misses": 0})
+        self.assertIn("wall_ms", timings["total"])
+        self.assertIn("cpu_ms", timings["total"])
+
+        # A second request sees the model warm
+        with tracing.trace() as t:
+            manager.get("cls")
+        self.assertEqual(t.to_dict()["models"], {"cls": "warm"})
+
+    def test_main_attaches_timings_only_when_requested(self):
+        def fake_request(mode, image_url, raw_sub_mode=''):
+            with tracing.stage("image.read"):
+                pass
+            return {"ok": True}
+
+        with mock.patch.object(main, 'analyze_request', fake_request), \
+                mock.patch.dict(os.environ, {"RUBBERSENSE_TIMINGS": ""}):
+            with mock.patch.object(sys, 'argv', ['main.py', 'x.jpg', 'tree']), \
+                    mock.patch('sys.stdout', new=io.StringIO()) as stdout:
+                main.main()
+            self.assertNotIn("timings", json.loads(stdout.getvalue()))
+
+            with mock.patch.object(sys, 'argv', ['main.py', 'x.jpg', 'tree', '--timings']), \
+                    mock.patch('sys.stdout', new=io.StringIO()) as stdout:
+                main.main()
+            result = json.loads(stdout.getvalue())
+            self.assertTrue(result["ok"])
+            self.assertEqual(result["timings"]["stages"][0]["name"], "image.read")
+
+
+if __name__ == '__main__':
+    print("🧪 Running Tracing Tests...")
+    unittest.main()
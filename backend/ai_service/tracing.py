@@ -0,0 +1,160 @@
+"""
+Per-request timing trace.
+
+A trace is opt-in: `main.py ... --timings` or RUBBERSENSE_TIMINGS=1 (or a
+`timings` flag on a service request). While a trace is active, instrumented
+stages record wall time and the CPU time of the calling thread (work on stage
+pool threads is summed separately as the total's pool_cpu_ms); model access
+records whether each model was loaded cold or already warm, caches record
+hits/misses, and degraded paths (heuristic or canned-text fallbacks) are noted. With no active trace every hook is a cheap no-op.
+
+The trace lives in a context variable, so concurrent requests on different
+threads each get their own. Work submitted to thread pools must run inside
+`contextvars.copy_context()` to stay attached to the request's trace.
+"""
+import contextvars
+import functools
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+_CURRENT = contextvars.ContextVar("rubbersense_trace", default=None)
+
+
+def timings_requested(flag=False):
+    return bool(flag) or os.environ.get("RUBBERSENSE_TIMINGS") == "1"
+
+
+class Trace:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.stages = []
+        self.models = {}
+        self.cache = {}
+        self.fallbacks = []
+        self._wall_start = time.perf_counter()
+        self._cpu_start = time.thread_time()
+        self._pool_cpu = 0.0
+        self.total = None
+
+    def add_stage(self, name, wall_seconds, cpu_seconds):
+        with self._lock:
+            self.stages.append({
+                "name": name,
+                "wall_ms": round(wall_seconds * 1000, 3),
+                "cpu_ms": round(cpu_seconds * 1000, 3),
+            })
+
+    def record_pool_cpu(self, cpu_seconds):
+        with self._lock:
+            self._pool_cpu += cpu_seconds
+
+    def record_model(self, name, cold):
+        with self._lock:
+            # Once cold within a request, the request paid the load.
+            if self.models.get(name) != "cold":
+                self.models[name] = "cold" if cold else "warm"
+
+    def record_cache(self, name, hit):
+        with self._lock:
+            entry = self.cache.setdefault(name, {"hits": 0, "misses": 0})
+            entry["hits" if hit else "misses"] += 1
+
+    def record_fallback(self, name):
+        with self._lock:
+            self.fallbacks.append(name)
+
+    def finish(self):
+        if self.total is None:
+            self.total = {
+                "wall_ms": round((time.perf_counter() - self._wall_start) * 1000, 3),
+                "cpu_ms": round((time.thread_time() - self._cpu_start) * 1000, 3),
+                "pool_cpu_ms": round(self._pool_cpu * 1000, 3),
+            }
+        return self
+
+    def to_dict(self):
+        self.finish()
+        with self._lock:
+            return {
+                "total": dict(self.total),
+                "stages": [dict(s) for s in self.stages],
+                "models": dict(self.models),
+                "cache": {k: dict(v) for k, v in self.cache.items()},
+                "fallbacks": list(self.fallbacks),
+            }
+
+
+def current():
+    return _CURRENT.get()
+
+
+@contextmanager
+def trace(enabled=True):
+    """
+    Activate a new trace for the duration of the block. Yields the Trace (or None if disabled).
+    """
+    if not enabled:
+        yield None
+        return
+    active = Trace()
+    token = _CURRENT.set(active)
+    try:
+        yield active
+    finally:
+        active.finish()
+        _CURRENT.reset(token)
+
+
+@contextmanager
+def stage(name):
+    active = _CURRENT.get()
+    if active is None:
+        yield
+        return
+    wall = time.perf_counter()
+    cpu = time.thread_time()
+    try:
+        yield
+    finally:
+        active.add_stage(name, time.perf_counter() - wall, time.thread_time() - cpu)
+
+
+def traced(name):
+    """
+    Decorator form of `stage()`.
+    """
+    def decorator(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            if _CURRENT.get() is None:
+                return fn(*args, **kwargs)
+            with stage(name):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def record_model(name, cold):
+    active = _CURRENT.get()
+    if active is not None:
+        active.record_model(name, cold)
+
+
+def record_cache(name, hit):
+    active = _CURRENT.get()
+    if active is not None:
+        active.record_cache(name, hit)
+
+
+def record_fallback(name):
+    active = _CURRENT.get()
+    if active is not None:
+        active.record_fallback(name)
+
+
+def record_pool_cpu(cpu_seconds):
+    active = _CURRENT.get()
+    if active is not None:
+        active.record_pool_cpu(cpu_seconds)
@@ -12,6 +12,9 @@ const path = require('path');
  * @returns {Promise<Object>} - The analysis results
  */
 const PYTHON_TIMEOUT_MS = 120000; // Increased to 120s for model loading
+// Python is told to finish this much earlier than the kill, skipping optional
+// work (AI insights, annotated image) if needed, so a partial result still arrives.
+const PYTHON_DEADLINE_MARGIN_MS = 10000;
 
 const runPythonScript = (mode, imageUrl, subMode = '') => {
   return new Promise((resolve, reject) => {
@@ -21,6 +24,7 @@ const runPythonScript = (mode, imageUrl, subMode = '') => {
     // Spawn Python process
     const args = [scriptPath, mode, imageUrl];
     if (subMode) args.push(subMode);
+    args.push('--deadline', String(Date.now() + PYTHON_TIMEOUT_MS - PYTHON_DEADLINE_MARGIN_MS));
     
     const pythonProcess = spawn('python', args);
 
@@ -102,7 +106,11 @@ const runPythonScript = (mode, imageUrl, subMode = '') => {
              return;
           }
 
-          console.log(`✅ [Python ML] Analysis successful for ${mode}`);
+          if (result.partial) {
+             console.warn(`⚠️ [Python ML] Deadline reached, skipped: ${(result.skipped || []).join(', ')}`);
+          } else {
+             console.log(`✅ [Python ML] Analysis successful for ${mode}`);
+          }
           
           // Generate AI Insights & Prompts
           result.aiInsights = generateAiInsights(result, mode);
@@ -341,9 +349,51 @@ const generateAiSuggestionsOnly = async (detectionData) => {
     });
 };
 
+/**
+ * Generates AI suggestions for many detections in a single Python process.
+ * Identical detections are deduplicated and Groq calls run concurrently on the Python side.
+ * @param {Array<Object>} detections - [{ disease_name, confidence, spot_count, color_name }, ...]
+ * @returns {Promise<Array<Object>>} - Raw AI insight objects, in input order
+ */
+const generateAiSuggestionsBatch = async (detections) => {
+    return new Promise((resolve, reject) => {
+        const scriptPath = path.join(__dirname, '../ai_service/main.py');
+        const pythonProcess = spawn('python', [scriptPath, 'ai_suggestions', '-']);
+
+        let dataString = '';
+        let errorString = '';
+
+        pythonProcess.on('error', (err) => reject(err));
+        pythonProcess.stdout.on('data', (data) => { dataString += data.toString(); });
+        pythonProcess.stderr.on('data', (data) => { errorString += data.toString(); });
+
+        pythonProcess.on('close', (code) => {
+            if (code !== 0) {
+                console.error(`❌ [Python AI] Batch suggestion generation failed: ${errorString}`);
+                reject(new Error(errorString || 'AI Service failed'));
+                return;
+            }
+            try {
+                const result = JSON.parse(dataString.trim());
+                if (!Array.isArray(result)) {
+                    reject(new Error(result?.error || 'Unexpected AI batch output'));
+                    return;
+                }
+                resolve(result);
+            } catch (e) {
+                reject(e);
+            }
+        });
+
+        pythonProcess.stdin.write(JSON.stringify(detections));
+        pythonProcess.stdin.end();
+    });
+};
+
 module.exports = {
   analyzeTreeImage,
   analyzeLatexImage,
   generateAiSuggestionsOnly,
+  generateAiSuggestionsBatch,
   generateAiInsights // Export for testing
 };